@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import gzip
+import hashlib
 import json
 import os
 import threading
@@ -9,10 +11,24 @@ import time
 import sys
 import StringIO
 import ast
+import bisect
+import codecs
+import base64
+from array import array
+import collections
+import contextlib
+import itertools
+import inspect
+import fnmatch
+import shutil
+import socket
+import sre_constants
+import sre_parse
+import tempfile
 import jarray
 
 from com.pnfsoftware.jeb.client.api import IScript
-from com.pnfsoftware.jeb.core import Artifact, RuntimeProjectUtil
+from com.pnfsoftware.jeb.core import Artifact
 from com.pnfsoftware.jeb.core.actions import (
     ActionContext,
     ActionOverridesData,
@@ -22,9 +38,11 @@ from com.pnfsoftware.jeb.core.actions import (
 from com.pnfsoftware.jeb.core.input import FileInput
 from com.pnfsoftware.jeb.core.output.text import TextDocumentUtil
 from com.pnfsoftware.jeb.core.units.code.android import IApkUnit
+from com.pnfsoftware.jeb.core.units.code.android.dex import IDalvikInstruction
 from com.pnfsoftware.jeb.core.util import DecompilerHelper
-from java.io import File
-from java.io import ByteArrayOutputStream
+from java.io import File, FileInputStream, FileOutputStream
+from java.lang import Runtime, System
+from java.util.regex import Pattern
 
 # Python 2.7 changes - use urlparse from urlparse module instead of urllib.parse
 from urlparse import urlparse
@@ -51,8 +69,6 @@ def get_type_hints(func):
         hints.update(getattr(func, "__annotations__", {}))
 
     # For Python 2.7, inspect the function signature
-    import inspect
-
     args, varargs, keywords, defaults = inspect.getargspec(func)
 
     # Add all positional parameters with Any type
@@ -85,6 +101,7 @@ class Generic(object):
 
 # Use BaseHTTPServer instead of http.server
 import BaseHTTPServer
+import Queue
 
 
 class JSONRPCError(Exception):
@@ -95,69 +112,394 @@ class JSONRPCError(Exception):
         self.data = data
 
 
-class RPCRegistry(object):
+class Future(object):
+    """Result of a call submitted to a WorkerPool"""
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+        self._done = threading.Event()
+        self._result = None
+        self._exc_info = None
+
+    def run(self):
+        if self.cancelled:
+            self._done.set()
+            return
+        try:
+            self._result = self.func(*self.args, **self.kwargs)
+        except BaseException:
+            self._exc_info = sys.exc_info()
+        finally:
+            self._done.set()
+
+    def cancel(self):
+        """Cancel the call if it has not started yet"""
+        self.cancelled = True
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        self._done.wait(timeout)
+        if not self._done.is_set():
+            raise RuntimeError("Timed out waiting for worker result")
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+
+class WorkerPool(object):
+    """
+    Fixed number of daemon threads consuming a bounded queue.
+    Jython has no GIL, so the workers really run in parallel on the JVM.
+    """
+
+    def __init__(self, name, size, queue_size=0):
+        self.name = name
+        self.size = max(1, size)
+        self.queue = Queue.Queue(queue_size)
+        self.threads = []
+        for i in range(self.size):
+            thread = threading.Thread(target=self._work, name="%s-%d" % (name, i))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def _work(self):
+        while True:
+            future = self.queue.get()
+            if future is None:
+                break
+            future.run()
+
+    def submit(self, func, *args, **kwargs):
+        """Queue a call, blocking while the queue is full"""
+        future = Future(func, args, kwargs)
+        self.queue.put(future)
+        return future
+
+    def shutdown(self):
+        for _ in self.threads:
+            self.queue.put(None)
+
+
+class ReadWriteLock(object):
+    """Many readers or a single writer; waiting writers block new readers."""
+
     def __init__(self):
-        self.methods = {}
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self, blocking=True):
+        with self._cond:
+            if not blocking:
+                if self._writer or self._readers:
+                    return False
+                self._writer = True
+                return True
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+            return True
 
-    def register(self, func):
-        self.methods[func.__name__] = func
-        return func
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
 
-    def dispatch(self, method, params):
-        if method not in self.methods:
-            raise JSONRPCError(-32601, "Method '{0}' not found".format(method))
 
-        func = self.methods[method]
-        hints = get_type_hints(func)
+class ArtifactLocks(object):
+    """One ReadWriteLock per APK path, created on first use"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    def get(self, filepath):
+        with self._lock:
+            lock = self._locks.get(filepath)
+            if lock is None:
+                lock = ReadWriteLock()
+                self._locks[filepath] = lock
+            return lock
+
+
+artifact_locks = ArtifactLocks()
+
+
+class ScanCursors(object):
+    """
+    Suspended scans behind the opaque cursors of paginated RPCs. The next page
+    resumes the stored iterator where the previous page stopped; if the scan
+    expired meanwhile it is restarted and the items already returned skipped.
+    """
+    MAX_OPEN_SCANS = 32
+    TTL = 600  # seconds
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._scans = collections.OrderedDict()  # scan id -> Scan
+        self._ids = itertools.count(1)
+
+    class Scan(object):
+        def __init__(self, key, source, iterator, position):
+            self.key = key
+            self.source = source
+            self.iterator = iterator
+            self.position = position
+            self.used_at = time.time()
+
+        def close(self):
+            if hasattr(self.source, "close"):
+                self.source.close()
+
+    def _encode(self, scan_id, position):
+        return base64.urlsafe_b64encode("%d:%d" % (scan_id, position))
+
+    def _decode(self, cursor):
+        try:
+            scan_id, position = base64.urlsafe_b64decode(str(cursor)).split(":")
+            return int(scan_id), int(position)
+        except (TypeError, ValueError):
+            raise JSONRPCError(-32602, "Invalid params: malformed cursor")
+
+    def _take(self, scan_id):
+        with self._lock:
+            return self._scans.pop(scan_id, None)
+
+    def _store(self, scan):
+        expired = []
+        with self._lock:
+            scan_id = next(self._ids)
+            self._scans[scan_id] = scan
+            now = time.time()
+            for old_id, old_scan in list(self._scans.items()):
+                if len(self._scans) > self.MAX_OPEN_SCANS or now - old_scan.used_at > self.TTL:
+                    expired.append(self._scans.pop(old_id))
+        for old_scan in expired:
+            old_scan.close()
+        return scan_id
+
+    def page(self, key, cursor, page_size, make_iterator):
+        """
+        Return {"items": [...], "next_cursor": cursor or None} for the page
+        after `cursor`. `key` identifies the scan (method and parameters) and
+        `make_iterator` starts it from the beginning.
+        """
+        if page_size <= 0:
+            page_size = DEFAULT_PAGE_SIZE
+        position = 0
+        scan = None
+        if cursor:
+            scan_id, position = self._decode(cursor)
+            scan = self._take(scan_id)
+            if scan is not None and (scan.key != key or scan.position != position):
+                scan.close()
+                scan = None
+        if scan is None:
+            source = make_iterator()
+            scan = ScanCursors.Scan(key, source, iter(source), position)
+            for _ in itertools.islice(scan.iterator, position):
+                pass
+
+        items = list(itertools.islice(scan.iterator, page_size + 1))
+        if len(items) <= page_size:
+            scan.close()
+            return {"items": items, "next_cursor": None}
+
+        # Keep the extra item that proved there is a next page
+        lookahead = items.pop()
+        scan.iterator = itertools.chain([lookahead], scan.iterator)
+        scan.position = position + page_size
+        scan.used_at = time.time()
+        return {"items": items, "next_cursor": self._encode(self._store(scan), scan.position)}
+
+    def discard(self, filepath):
+        """Drop the scans over an artifact that is being unloaded"""
+        with self._lock:
+            scans = [(scan_id, scan) for scan_id, scan in self._scans.items() if scan.key[1] == filepath]
+            for scan_id, _ in scans:
+                del self._scans[scan_id]
+        for _, scan in scans:
+            scan.close()
+
+
+DEFAULT_PAGE_SIZE = 100
+scan_cursors = ScanCursors()
+
+
+def paginate(key, cursor, page_size, make_iterator):
+    """
+    Return the whole result as a list, or only one page of it as a dict
+    when the caller passed a cursor or a page size.
+    """
+    if not cursor and page_size <= 0:
+        return list(make_iterator())
+    return scan_cursors.page(key, cursor, page_size, make_iterator)
+
+
+class RPCMethod(object):
+    """A registered JSON-RPC method, with its signature resolved once at registration"""
+
+    def __init__(self, func, mutating=False):
+        args, varargs, keywords, defaults = inspect.getargspec(func)
+        defaults = defaults or ()
+        self.func = func
+        self.name = func.__name__
+        self.mutating = mutating
+        self.arg_names = args
+        self.arg_set = frozenset(args)
+        self.max_args = len(args)
+        self.min_args = len(args) - len(defaults)
+        self.required = frozenset(args[:self.min_args])
+        self.filepath_index = args.index("filepath") if "filepath" in self.arg_set else -1
+
+    def artifact_key(self, params):
+        """The APK path this call targets, or None if it does not target one"""
+        if self.filepath_index < 0:
+            return None
+        if isinstance(params, dict):
+            filepath = params.get("filepath")
+        elif self.filepath_index < len(params):
+            filepath = params[self.filepath_index]
+        else:
+            return None
+        if isinstance(filepath, basestring) and filepath:
+            return filepath
+        return None
 
-        # Remove return annotation if present
-        if "return" in hints:
-            hints.pop("return", None)
+    def accepts(self, params):
+        """Whether the params bind to this method's signature"""
+        if isinstance(params, list):
+            return self.min_args <= len(params) <= self.max_args
+        if isinstance(params, dict):
+            return self.required <= set(params) <= self.arg_set
+        return False
 
+    def call(self, params):
+        """Bind positional or keyword params, missing optional ones take their defaults"""
         if isinstance(params, list):
-            if len(params) != len(hints):
+            count = len(params)
+            if count < self.min_args or count > self.max_args:
+                if self.min_args == self.max_args:
+                    expected = str(self.max_args)
+                else:
+                    expected = "{0} to {1}".format(self.min_args, self.max_args)
                 raise JSONRPCError(
                     -32602,
-                    "Invalid params: expected {0} arguments, got {1}".format(
-                        len(hints), len(params)
-                    ),
+                    "Invalid params: expected {0} arguments, got {1}".format(expected, count),
                 )
-
-            # Python 2.7 doesn't support zip with items() directly
-            # Convert to simpler validation approach
-            converted_params = []
-            param_items = hints.items()
-            for i, value in enumerate(params):
-                if i < len(param_items):
-                    param_name, expected_type = param_items[i]
-                    # In Python 2.7, we'll do minimal type checking
-                    converted_params.append(value)
-                else:
-                    converted_params.append(value)
-
-            return func(*converted_params)
+            return self.func(*params)
         elif isinstance(params, dict):
-            # Simplify type validation for Python 2.7
-            if set(params.keys()) != set(hints.keys()):
+            keys = set(params)
+            if not (self.required <= keys <= self.arg_set):
                 raise JSONRPCError(
                     -32602,
-                    "Invalid params: expected {0}".format(list(hints.keys())),
+                    "Invalid params: expected {0}".format(self.arg_names),
                 )
-
-            # Validate and convert parameters
-            converted_params = {}
-            for param_name, expected_type in hints.items():
-                value = params.get(param_name)
-                # Skip detailed type validation in Python 2.7 version
-                converted_params[param_name] = value
-
-            return func(**converted_params)
+            # JSON object keys are unicode, keyword argument names must be str
+            return self.func(**dict((str(k), v) for k, v in params.iteritems()))
         else:
             raise JSONRPCError(
                 -32600, "Invalid Request: params must be array or object"
             )
 
 
+class RPCRegistry(object):
+    def __init__(self):
+        self.methods = {}
+        # Generators producing the results of a method one by one, sent as NDJSON
+        self.streams = {}
+
+    def register(self, func, mutating=False):
+        self.methods[func.__name__] = RPCMethod(func, mutating)
+        return func
+
+    def register_stream(self, method, func):
+        self.streams[method] = RPCMethod(func)
+        return func
+
+    def can_stream(self, request):
+        """Whether the request targets a streaming method with params it accepts"""
+        if not isinstance(request, dict):
+            return False
+        rpc_method = self.streams.get(request.get("method"))
+        return rpc_method is not None and rpc_method.accepts(request.get("params", []))
+
+    @contextlib.contextmanager
+    def artifact_lock(self, rpc_method, params):
+        """
+        Hold the lock of the artifact the call targets: reads on the same APK
+        run in parallel, mutating calls are exclusive.
+        """
+        filepath = rpc_method.artifact_key(params) if isinstance(params, (list, dict)) else None
+        if filepath is None:
+            yield
+            return
+
+        if rpc_method.mutating:
+            # Also exclude readers reaching the same artifact through another
+            # path of the same APK; locks are taken in path order.
+            locks = [artifact_locks.get(path) for path in artifact_cache.aliases(filepath)]
+            for lock in locks:
+                lock.acquire_write()
+            try:
+                yield
+            finally:
+                for lock in reversed(locks):
+                    lock.release_write()
+        else:
+            lock = artifact_locks.get(filepath)
+            lock.acquire_read()
+            try:
+                yield
+            finally:
+                lock.release_read()
+
+    def dispatch(self, method, params):
+        rpc_method = self.methods.get(method)
+        if rpc_method is None:
+            raise JSONRPCError(-32601, "Method '{0}' not found".format(method))
+
+        with self.artifact_lock(rpc_method, params):
+            return rpc_method.call(params)
+
+    def dispatch_stream(self, method, params):
+        """
+        Return a generator over the results of a streaming method. The artifact
+        lock is taken on the first next() and released once the generator is
+        exhausted or closed.
+        """
+        rpc_method = self.streams.get(method)
+        if rpc_method is None:
+            raise JSONRPCError(-32601, "Method '{0}' cannot be streamed".format(method))
+
+        with self.artifact_lock(rpc_method, params):
+            for item in rpc_method.call(params):
+                yield item
+
+
 rpc_registry = RPCRegistry()
 
 
@@ -167,7 +509,179 @@ def jsonrpc(func):
     return rpc_registry.register(func)
 
 
+def jsonrpc_mutating(func):
+    """
+    Decorator to register a JSON-RPC method with side effects. It runs alone
+    on the APK it targets, and server.py never resends it after a dropped
+    connection.
+    """
+    global rpc_registry
+    return rpc_registry.register(func, mutating=True)
+
+
+def jsonrpc_stream(method):
+    """
+    Decorator to register a generator as the streaming variant of a JSON-RPC
+    method. It takes the same parameters as the method and yields its results.
+    """
+    def decorator(func):
+        global rpc_registry
+        return rpc_registry.register_stream(method, func)
+    return decorator
+
+
+def benchmark_dispatch(iterations=100000):
+    """
+    Micro-benchmark of the per-call dispatch overhead, run it from
+    execute_python_code with `print(benchmark_dispatch())`. "legacy" re-runs
+    the signature inspection on every call like dispatch used to, "current"
+    goes through the precomputed RPCMethod.
+    """
+    def target(filepath, class_signature, limit=0):
+        return limit
+
+    def legacy_call(params):
+        hints = get_type_hints(target)
+        hints.pop("return", None)
+        if len(params) != len(hints):
+            raise JSONRPCError(-32602, "Invalid params")
+        converted_params = []
+        param_items = hints.items()
+        for i, value in enumerate(params):
+            converted_params.append(value)
+        return target(*converted_params)
+
+    rpc_method = RPCMethod(target)
+    params = ["/tmp/app.apk", "Lcom/abc/Foo;", 10]
+    timings = {}
+    for name, call in (("legacy", legacy_call), ("current", rpc_method.call)):
+        start = time.time()
+        for _ in xrange(iterations):
+            call(params)
+        timings[name] = (time.time() - start) * 1e6 / iterations
+    return "dispatch overhead per call: legacy %.2f us, current %.2f us (%d iterations)" % (
+        timings["legacy"], timings["current"], iterations)
+
+
+# Responses smaller than this many bytes are sent uncompressed even when the
+# client accepts gzip: compressing them costs more than it saves.
+GZIP_MIN_SIZE = int(os.getenv("JEB_MCP_GZIP_MIN_SIZE", "65536"))
+
+
+def gzip_compress(data):
+    buf = StringIO.StringIO()
+    gz = gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=6)
+    try:
+        gz.write(data)
+    finally:
+        gz.close()
+    return buf.getvalue()
+
+
+class ChunkedWriter(object):
+    """
+    Writes lines as HTTP/1.1 chunks. Lines are grouped into one chunk until it
+    is large enough or old enough, so the first result goes out immediately
+    without sending one tiny chunk per line afterwards. A timer sends the
+    lines left waiting MAX_CHUNK_DELAY after the first of them, even if the
+    producer finds nothing more for a long time.
+    """
+    MAX_CHUNK_SIZE = 16384
+    MAX_CHUNK_DELAY = 0.1
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.lock = threading.Lock()
+        self.lines = []
+        self.size = 0
+        self.flushed_at = 0
+        self.timer = None
+        self.error = None  # socket error of a timed flush, raised to the producer
+
+    def write_line(self, line):
+        with self.lock:
+            if self.error is not None:
+                raise self.error
+            self.lines.append(line)
+            self.lines.append("\n")
+            self.size += len(line) + 1
+            waited = time.time() - self.flushed_at
+            if self.size >= self.MAX_CHUNK_SIZE or waited >= self.MAX_CHUNK_DELAY:
+                self._flush()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.MAX_CHUNK_DELAY - waited, self._flush_later)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def _flush_later(self):
+        with self.lock:
+            if self.timer is threading.current_thread():
+                self.timer = None
+            try:
+                self._flush()
+            except (socket.error, IOError) as e:
+                self.error = e
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.size:
+            self.sock.sendall("%x\r\n%s\r\n" % (self.size, "".join(self.lines)))
+            self.lines = []
+            self.size = 0
+        self.flushed_at = time.time()
+
+    def flush(self):
+        with self.lock:
+            if self.error is not None:
+                raise self.error
+            self._flush()
+
+    def close(self):
+        self.flush()
+        self.sock.sendall("0\r\n\r\n")
+
+    def cancel(self):
+        """Stop the pending timed flush, e.g. when the client is gone"""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+
 class JSONRPCRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests, every response
+    # therefore carries a Content-Length.
+    protocol_version = "HTTP/1.1"
+    # A kept-alive connection holds its worker thread while it waits for the
+    # next request. Idle ones are closed after this many seconds, and only
+    # MCPHTTPServer.keep_alive_slots connections are kept alive at once: the
+    # others are closed after their response, so that clients holding idle
+    # connections never take every worker.
+    timeout = int(os.getenv("JEB_MCP_KEEPALIVE_TIMEOUT", "10"))
+    # Buffer the status line and headers into one write (flushed after each
+    # request) and disable Nagle, or small replies wait for delayed ACKs.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    keep_alive_slot = False
+
+    def end_headers(self):
+        if not self.close_connection and not self.keep_alive_slot:
+            self.keep_alive_slot = self.server.keep_alive_slots.acquire(False)
+            if not self.keep_alive_slot:
+                self.send_header("Connection", "close")  # also sets close_connection
+        BaseHTTPServer.BaseHTTPRequestHandler.end_headers(self)
+
+    def finish(self):
+        try:
+            BaseHTTPServer.BaseHTTPRequestHandler.finish(self)
+        finally:
+            if self.keep_alive_slot:
+                self.keep_alive_slot = False
+                self.server.keep_alive_slots.release()
+
     def send_jsonrpc_error(self, code, message, id=None):
         response = {
             "jsonrpc": "2.0",
@@ -175,67 +689,66 @@ class JSONRPCRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
         }
         if id is not None:
             response["id"] = id
-        response_body = json.dumps(response)
+        self.send_json_body(json.dumps(response))
+
+    def accepts_ndjson(self):
+        return "application/x-ndjson" in self.headers.get("Accept", "")
+
+    def accepts_gzip(self):
+        for coding in self.headers.get("Accept-Encoding", "").split(","):
+            parts = [part.strip() for part in coding.split(";")]
+            if parts[0].lower() == "gzip":
+                return "q=0" not in parts
+        return False
+
+    def send_json_body(self, response_body):
+        """Send a JSON body, gzip-compressed when the client accepts it and it is large enough"""
         self.send_response(200)
         self.send_header("Content-Type", "application/json")
+        if len(response_body) >= GZIP_MIN_SIZE and self.accepts_gzip():
+            response_body = gzip_compress(response_body)
+            self.send_header("Content-Encoding", "gzip")
         self.send_header("Content-Length", len(response_body))
         self.end_headers()
         self.wfile.write(response_body)
 
     def do_POST(self):
-        global rpc_registry
+        # Always consume the body, otherwise it would be read as the next
+        # request on a keep-alive connection.
+        content_length = int(self.headers.get("Content-Length", 0))
+        request_body = self.rfile.read(content_length) if content_length > 0 else ""
 
         parsed_path = urlparse(self.path)
         if parsed_path.path != "/mcp":
             self.send_jsonrpc_error(-32098, "Invalid endpoint", None)
             return
 
-        content_length = int(self.headers.get("Content-Length", 0))
         if content_length == 0:
             self.send_jsonrpc_error(-32700, "Parse error: missing request body", None)
             return
 
-        request_body = self.rfile.read(content_length)
         try:
             request = json.loads(request_body)
         except ValueError:  # Python 2.7 uses ValueError instead of JSONDecodeError
             self.send_jsonrpc_error(-32700, "Parse error: invalid JSON", None)
             return
 
-        # Prepare the response
-        response = {
-            "jsonrpc": "2.0"
-        }
-        if request.get("id") is not None:
-            response["id"] = request.get("id")
-
-        try:
-            # Basic JSON-RPC validation
-            if not isinstance(request, dict):
-                raise JSONRPCError(-32600, "Invalid Request")
-            if request.get("jsonrpc") != "2.0":
-                raise JSONRPCError(-32600, "Invalid JSON-RPC version")
-            if "method" not in request:
-                raise JSONRPCError(-32600, "Method not specified")
-
-            # Dispatch the method
-            result = rpc_registry.dispatch(request["method"], request.get("params", []))
-            response["result"] = result
-
-        except JSONRPCError as e:
-            response["error"] = {
-                "code": e.code,
-                "message": e.message
-            }
-            if e.data is not None:
-                response["error"]["data"] = e.data
-        except Exception as e:
-            traceback.print_exc()
-            response["error"] = {
-                "code": -32603,
-                "message": "Internal error (please report a bug)",
-                "data": traceback.format_exc(),
-            }
+        if isinstance(request, list):
+            if not request:
+                self.send_jsonrpc_error(-32600, "Invalid Request: empty batch", None)
+                return
+            response = self.handle_batch(request)
+            if not response:
+                # A batch made only of notifications gets no response body
+                self.send_response(204)
+                self.send_header("Content-Length", 0)
+                self.end_headers()
+                return
+        elif self.accepts_ndjson() and rpc_registry.can_stream(request):
+            self.handle_stream(request)
+            return
+        else:
+            response = self.handle_request(request)
 
         try:
             response_body = json.dumps(response)
@@ -249,11 +762,126 @@ class JSONRPCRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
                 }
             })
 
+        self.send_json_body(response_body)
+
+    def handle_batch(self, requests):
+        """
+        Dispatch every entry of a JSON-RPC batch concurrently on the batch pool.
+        Responses keep the order of the requests; notifications are dropped.
+        """
+        futures = [self.server.batch_pool.submit(self.handle_request, request) for request in requests]
+        responses = []
+        for request, future in zip(requests, futures):
+            response = future.result()
+            if isinstance(request, dict) and "id" not in request:
+                continue
+            responses.append(response)
+        return responses
+
+    def handle_request(self, request):
+        """Dispatch a single JSON-RPC request object and build its response"""
+        global rpc_registry
+
+        # Prepare the response
+        response = self.new_response(request)
+
+        try:
+            self.validate_request(request)
+
+            # Dispatch the method
+            result = rpc_registry.dispatch(request["method"], request.get("params", []))
+            response["result"] = result
+
+        except Exception as e:
+            response["error"] = self.error_object(e)
+        return response
+
+    def handle_stream(self, request):
+        """
+        Send the results of a streaming method as newline-delimited JSON over
+        chunked transfer encoding, one {"item": ...} line per result as soon as
+        it is produced, then a final JSON-RPC response line carrying either
+        {"count": n} or the error that stopped the stream.
+        """
+        global rpc_registry
+
+        response = self.new_response(request)
+        stream = None
+        try:
+            self.validate_request(request)
+            stream = rpc_registry.dispatch_stream(request["method"], request.get("params", []))
+            # Errors raised before the first result get a plain JSON-RPC reply
+            item = next(stream, StopIteration)
+        except Exception as e:
+            if stream is not None:
+                stream.close()
+            response["error"] = self.error_object(e)
+            self.send_json_body(json.dumps(response))
+            return
+
         self.send_response(200)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Content-Length", len(response_body))
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
         self.end_headers()
-        self.wfile.write(response_body)
+        self.wfile.flush()
+
+        # Chunks bypass the buffered wfile, so nothing is left to flush if the
+        # client disconnects halfway
+        writer = ChunkedWriter(self.connection)
+        count = 0
+        try:
+            while item is not StopIteration:
+                writer.write_line(json.dumps({"item": item}))
+                count += 1
+                try:
+                    item = next(stream, StopIteration)
+                except Exception as e:
+                    response["error"] = self.error_object(e)
+                    break
+            else:
+                response["result"] = {"count": count}
+            writer.write_line(json.dumps(response))
+            writer.close()
+        except (socket.error, IOError):
+            # The client went away: stop the scan and drop the connection
+            self.close_connection = 1
+        finally:
+            writer.cancel()
+            stream.close()
+
+    def new_response(self, request):
+        response = {
+            "jsonrpc": "2.0"
+        }
+        if isinstance(request, dict) and request.get("id") is not None:
+            response["id"] = request.get("id")
+        return response
+
+    def validate_request(self, request):
+        # Basic JSON-RPC validation
+        if not isinstance(request, dict):
+            raise JSONRPCError(-32600, "Invalid Request")
+        if request.get("jsonrpc") != "2.0":
+            raise JSONRPCError(-32600, "Invalid JSON-RPC version")
+        if "method" not in request:
+            raise JSONRPCError(-32600, "Method not specified")
+
+    def error_object(self, e):
+        """Build the JSON-RPC error object for an exception raised by a method"""
+        if isinstance(e, JSONRPCError):
+            error = {
+                "code": e.code,
+                "message": e.message
+            }
+            if e.data is not None:
+                error["data"] = e.data
+            return error
+        traceback.print_exc()
+        return {
+            "code": -32603,
+            "message": "Internal error (please report a bug)",
+            "data": traceback.format_exc(),
+        }
 
     def log_message(self, format, *args):
         # Suppress logging
@@ -261,12 +889,43 @@ class JSONRPCRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
 
 
 class MCPHTTPServer(BaseHTTPServer.HTTPServer):
+    """HTTP server handing each accepted connection to a bounded worker pool"""
     allow_reuse_address = False
 
+    def __init__(self, server_address, handler_class, workers):
+        # Accepted connections wait in a bounded queue; once it is full the
+        # accept loop blocks and new clients queue up in the TCP backlog.
+        self.pool = WorkerPool("mcp-http", workers, workers * 4)
+        # Batch entries get their own pool: connection workers wait on them,
+        # so sharing one pool could deadlock once every worker is waiting.
+        self.batch_pool = WorkerPool("mcp-batch", workers)
+        # At most half of the workers wait on kept-alive connections
+        self.keep_alive_slots = threading.BoundedSemaphore(
+            int(os.getenv("JEB_MCP_KEEPALIVE_CONNECTIONS", "0")) or max(1, workers // 2))
+        # Binds the socket, and calls server_close() if that fails
+        BaseHTTPServer.HTTPServer.__init__(self, server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process_request_in_worker, request, client_address)
+
+    def _process_request_in_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        BaseHTTPServer.HTTPServer.server_close(self)
+        self.pool.shutdown()
+        self.batch_pool.shutdown()
+
 
 class Server(object):  # Use explicit inheritance from object for py2
     HOST = os.getenv("JEB_MCP_HOST", "127.0.0.1")
     PORT = int(os.getenv("JEB_MCP_PORT", "16161"))
+    WORKERS = int(os.getenv("JEB_MCP_WORKERS", "8"))
 
     def __init__(self):
         self.server = None
@@ -278,6 +937,8 @@ class Server(object):  # Use explicit inheritance from object for py2
             print("[MCP] Server is already running")
             return
 
+        # Install the per-thread sys.stdout and sys.stderr before any worker runs
+        thread_local_output()
         # Python 2.7 doesn't support daemon parameter in Thread constructor
         self.server_thread = threading.Thread(target=self._run_server)
         self.server_thread.daemon = True  # Set daemon attribute after creation
@@ -300,7 +961,7 @@ class Server(object):  # Use explicit inheritance from object for py2
     def _run_server(self):
         try:
             # Create server in the thread to handle binding
-            self.server = MCPHTTPServer((Server.HOST, Server.PORT), JSONRPCRequestHandler)
+            self.server = MCPHTTPServer((Server.HOST, Server.PORT), JSONRPCRequestHandler, Server.WORKERS)
             print("[MCP] Server started at http://{0}:{1}".format(Server.HOST, Server.PORT))
             self.server.serve_forever()
         except OSError as e:
@@ -320,6 +981,7 @@ def preprocess_manifest_py2(manifest_text):
     """
     一个为 Python 2 设计的、健壮的 Manifest 预处理函数。
     它会清理非法字符，并强行移除所有 <meta-data> 标签以避免解析错误。
+    逐字符处理，大型 Manifest 很慢，现在只作为 benchmark_manifest_sanitizer 的对照，请使用 sanitize_manifest。
     """
     # 1. 确保输入是 unicode 字符串，并忽略解码错误
     if isinstance(manifest_text, str):
@@ -353,106 +1015,716 @@ def preprocess_manifest_py2(manifest_text):
     
     return text_no_metadata
 
+# Characters XML 1.0 does not allow. java.util.regex matches code points, so
+# supplementary characters are kept and only unpaired surrogates are removed.
+ILLEGAL_XML_CHARS = Pattern.compile("[^\\t\\n\\r\\x20-\\uD7FF\\uE000-\\uFFFD\\x{10000}-\\x{10FFFF}]")
+META_DATA_TAG = re.compile(ur'<\s*meta-data.*?/>', re.DOTALL | re.IGNORECASE)
+
+
+def sanitize_manifest(manifest_text, strip_metadata=False):
+    """
+    清理 Manifest 中的非法 XML 字符，功能同 preprocess_manifest_py2，但由 java.util.regex
+    一次性完成，不再逐字符处理。默认保留 <meta-data> 标签，只有 strip_metadata 时才移除。
+    """
+    if isinstance(manifest_text, str):
+        try:
+            manifest_text = manifest_text.decode('utf-8')
+        except UnicodeDecodeError:
+            manifest_text = manifest_text.decode('utf-8', 'ignore')
+
+    matcher = ILLEGAL_XML_CHARS.matcher(manifest_text)
+    if matcher.find():
+        manifest_text = unicode(matcher.replaceAll(u""))
+    if strip_metadata:
+        manifest_text = META_DATA_TAG.sub(u'', manifest_text)
+    return manifest_text
+
+
+def benchmark_manifest_sanitizer(sizes=(256 * 1024, 1024 * 1024, 4 * 1024 * 1024)):
+    """
+    Benchmark of sanitize_manifest against the legacy preprocess_manifest_py2 on
+    synthetic manifests of the given sizes (in characters), run it from
+    execute_python_code with `print(benchmark_manifest_sanitizer())`.
+    """
+    component = (u'<activity android:name=".Activity%d" android:exported="true">'
+                 u'<intent-filter><action android:name="a\x01ction.VIEW" /></intent-filter>'
+                 u'<meta-data android:name="key%d" android:value="\u4e2d\u6587" /></activity>\n')
+    lines = []
+    for size in sizes:
+        parts = [u'<manifest xmlns:android="http://schemas.android.com/apk/res/android"><application>\n']
+        length = len(parts[0])
+        i = 0
+        while length < size:
+            part = component % (i, i)
+            parts.append(part)
+            length += len(part)
+            i += 1
+        parts.append(u'</application></manifest>')
+        text = u"".join(parts)
+
+        timings = []
+        for sanitize in (preprocess_manifest_py2,
+                         lambda t: sanitize_manifest(t, strip_metadata=True),
+                         sanitize_manifest):
+            start = time.time()
+            sanitize(text)
+            timings.append(time.time() - start)
+        lines.append("%d chars: legacy %.3f s, current %.3f s, current keeping meta-data %.3f s" % (
+            len(text), timings[0], timings[1], timings[2]))
+    return "\n".join(lines)
+
+
 @jsonrpc
 def ping():
     """Do a simple ping to check server is alive and running"""
     return "pong"
 
 
-# implement a FIFO queue to store the artifacts
-artifactQueue = list()
+def file_digest(filepath):
+    """SHA-256 of the file content, identifies an APK independently of its path"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-def addArtifactToQueue(artifact):
-    """Add an artifact to the queue"""
-    artifactQueue.append(artifact)
 
-def getArtifactFromQueue():
-    """Get an artifact from the queue"""
-    if len(artifactQueue) > 0:
-        return artifactQueue.pop(0)
-    return None
+# Rename generation of a freshly analyzed APK. Every rename switches the
+# artifact to a new random generation, so that text decompiled before the
+# rename, including by a previous run that crashed before saving, is never
+# served again. The generation is saved along with the project.
+INITIAL_GENERATION = "0"
 
-def clearArtifactQueue():
-    """Clear the artifact queue"""
-    global artifactQueue
-    artifactQueue = list()
 
-MAX_OPENED_ARTIFACTS = 1
+def new_generation():
+    return os.urandom(8).encode('hex')
 
-# 全局缓存，目前只缓存了Mainfest文本和exported组件，加载新的apk文件时将被清除。
-apk_cached_data = {}
 
-def getOrLoadApk(filepath):
-    if not os.path.exists(filepath):
+class LoadedArtifact(object):
+    """
+    A live artifact and the data derived from it (manifest text, component
+    lists, ...). The derived data lives exactly as long as the artifact stays
+    in the ArtifactCache, so it can never be served for another APK.
+    """
+
+    def __init__(self, filepath, digest, project_key, artifact, generation=None):
+        self.filepath = filepath
+        self.digest = digest
+        self.project_key = project_key
+        self.artifact = artifact
+        # Identifies the renames applied to the artifact, see new_generation()
+        self.generation = generation or INITIAL_GENERATION
+        self.lock = threading.Lock()
+        self.data = {}
+        self.compute_locks = {}
+        self.dirty = False  # modified since the project was last saved
+        self.unloaded = False
+
+    @property
+    def key(self):
+        return (self.filepath, self.digest)
+
+    def cached(self, name, compute):
+        """Return the derived value called name, computing it on first use"""
+        with self.lock:
+            if name in self.data:
+                return self.data[name]
+            compute_lock = self.compute_locks.setdefault(name, threading.Lock())
+        # Concurrent first calls wait for a single computation, while other
+        # values of the artifact stay available.
+        with compute_lock:
+            with self.lock:
+                if name in self.data:
+                    return self.data[name]
+            value = compute()
+            with self.lock:
+                self.data[name] = value
+            return value
+
+    def close(self):
+        """Release the derived data holding external resources, such as temporary files"""
+        with self.lock:
+            values = list(self.data.values())
+            self.data.clear()
+        for value in values:
+            if hasattr(value, "close"):
+                value.close()
+
+
+class ArtifactCache(object):
+    """
+    LRU of the live artifacts opened by the plugin, keyed by APK content hash
+    so that the same APK reached through several paths is analyzed once.
+    A path index remembers the (mtime, size, digest) seen for every path:
+    lookups only stat the file, and the APK is hashed again only when its
+    mtime or size changed.
+    The least recently used artifacts are unloaded when more than
+    max_artifacts are open, or while the JVM heap usage stays above
+    heap_limit (a fraction of the maximum heap).
+    """
+
+    def __init__(self, max_artifacts, heap_limit):
+        self.max_artifacts = max(1, max_artifacts)
+        self.heap_limit = heap_limit
+        self.lock = threading.RLock()
+        self.entries = collections.OrderedDict()  # digest -> LoadedArtifact
+        self.paths = {}  # filepath -> (mtime, size, digest)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _touch(self, digest):
+        loaded = self.entries.pop(digest, None)
+        if loaded is not None:
+            self.entries[digest] = loaded
+        return loaded
+
+    def get(self, filepath, stat):
+        """
+        Return the LoadedArtifact of the APK and mark it most recently used,
+        or None if its content is not loaded or the file changed since.
+        """
+        with self.lock:
+            record = self.paths.get(filepath)
+            loaded = None
+            if record is not None and record[:2] == (stat.st_mtime, stat.st_size):
+                loaded = self._touch(record[2])
+            if loaded is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return loaded
+
+    def digest(self, filepath, stat):
+        """Content hash of the APK, reusing the recorded one if the file did not change"""
+        with self.lock:
+            record = self.paths.get(filepath)
+        if record is not None and record[:2] == (stat.st_mtime, stat.st_size):
+            return record[2]
+        digest = file_digest(filepath)
+        with self.lock:
+            self.paths[filepath] = (stat.st_mtime, stat.st_size, digest)
+        return digest
+
+    def get_by_digest(self, digest):
+        with self.lock:
+            return self._touch(digest)
+
+    def put(self, loaded):
+        with self.lock:
+            self.entries.pop(loaded.digest, None)
+            self.entries[loaded.digest] = loaded
+
+    def is_loaded(self, filepath):
+        """Whether the current content of the file is loaded, without touching the LRU order or counters"""
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return False
+        with self.lock:
+            record = self.paths.get(filepath)
+            return record is not None and record[:2] == (stat.st_mtime, stat.st_size) and record[2] in self.entries
+
+    def aliases(self, filepath):
+        """All the paths known to hold the same content as filepath, filepath included"""
+        with self.lock:
+            record = self.paths.get(filepath)
+            if record is None:
+                return [filepath]
+            return sorted(set([filepath] + self._paths_of(record[2])))
+
+    def _paths_of(self, digest):
+        return [path for path, record in self.paths.items() if record[2] == digest]
+
+    def heap_usage(self):
+        runtime = Runtime.getRuntime()
+        return float(runtime.totalMemory() - runtime.freeMemory()) / runtime.maxMemory()
+
+    def _take_victim(self, skipped):
+        """
+        Remove the next artifact to unload from the cache and return
+        (loaded, paths, write locks of the paths, over_count), or None once
+        there is room. Called with self.lock held.
+        """
+        # Artifacts no path leads to anymore (their file changed) go first
+        candidates = sorted(self.entries.items(), key=lambda entry: bool(self._paths_of(entry[0])))
+        for digest, loaded in candidates:
+            over_count = len(self.entries) >= self.max_artifacts
+            if not over_count and self.heap_usage() <= self.heap_limit:
+                return None
+            if digest in skipped:
+                continue
+            paths = sorted(set([loaded.filepath] + self._paths_of(digest)))
+            locks = []
+            for path in paths:
+                lock = artifact_locks.get(path)
+                if not lock.acquire_write(blocking=False):
+                    break
+                locks.append(lock)
+            if len(locks) < len(paths):
+                for lock in locks:
+                    lock.release_write()
+                skipped.add(digest)
+                continue
+            del self.entries[digest]
+            self.evictions += 1
+            return loaded, paths, locks, over_count
+        return None
+
+    def make_room(self):
+        """
+        Unload the least recently used artifacts until there is room for a new
+        one and the heap is below its limit. Artifacts that another request is
+        still using, through any of their paths, are skipped, so the limits may
+        be exceeded briefly instead of destroying an artifact under a reader.
+        Only the choice of the artifact holds self.lock: saving and unloading
+        its project happen under the artifact's own write locks, so lookups of
+        the other APKs do not wait for them.
+        """
+        skipped = set()
+        while True:
+            with self.lock:
+                victim = self._take_victim(skipped)
+            if victim is None:
+                return
+            loaded, paths, locks, over_count = victim
+            try:
+                for path in paths:
+                    scan_cursors.discard(path)
+                if over_count:
+                    print('Unloading artifact: %s because the artifact limit was reached' % loaded.filepath)
+                else:
+                    print('Unloading artifact: %s because heap usage is above %d%%' % (loaded.filepath, self.heap_limit * 100))
+                project_store.unload(loaded)
+                loaded.close()
+            finally:
+                for lock in locks:
+                    lock.release_write()
+            if not over_count:
+                # Let the heap usage reflect the unloaded artifact before
+                # deciding whether another one must go
+                System.gc()
+
+    def close(self):
+        """Release the derived data of every artifact, used when the plugin terminates"""
+        with self.lock:
+            loaded_artifacts = list(self.entries.values())
+        for loaded in loaded_artifacts:
+            loaded.close()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "artifacts": [
+                    {"filepath": loaded.filepath, "digest": digest, "paths": sorted(self._paths_of(digest))}
+                    for digest, loaded in self.entries.items()
+                ],
+                "max_artifacts": self.max_artifacts,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "heap_usage": round(self.heap_usage(), 3),
+                "heap_limit": self.heap_limit,
+            }
+
+
+artifact_cache = ArtifactCache(
+    int(os.getenv("JEB_MCP_MAX_ARTIFACTS", "3")),
+    float(os.getenv("JEB_MCP_HEAP_LIMIT", "0.75")),
+)
+
+# Serializes project loading and unloading between worker threads.
+artifact_load_lock = threading.RLock()
+
+
+class ProjectStore(object):
+    """
+    Saves the plugin projects as JEB databases (.jdb2) named after the APK
+    content hash, one project per APK. A restarted JEB then reopens analyzed
+    APKs, renames included, instead of analyzing them again.
+    Saves are delayed by save_delay seconds so that a burst of renames is
+    written once. Without a directory the projects only live in memory.
+    """
+
+    def __init__(self, directory, save_delay):
+        self.directory = directory
+        self.save_delay = save_delay
+        self.lock = threading.Lock()
+        self.timers = {}  # project key -> threading.Timer
+
+    def project_key(self, digest):
+        if not self.directory:
+            return 'MCP-' + digest
+        return os.path.join(self.directory, digest + '.jdb2')
+
+    def open(self, engctx, project_key):
+        """
+        Return the project and the rename generation of its artifact, loading
+        the project from its database if it exists. A project JEB still had
+        open may hold unsaved renames, so it gets a new generation.
+        """
+        project = engctx.getProject(project_key)
+        if project is not None:
+            return project, new_generation()
+        generation = INITIAL_GENERATION
+        if self.directory:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            if os.path.isfile(project_key):
+                print('Reopening saved project: %s' % project_key)
+                generation = self._read_generation(project_key)
+        return engctx.loadProject(project_key), generation
+
+    def _generation_file(self, project_key):
+        return os.path.splitext(project_key)[0] + '.generation'
+
+    def _read_generation(self, project_key):
+        try:
+            with open(self._generation_file(project_key)) as f:
+                return f.read().strip() or INITIAL_GENERATION
+        except IOError:
+            return INITIAL_GENERATION
+
+    def _write_generation(self, loaded, generation):
+        filename = self._generation_file(loaded.project_key)
+        if generation == INITIAL_GENERATION:
+            if os.path.exists(filename):
+                os.remove(filename)
+            return
+        with open(filename + '.tmp', 'w') as f:
+            f.write(generation)
+        if os.path.exists(filename):
+            os.remove(filename)  # os.rename does not replace files on Windows
+        os.rename(filename + '.tmp', filename)
+
+    def schedule_save(self, loaded):
+        if not self.directory:
+            return
+        with self.lock:
+            timer = self.timers.pop(loaded.project_key, None)
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(self.save_delay, self._save_later, [loaded])
+            timer.daemon = True
+            self.timers[loaded.project_key] = timer
+            timer.start()
+
+    def _save_later(self, loaded):
+        with self.lock:
+            self.timers.pop(loaded.project_key, None)
+        # The read locks of every path of the APK keep renames and unloading
+        # away while the database is written; locks are taken in path order.
+        locks = [artifact_locks.get(path) for path in artifact_cache.aliases(loaded.filepath)]
+        for lock in locks:
+            lock.acquire_read()
+        try:
+            if loaded.dirty and not loaded.unloaded:
+                self.save(loaded)
+        finally:
+            for lock in reversed(locks):
+                lock.release_read()
+
+    def save(self, loaded):
+        """Write the project of the artifact to its database now"""
+        if not self.directory:
+            return
+        loaded.dirty = False
+        generation = loaded.generation
+        try:
+            saved = CTX.getEnginesContext().saveProject(loaded.project_key, loaded.project_key, None, None)
+            if saved:
+                # The saved renames are those of this generation
+                self._write_generation(loaded, generation)
+                decompile_cache.prune(loaded.digest, generation)
+        except Exception as e:
+            print('[MCP] Error saving project %s: %s' % (loaded.project_key, e))
+            saved = False
+        if saved:
+            print('Saved project: %s' % loaded.project_key)
+        else:
+            loaded.dirty = True
+
+    def unload(self, loaded):
+        """Save the project of the artifact if it changed, then close it"""
+        with self.lock:
+            timer = self.timers.pop(loaded.project_key, None)
+        if timer is not None:
+            timer.cancel()
+        if loaded.dirty:
+            self.save(loaded)
+        loaded.unloaded = True
+        CTX.getEnginesContext().unloadProject(loaded.project_key)
+
+    def flush(self):
+        """Save every modified project now, used when the plugin terminates"""
+        with self.lock:
+            timers = list(self.timers.values())
+            self.timers.clear()
+        for timer in timers:
+            timer.cancel()
+        with artifact_cache.lock:
+            loaded_artifacts = list(artifact_cache.entries.values())
+        for loaded in loaded_artifacts:
+            if loaded.dirty:
+                self.save(loaded)
+
+
+project_store = ProjectStore(
+    os.getenv("JEB_MCP_PROJECT_DIR", os.path.join(os.path.expanduser("~"), ".jeb-mcp", "projects")),
+    float(os.getenv("JEB_MCP_SAVE_DELAY", "5")),
+)
+
+def getLoadedArtifact(filepath):
+    """Return the LoadedArtifact of the APK, loading it into the project if needed"""
+    try:
+        stat = os.stat(filepath)
+    except OSError:
         print("File not found: %s" % filepath)
         raise JSONRPCError(-1, ErrorMessages.LOAD_APK_NOT_FOUND)
 
+    loaded = artifact_cache.get(filepath, stat)
+    if loaded:
+        return loaded
+
     engctx = CTX.getEnginesContext()
 
     if not engctx:
         print('Back-end engines not initialized')
         raise JSONRPCError(-1, ErrorMessages.LOAD_APK_FAILED)
 
-    # Create a project
-    project = engctx.loadProject('MCPPluginProject')
-    correspondingArtifact = None
-    for artifact in project.getLiveArtifacts():
-        if artifact.getArtifact().getName() == filepath:
-            # If the artifact is already loaded, return it
+    with artifact_load_lock:
+        # The APK may have been loaded meanwhile, or under another path
+        digest = artifact_cache.digest(filepath, stat)
+        loaded = artifact_cache.get_by_digest(digest)
+        if loaded:
+            return loaded
+
+        # unload the least recently used artifacts if needed before opening this one
+        artifact_cache.make_room()
+
+        # Each APK has its own project, reopened from its database if it was analyzed before
+        project_key = project_store.project_key(digest)
+        project, generation = project_store.open(engctx, project_key)
+        correspondingArtifact = None
+        for artifact in project.getLiveArtifacts():
             correspondingArtifact = artifact
             break
-    if not correspondingArtifact:
-        # try to load the artifact, but first check if the queue size has been exceeded
-        if len(artifactQueue) >= MAX_OPENED_ARTIFACTS:
-            # unload the oldest artifact
-            oldestArtifact = getArtifactFromQueue()
-            if oldestArtifact:
-                # unload the artifact
-                oldestArtifactName = oldestArtifact.getArtifact().getName()
-                print('Unloading artifact: %s because queue size limit exeeded' % oldestArtifactName)
-                RuntimeProjectUtil.destroyLiveArtifact(oldestArtifact)
-
-        # Fix: 直接用filepath而不是basename作为Artifact的名称，否则如果加载了多个同名不同路径的apk，会出现问题。
-        correspondingArtifact = project.processArtifact(Artifact(filepath, FileInput(File(filepath))))
-        addArtifactToQueue(correspondingArtifact)
-        apk_cached_data.clear()
-    
-    unit = correspondingArtifact.getMainUnit()
+        analyzed = False
+        if not correspondingArtifact:
+            # Fix: 直接用filepath而不是basename作为Artifact的名称，否则如果加载了多个同名不同路径的apk，会出现问题。
+            correspondingArtifact = project.processArtifact(Artifact(filepath, FileInput(File(filepath))))
+            analyzed = True
+            generation = INITIAL_GENERATION
+        loaded = LoadedArtifact(filepath, digest, project_key, correspondingArtifact, generation)
+        artifact_cache.put(loaded)
+        if analyzed:
+            markModified(loaded)
+        return loaded
+
+
+def markRenamed(loaded):
+    """Record a rename: decompiled text cached for the previous generation no longer applies"""
+    loaded.generation = new_generation()
+    markModified(loaded)
+
+
+def markModified(loaded):
+    """Record that the project of the artifact changed and must be saved again"""
+    loaded.dirty = True
+    project_store.schedule_save(loaded)
+
+
+def getOrLoadApk(filepath):
+    unit = getLoadedArtifact(filepath).artifact.getMainUnit()
     if isinstance(unit, IApkUnit):
         # If the unit is already loaded, return it
         return unit    
     raise JSONRPCError(-1, ErrorMessages.LOAD_APK_FAILED)
 
 
-def get_manifest(filepath):
-    """Get the manifest of the given APK file in path, note filepath needs to be an absolute path"""
+@jsonrpc
+def get_cache_stats():
+    """Report the hit, miss and eviction counts of the plugin caches"""
+    return {
+        "artifacts": artifact_cache.stats(),
+        "decompiled": decompile_cache.stats(),
+    }
+
+
+class ApkPreloader(object):
+    """
+    Loads APKs in the background for preload_apk, then warms the data the
+    first queries need. Keeps the status of the last preload of every path
+    for get_load_status.
+    """
+    WORKERS = 2
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.status = {}  # filepath -> status dict
+        self.pool = None
+
+    def submit(self, filepath):
+        """Start preloading the APK unless a preload of it is already pending"""
+        with self.lock:
+            status = self.status.get(filepath)
+            if status is not None and status["state"] in ("queued", "loading", "warming"):
+                return dict(status)
+            status = {
+                "filepath": filepath,
+                "state": "queued",
+                "stage": None,
+                "progress": 0.0,
+                "queued_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "error": None,
+                "warnings": [],
+            }
+            self.status[filepath] = status
+            if self.pool is None:
+                self.pool = WorkerPool("preload", self.WORKERS)
+            result = dict(status)
+        self.pool.submit(self._run, filepath, status)
+        return result
+
+    def _update(self, status, **changes):
+        with self.lock:
+            status.update(changes)
+
+    def _run(self, filepath, status):
+        stages = [("load", getLoadedArtifact)] + list(WARM_UP_STAGES)
+        self._update(status, state="loading", started_at=time.time())
+        # Hold the read lock like an RPC on this APK would, so that the
+        # artifact is not unloaded while it is being warmed.
+        lock = artifact_locks.get(filepath)
+        lock.acquire_read()
+        try:
+            for done, (stage, warm) in enumerate(stages):
+                self._update(status, stage=stage, progress=round(float(done) / len(stages), 2))
+                try:
+                    warm(filepath)
+                except Exception as e:
+                    if stage == "load":
+                        raise
+                    # A failed warm-up only makes the first query slower
+                    self._update(status, warnings=status["warnings"] + ["%s: %s" % (stage, getattr(e, "message", e))])
+                if stage == "load":
+                    self._update(status, state="warming")
+            self._update(status, state="ready", stage=None, progress=1.0)
+        except Exception as e:
+            traceback.print_exc()
+            self._update(status, state="failed", error=str(getattr(e, "message", e)))
+        finally:
+            lock.release_read()
+            self._update(status, finished_at=time.time())
+
+    def get(self, filepath):
+        with self.lock:
+            status = self.status.get(filepath)
+            status = dict(status) if status is not None else {"filepath": filepath, "state": None}
+        end = status.get("finished_at") or time.time()
+        if status.get("started_at"):
+            status["elapsed"] = round(end - status["started_at"], 3)
+        # The APK may also have been loaded by a regular query, or unloaded since
+        status["loaded"] = artifact_cache.is_loaded(filepath)
+        return status
+
+
+def get_string_pool(filepath):
+    """The (value, item id) of every string of the dex, read once per artifact"""
+    def load_strings():
+        pool = []
+        strings = getOrLoadApk(filepath).getDex().getStrings()
+        for s in strings or []:
+            val = s.getValue()
+            if val is not None:
+                pool.append((val, s.getItemId()))
+        return pool
+
+    return getLoadedArtifact(filepath).cached('string_pool', load_strings)
+
+
+WARM_UP_STAGES = (
+    ("manifest", lambda filepath: get_manifest(filepath)),
+    ("components", lambda filepath: get_manifest_model(filepath)),
+    ("strings", get_string_pool),
+)
+
+apk_preloader = ApkPreloader()
+
+
+@jsonrpc
+def preload_apk(filepath):
+    """
+    Start loading the APK in the background and return immediately. Once it is
+    loaded its manifest, component lists and string pool are warmed up.
+    Poll get_load_status to know when it is ready.
+    """
     if not filepath:
         raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
-
-    apk = getOrLoadApk(filepath)  # Fixed: use getOrLoadApk function to load the APK
-    
-    if 'manifest' in apk_cached_data:
-        return apk_cached_data['manifest']
-    
-    man = apk.getManifest()
-    if man is None:
-        raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
-    
-    doc = man.getFormatter().getPresentation(0).getDocument()
-    text = TextDocumentUtil.getText(doc)
-    apk_cached_data['manifest'] = text
-    return text
+    if not os.path.exists(filepath):
+        raise JSONRPCError(-1, ErrorMessages.LOAD_APK_NOT_FOUND)
+    return apk_preloader.submit(filepath)
 
 
 @jsonrpc
-def search_manifest(filepath, regex_pattern):
+def get_load_status(filepath):
     """
-    Search the content of AndroidManifest.xml using a regular expression.
-    Returns matches with a fixed +/- 64 characters context window.
+    Report the progress of the last preload_apk of the APK: its state (queued,
+    loading, warming, ready or failed), current stage and elapsed seconds, and
+    whether the APK is currently loaded.
     """
-    if not filepath or not regex_pattern:
+    if not filepath:
         raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
-    
+    return apk_preloader.get(filepath)
+
+
+def get_manifest(filepath):
+    """Get the manifest of the given APK file in path, note filepath needs to be an absolute path"""
+    if not filepath:
+        raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
+
+    apk = getOrLoadApk(filepath)  # Fixed: use getOrLoadApk function to load the APK
+
+    def load_manifest():
+        man = apk.getManifest()
+        if man is None:
+            raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
+        doc = man.getFormatter().getPresentation(0).getDocument()
+        return TextDocumentUtil.getText(doc)
+
+    return getLoadedArtifact(filepath).cached('manifest', load_manifest)
+
+
+class LineIndex(object):
+    """
+    Offsets of the newlines of a text, built in one pass so that the line
+    number of each match is a binary search instead of counting the
+    newlines before it.
+    """
+
+    def __init__(self, text):
+        self.newlines = array('i')
+        offset = text.find(u'\n')
+        while offset != -1:
+            self.newlines.append(offset)
+            offset = text.find(u'\n', offset + 1)
+
+    def line_number(self, offset):
+        """1-based line number of the character at offset"""
+        return bisect.bisect_left(self.newlines, offset) + 1
+
+
+@jsonrpc
+def search_manifest(filepath, regex_pattern):
+    """
+    Search the content of AndroidManifest.xml using a regular expression.
+    Returns matches with a fixed +/- 64 characters context window.
+    """
+    if not filepath or not regex_pattern:
+        raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
+    
     manifest_raw = get_manifest(filepath)
     
     try:
@@ -472,6 +1744,9 @@ def search_manifest(filepath, regex_pattern):
     else:
         text_content = manifest_raw
 
+    # 行号索引随 artifact 缓存，只在第一次匹配时构建
+    lines = None
+
     # 使用 finditer 获取字符索引
     for match in pattern.finditer(text_content):
         start = match.start()
@@ -482,16 +1757,228 @@ def search_manifest(filepath, regex_pattern):
         ctx_start = max(0, start - 64)
         ctx_end = min(len(text_content), end + 64)
         context_chars = text_content[ctx_start:ctx_end]
+
+        if lines is None:
+            lines = getLoadedArtifact(filepath).cached('manifest_lines', lambda: LineIndex(text_content))
         
         results.append({
             "match": m_str,
             "offset": start,
-            "line_number": text_content.count('\n', 0, start) + 1,
+            "line_number": lines.line_number(start),
             "context": context_chars.strip()
         })
             
     return results
 
+ANDROID_NS = 'http://schemas.android.com/apk/res/android'
+
+
+def android_attr(node, name):
+    return node.attrib.get('{' + ANDROID_NS + '}' + name)
+
+
+class ManifestModel(object):
+    """
+    The parts of AndroidManifest.xml the manifest tools answer from, built in
+    a single pass: the package, every component with its exported state,
+    intent filters, permissions, process and authorities, and the permissions
+    the APK defines and requests.
+    """
+    COMPONENT_TAGS = ('activity', 'activity-alias', 'service', 'receiver', 'provider')
+    DATA_ATTRS = ('scheme', 'host', 'port', 'path', 'pathPrefix', 'pathPattern', 'mimeType')
+
+    def __init__(self, root):
+        # 获取包名
+        self.package = root.attrib.get('package', '').strip()
+
+        # 查找 <application> 节点
+        app_node = root.find('application')
+        if app_node is None:
+            raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
+        self.application = {
+            "name": android_attr(app_node, 'name'),
+            "process": android_attr(app_node, 'process'),
+            "permission": android_attr(app_node, 'permission'),
+        }
+
+        self.components = []
+        for node in app_node:
+            if node.tag in self.COMPONENT_TAGS:
+                component = self._component(node)
+                if component is not None:
+                    self.components.append(component)
+
+        self.permissions = []
+        for perm in root.findall('permission'):
+            name = android_attr(perm, 'name')
+            if name:
+                self.permissions.append({
+                    "name": name,
+                    "protection_level": android_attr(perm, 'protectionLevel'),
+                })
+
+        self.uses_permissions = []
+        for perm in root.findall('uses-permission'):
+            name = android_attr(perm, 'name')
+            if name:
+                self.uses_permissions.append(name)
+
+        self._build_index()
+
+    def normalize_names(self, name):
+        """
+        Class names a component name may refer to:
+        - If it starts with '.', prepend the package name
+        - If it has no '.', both the original and package-prefixed versions
+        - If it's a full class name, keep as-is
+        """
+        if name.startswith('.'):
+            return [self.package + name]
+        if '.' not in name:
+            return [name, self.package + '.' + name]
+        return [name]
+
+    def _component(self, node):
+        raw_name = android_attr(node, 'name')
+        if not raw_name:
+            return None
+        intent_filters = [self._intent_filter(f) for f in node.findall('intent-filter')]
+        exported_attr = android_attr(node, 'exported')
+        names = self.normalize_names(raw_name)
+        component = {
+            "type": node.tag,
+            "name": names[-1],
+            "names": names,
+            # Exported explicitly, or implicitly by an intent filter unless
+            # android:exported="false" is set
+            "exported": exported_attr == "true" or (exported_attr is None and len(intent_filters) > 0),
+            "enabled": android_attr(node, 'enabled') != "false",
+            "permission": android_attr(node, 'permission') or self.application["permission"],
+            "process": android_attr(node, 'process') or self.application["process"],
+            "intent_filters": intent_filters,
+        }
+        if node.tag == 'provider':
+            authorities = android_attr(node, 'authorities') or ''
+            component["authorities"] = [a.strip() for a in authorities.split(';') if a.strip()]
+            component["read_permission"] = android_attr(node, 'readPermission')
+            component["write_permission"] = android_attr(node, 'writePermission')
+            component["grant_uri_permissions"] = android_attr(node, 'grantUriPermissions') == "true"
+        elif node.tag == 'activity-alias':
+            target = android_attr(node, 'targetActivity')
+            component["target_activity"] = self.normalize_names(target)[-1] if target else None
+        return component
+
+    def _intent_filter(self, node):
+        data = []
+        for data_node in node.findall('data'):
+            attrs = dict((attr, android_attr(data_node, attr)) for attr in self.DATA_ATTRS)
+            data.append(dict((k, v) for k, v in attrs.items() if v is not None))
+        return {
+            "actions": [android_attr(n, 'name') for n in node.findall('action') if android_attr(n, 'name')],
+            "categories": [android_attr(n, 'name') for n in node.findall('category') if android_attr(n, 'name')],
+            "data": data,
+            "priority": android_attr(node, 'priority'),
+        }
+
+    def _build_index(self):
+        """
+        Map the action, category, data scheme and host values to the intent
+        filters declaring them, as (component index, filter index) pairs, and
+        provider authorities to component indexes. Schemes, hosts and
+        authorities are matched case-insensitively, like Android does.
+        """
+        self.filter_index = {"action": {}, "category": {}, "scheme": {}, "host": {}}
+        self.authority_index = {}
+        for ci, component in enumerate(self.components):
+            for fi, intent_filter in enumerate(component["intent_filters"]):
+                values = {
+                    "action": intent_filter["actions"],
+                    "category": intent_filter["categories"],
+                    "scheme": [data["scheme"].lower() for data in intent_filter["data"] if "scheme" in data],
+                    "host": [data["host"].lower() for data in intent_filter["data"] if "host" in data],
+                }
+                for key, key_values in values.items():
+                    for value in key_values:
+                        self.filter_index[key].setdefault(value, set()).add((ci, fi))
+            for authority in component.get("authorities", ()):
+                self.authority_index.setdefault(authority.lower(), set()).add(ci)
+
+    @staticmethod
+    def is_protected(component):
+        """Whether a permission guards the component; for providers a read or write permission counts"""
+        return bool(component["permission"] or component.get("read_permission") or component.get("write_permission"))
+
+    def query(self, component_type=None, action=None, category=None, scheme=None, host=None,
+              authority=None, exported=None, protected=None):
+        """
+        Components matching every given criterion. action, category, scheme
+        and host must all be declared by the same intent filter.
+        """
+        candidates = None
+        filter_criteria = (("action", action), ("category", category),
+                           ("scheme", scheme and scheme.lower()), ("host", host and host.lower()))
+        for key, value in filter_criteria:
+            if value:
+                matches = self.filter_index[key].get(value, set())
+                candidates = matches if candidates is None else candidates & matches
+        if candidates is not None:
+            candidates = set(ci for ci, _ in candidates)
+        if authority:
+            matches = self.authority_index.get(authority.lower(), set())
+            candidates = matches if candidates is None else candidates & matches
+        if candidates is None:
+            candidates = range(len(self.components))
+
+        results = []
+        for ci in sorted(candidates):
+            component = self.components[ci]
+            if component_type and component["type"] != component_type:
+                continue
+            if exported is not None and component["exported"] != exported:
+                continue
+            if protected is not None and self.is_protected(component) != protected:
+                continue
+            results.append(component)
+        return results
+
+    def exported_names(self, component_type):
+        """Class names of the exported components of the given type"""
+        names = []
+        for component in self.components:
+            if component["type"] == component_type and component["exported"]:
+                names.extend(component["names"])
+        return names
+
+
+def get_sanitized_manifest(filepath):
+    """The manifest text with its illegal XML characters removed, computed once per artifact"""
+    return getLoadedArtifact(filepath).cached(
+        'sanitized_manifest', lambda: sanitize_manifest(get_manifest(filepath)))
+
+
+def get_manifest_model(filepath):
+    """The ManifestModel of the APK, parsed once per artifact"""
+    def parse_manifest():
+        from xml.etree import ElementTree as ET
+
+        manifest_text = get_sanitized_manifest(filepath)
+        if not manifest_text:
+            raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
+        try:
+            root = ET.fromstring(manifest_text.encode('utf-8'))
+        except Exception as e:
+            # <meta-data> values of some packed apps do not parse, retry without them
+            print("[MCP] Error parsing manifest, retrying without <meta-data>:", e)
+            try:
+                root = ET.fromstring(META_DATA_TAG.sub(u'', manifest_text).encode('utf-8'))
+            except Exception as e:
+                print("[MCP] Error parsing manifest:", e)
+                raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
+        return ManifestModel(root)
+
+    return getLoadedArtifact(filepath).cached('manifest_model', parse_manifest)
+
+
 @jsonrpc
 def get_all_exported_activities(filepath):
     """
@@ -513,59 +2000,8 @@ def get_all_exported_activities(filepath):
     """
     if not filepath:
         raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
-    
-    from xml.etree import ElementTree as ET
-
-    manifest_text = get_manifest(filepath)
-    manifest_text = preprocess_manifest_py2(manifest_text)
-
-    if not manifest_text:
-        raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
-    
-    # 首先尝试在缓存中取，跳过XML解析。
-    if 'exported_activities' in apk_cached_data:
-        return apk_cached_data['exported_activities']
-
-    try:
-        root = ET.fromstring(manifest_text.encode('utf-8'))
-    except Exception as e:
-        print("[MCP] Error parsing manifest:", e)
-        raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
-
-    ANDROID_NS = 'http://schemas.android.com/apk/res/android'
-    exported_activities = []
-
-    # 获取包名
-    package_name = root.attrib.get('package', '').strip()
-
-    # 查找 <application> 节点
-    app_node = root.find('application')
-    if app_node is None:
-        raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
-
-    for activity in app_node.findall('activity'):
-        name = activity.attrib.get('{' + ANDROID_NS + '}name')
-        exported = activity.attrib.get('{' + ANDROID_NS + '}exported')
-        has_intent_filter = len(activity.findall('intent-filter')) > 0
-
-        if not name:
-            continue
 
-        if exported == "true" or (exported is None and has_intent_filter):
-            normalized = set()
-
-            if name.startswith('.'):
-                normalized.add(package_name + name)
-            elif '.' not in name:
-                normalized.add(name)
-                normalized.add(package_name + '.' + name)
-            else:
-                normalized.add(name)
-
-            exported_activities.extend(normalized)
-    # 缓存导出Activity数据
-    apk_cached_data['exported_activities'] = exported_activities
-    return exported_activities
+    return get_manifest_model(filepath).exported_names('activity')
 
 
 @jsonrpc
@@ -589,383 +2025,1429 @@ def get_all_exported_services(filepath):
     """
     if not filepath:
         raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
-    
-    from xml.etree import ElementTree as ET
 
-    manifest_text = get_manifest(filepath)
-    manifest_text = preprocess_manifest_py2(manifest_text)
+    return get_manifest_model(filepath).exported_names('service')
 
-    if not manifest_text:
-        raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
-    
-    # 首先尝试在缓存中取，跳过XML解析。
-    if 'exported_services' in apk_cached_data:
-        return apk_cached_data['exported_services']
 
-    try:
-        root = ET.fromstring(manifest_text.encode('utf-8'))
-    except Exception as e:
-        print("[MCP] Error parsing manifest:", e)
-        raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
+@jsonrpc
+def get_all_exported_receivers(filepath):
+    """
+    Get all exported Receiver components from the APK and normalize their class names.
+    """
+    if not filepath:
+        raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
 
-    ANDROID_NS = 'http://schemas.android.com/apk/res/android'
-    exported_services = []
+    return get_manifest_model(filepath).exported_names('receiver')
 
-    # 获取包名
-    package_name = root.attrib.get('package', '').strip()
 
-    # 查找 <application> 节点
-    app_node = root.find('application')
-    if app_node is None:
-        raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
+@jsonrpc
+def get_all_exported_providers(filepath):
+    """
+    Get all exported Provider components from the APK and normalize their class names.
+    """
+    if not filepath:
+        raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
+
+    return get_manifest_model(filepath).exported_names('provider')
 
-    for activity in app_node.findall('service'):
-        name = activity.attrib.get('{' + ANDROID_NS + '}name')
-        exported = activity.attrib.get('{' + ANDROID_NS + '}exported')
-        has_intent_filter = len(activity.findall('intent-filter')) > 0
 
-        if not name:
-            continue
+@jsonrpc
+def query_components(filepath, component_type=None, action=None, category=None, scheme=None, host=None,
+                     authority=None, exported=None, protected=None):
+    """
+    Find the manifest components matching all the given filters, through an
+    index of their intent filters:
+    - component_type: activity, activity-alias, service, receiver or provider
+    - action, category, scheme, host: declared together by one intent filter
+    - authority: one of the authorities of a provider
+    - exported: true or false to keep only exported or non-exported components
+    - protected: true or false to keep only components with or without a permission;
+      a provider guarded by a readPermission or writePermission only counts as protected
+    Unset filters match everything. Returns the components with their names,
+    exported state, intent filters, permission, process and authorities.
+    """
+    if not filepath:
+        raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
+    if component_type and component_type not in ManifestModel.COMPONENT_TAGS:
+        raise JSONRPCError(-32602, "Invalid params: component_type must be one of " + ", ".join(ManifestModel.COMPONENT_TAGS))
 
-        if exported == "true" or (exported is None and has_intent_filter):
-            normalized = set()
+    return get_manifest_model(filepath).query(
+        component_type, action, category, scheme, host, authority, exported, protected)
 
-            if name.startswith('.'):
-                normalized.add(package_name + name)
-            elif '.' not in name:
-                normalized.add(name)
-                normalized.add(package_name + '.' + name)
-            else:
-                normalized.add(name)
 
-            exported_services.extend(normalized)
-    # 缓存导出Service数据
-    apk_cached_data['exported_services'] = exported_services
-    return exported_services
+@jsonrpc
+def get_permissions(filepath):
+    """
+    Get all defined custom permissions from the APK manifest.
+    """
+    if not filepath:
+        raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
+
+    return [permission['name'] for permission in get_manifest_model(filepath).permissions]
 
 
 @jsonrpc
-def get_all_exported_receivers(filepath):
+def get_use_permissions(filepath):
     """
-    Get all exported Receiver components from the APK and normalize their class names.
+    Get all requested (uses-permission) permissions from the APK manifest.
     """
     if not filepath:
         raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
-    
-    from xml.etree import ElementTree as ET
 
-    manifest_text = get_manifest(filepath)
-    manifest_text = preprocess_manifest_py2(manifest_text)
+    return list(get_manifest_model(filepath).uses_permissions)
 
-    if not manifest_text:
-        raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
-    
-    if 'exported_receivers' in apk_cached_data:
-        return apk_cached_data['exported_receivers']
 
+# Byte budgets of search_assets, so that huge assets cannot exhaust the heap
+# or keep a search running for minutes.
+ASSET_MAX_FILE_BYTES = int(os.getenv("JEB_MCP_ASSET_MAX_FILE_BYTES", str(64 * 1024 * 1024)))
+ASSET_MAX_TOTAL_BYTES = int(os.getenv("JEB_MCP_ASSET_MAX_TOTAL_BYTES", str(1024 * 1024 * 1024)))
+
+# Threads scanning asset files in parallel, shared by all search_assets calls.
+ASSET_WORKERS = int(os.getenv("JEB_MCP_ASSET_WORKERS", "0")) or Runtime.getRuntime().availableProcessors()
+
+TEXT_EXTENSIONS = set(['.txt', '.json', '.xml', '.html', '.js', '.css', '.properties', '.yaml', '.yml', '.csv', '.ini', '.md'])
+
+
+def parse_globs(globs):
+    """Accept a list of glob patterns or a comma-separated string of them"""
+    if not globs:
+        return []
+    if isinstance(globs, basestring):
+        globs = globs.split(',')
+    return [glob.strip() for glob in globs if glob.strip()]
+
+
+def asset_selector(include=None, exclude=None):
+    """
+    Predicate on asset paths: a file is kept if its path matches one of the
+    include globs (all files when there are none) and none of the exclude globs.
+    """
+    include = parse_globs(include)
+    exclude = parse_globs(exclude)
+
+    def selected(path):
+        if include and not any(fnmatch.fnmatch(path, glob) for glob in include):
+            return False
+        return not any(fnmatch.fnmatch(path, glob) for glob in exclude)
+    return selected
+
+
+def iter_asset_files(apk):
+    """Yield (path, unit) for every file under the APK's 'assets' directory, in breadth-first order"""
+    assets_root_unit = None
+    for child_unit in apk.getChildren():
+        if child_unit.getName() == 'Assets':
+            assets_root_unit = child_unit
+            break
+
+    if not assets_root_unit:
+        return
+
+    queue = collections.deque([(assets_root_unit, '')])
+    while queue:
+        current_unit, current_path = queue.popleft()
+
+        if current_unit == assets_root_unit:
+            path = current_path
+        else:
+            unit_name = current_unit.getName()
+            path = os.path.join(current_path, unit_name)
+
+        children = current_unit.getChildren()
+        if children:
+            for child in children:
+                queue.append((child, path))
+        elif hasattr(current_unit, "getInput"):
+            yield path, current_unit
+
+
+class AssetScanner(object):
+    """
+    Runs a regex over asset files in fixed-size chunks, so memory stays
+    bounded whatever the size of the asset. Consecutive windows overlap by
+    OVERLAP characters (bytes for binary files): a match crossing a chunk
+    boundary is still found as long as it is shorter than the overlap.
+    Reading stops after max_file_bytes of a file, and for every file once
+    max_total_bytes have been read in total.
+    """
+    CHUNK_SIZE = 1024 * 1024
+    OVERLAP = 4096
+    CONTEXT = 64
+
+    def __init__(self, pattern, max_file_bytes=ASSET_MAX_FILE_BYTES, max_total_bytes=ASSET_MAX_TOTAL_BYTES):
+        self.pattern = pattern
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.cancelled = False
+
+    def exhausted(self):
+        return self.total_bytes >= self.max_total_bytes
+
+    def cancel(self):
+        """Make the scans in progress stop at their next chunk"""
+        self.cancelled = True
+
+    def _reserve(self, size):
+        """Take up to size bytes from the total budget"""
+        with self.lock:
+            size = max(0, min(size, self.max_total_bytes - self.total_bytes))
+            self.total_bytes += size
+            return size
+
+    def _chunks(self, stream):
+        """Yield the content of the stream chunk by chunk within the budgets"""
+        buffer = jarray.zeros(self.CHUNK_SIZE, 'b')
+        file_bytes = 0
+        while file_bytes < self.max_file_bytes and not self.cancelled:
+            wanted = self._reserve(min(self.CHUNK_SIZE, self.max_file_bytes - file_bytes))
+            if wanted == 0:
+                return
+            filled = 0
+            while filled < wanted:
+                bytes_read = stream.read(buffer, filled, wanted - filled)
+                if bytes_read == -1:
+                    break
+                filled += bytes_read
+            if filled:
+                file_bytes += filled
+                yield buffer[:filled].tostring()
+            if filled < wanted:
+                return
+
+    def scan(self, path, stream):
+        """
+        Return the search_assets result of one asset file, or None if the
+        pattern does not match. "truncated" is set when a budget stopped the
+        scan before the end of the file.
+        """
+        chunks = self._chunks(stream)
+        first = next(chunks, '')
+        ext = os.path.splitext(path)[1].lower()
+        is_text = (ext in TEXT_EXTENSIONS) or (len(first) > 0 and '\x00' not in first[:1024])
+
+        if is_text:
+            decoder = codecs.getincrementaldecoder('utf-8')('replace')
+            decoded = (decoder.decode(chunk) for chunk in itertools.chain([first], chunks))
+            file_matches = list(self._search(decoded, self._text_match, u''))
+            tail = decoder.decode('', True)
+            if tail:
+                # Only a truncated multi-byte sequence can be left over
+                file_matches.extend(self._search(iter([tail]), self._text_match, u''))
+        else:
+            file_matches = list(self._search(itertools.chain([first], chunks), self._binary_match, ''))
+
+        if not file_matches:
+            return None
+        result = {
+            "asset_path": path,
+            "is_text": is_text,
+            "matches": file_matches,
+        }
+        if self.cancelled:
+            return None
+        truncated = stream.read() != -1
+        if truncated:
+            result["truncated"] = True
+        return result
+
+    def scan_entry(self, entry):
+        """scan() an AssetStore entry, from its extracted copy when there is one"""
+        if entry.filename is None:
+            return self.scan_unit(entry.path, entry.unit)
+        if self.cancelled:
+            return None
+        stream = FileInputStream(entry.filename)
+        try:
+            result = self.scan(entry.path, stream)
+        finally:
+            stream.close()
+        if result and entry.truncated:
+            result["truncated"] = True
+        return result
+
+    def scan_unit(self, path, unit):
+        """scan() the content of an asset unit"""
+        if self.cancelled:
+            return None
+        input_obj = unit.getInput()
+        if not input_obj:
+            return None
+        stream = input_obj.getStream()
+        if not stream:
+            return None
+        try:
+            return self.scan(path, stream)
+        finally:
+            stream.close()
+
+    def _search(self, chunks, make_match, empty):
+        """
+        Yield the matches over consecutive chunks. Each window is the tail of
+        the previous one plus the next chunk; matches starting in the last
+        OVERLAP units are left to the next window, unless it is the last one.
+        """
+        window = empty
+        base = 0  # offset of window[0] in the file
+        lines_before = 0  # newlines before window[0], for text files
+        scan_from = 0
+        chunk = next(chunks, None)
+        while chunk is not None:
+            window += chunk
+            chunk = next(chunks, None)
+            last = chunk is None
+            boundary = len(window) if last else max(scan_from, len(window) - self.OVERLAP)
+            lines = None
+            for match in self.pattern.finditer(window, scan_from):
+                if match.start() >= boundary and not last:
+                    break
+                if lines is None and make_match == self._text_match:
+                    lines = LineIndex(window)
+                yield make_match(window, base, match, lines, lines_before)
+                scan_from = max(match.end(), match.start() + 1)
+            scan_from = max(scan_from, boundary)
+            # Keep the context of the next matches in the window
+            keep_from = max(0, min(scan_from, len(window)) - self.CONTEXT)
+            if make_match == self._text_match:
+                lines_before += window.count(u'\n', 0, keep_from)
+            window = window[keep_from:]
+            base += keep_from
+            scan_from -= keep_from
+
+    def _text_match(self, window, base, match, lines, lines_before):
+        start = match.start()  # 此时为字符索引
+        end = match.end()
+        ctx_start = max(0, start - self.CONTEXT)
+        ctx_end = min(len(window), end + self.CONTEXT)
+        return {
+            "match": match.group(),
+            "offset": base + start,
+            "line_number": lines_before + lines.line_number(start),
+            "context": window[ctx_start:ctx_end].strip()
+        }
+
+    def _binary_match(self, window, base, match, lines, lines_before):
+        start = match.start()
+        end = match.end()
+        m_bytes = match.group()
+
+        try:
+            m_decoded = m_bytes.decode('utf-8')
+        except UnicodeDecodeError:
+            m_decoded = m_bytes.encode('hex')
+
+        ctx_start = max(0, start - self.CONTEXT)
+        ctx_end = min(len(window), end + self.CONTEXT)
+        context_bytes = window[ctx_start:ctx_end]
+
+        ascii_view = "".join([c if 32 <= ord(c) < 127 else '.' for c in context_bytes])
+
+        return {
+            "match": m_decoded,
+            "offset": base + start,
+            "context_ascii": ascii_view,
+            "context_hex": context_bytes.encode('hex')
+        }
+
+
+# Bytes of asset files extracted to disk per artifact for repeated searches.
+ASSET_CACHE_BYTES = int(os.getenv("JEB_MCP_ASSET_CACHE_BYTES", str(512 * 1024 * 1024)))
+
+
+class AssetStore(object):
+    """
+    The asset files of an artifact, extracted by a background thread into a
+    temporary directory so that later searches read plain files instead of
+    the JEB unit streams. Searches read the units directly until the store
+    is ready. Text files up to INDEX_MAX_FILE_BYTES also get a fixed-size
+    bitmap of their (ASCII lowercased) trigrams, hashed on BITMAP_BITS bits:
+    a search skips the files missing the bit of a trigram of the literal
+    parts of its regex. Bitmaps of small files are folded down to about four
+    bits per byte of the file. Binary files, whose trigrams would fill the
+    bitmap, and the files beyond INDEX_MAX_BYTES of bitmaps are always scanned.
+    At most max_bytes are extracted, the files beyond are read from their
+    units. The directory is removed when the artifact is unloaded.
+    """
+    INDEX_MAX_FILE_BYTES = 4 * 1024 * 1024
+    INDEX_MAX_BYTES = 16 * 1024 * 1024
+    BITMAP_BITS = 1 << 16
+    CHUNK_SIZE = 64 * 1024
+
+    class Entry(object):
+        def __init__(self, path, unit):
+            self.path = path
+            self.unit = unit
+            self.filename = None  # extracted copy, None to read the unit
+            self.truncated = False
+            self.bitmap = None  # trigram bitmap, None if not indexed
+
+    def __init__(self, loaded, apk, max_bytes=ASSET_CACHE_BYTES, max_file_bytes=ASSET_MAX_FILE_BYTES):
+        self.loaded = loaded
+        self.apk = apk
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.directory = None
+        self.size = 0
+        self.index_bytes = 0
+        self.entries = []
+        self.ready = threading.Event()
+        self.closed = False
+        # Held while a file is extracted, so that close() never removes the
+        # directory under a write.
+        self.lock = threading.Lock()
+        thread = threading.Thread(target=self._build, name="asset-store")
+        thread.daemon = True
+        thread.start()
+
+    def _build(self):
+        # Read locked one file at a time like a search would, so that the
+        # artifact can still be evicted between two files.
+        lock = artifact_locks.get(self.loaded.filepath)
+        try:
+            lock.acquire_read()
+            try:
+                with self.lock:
+                    if self.closed or self.loaded.unloaded:
+                        return
+                    self.directory = tempfile.mkdtemp(prefix="jeb-mcp-assets-")
+                files = list(iter_asset_files(self.apk))
+            finally:
+                lock.release_read()
+            entries = []
+            for i, (path, unit) in enumerate(files):
+                lock.acquire_read()
+                try:
+                    with self.lock:
+                        if self.closed or self.loaded.unloaded:
+                            return
+                        entries.append(self._extract(i, path, unit))
+                finally:
+                    lock.release_read()
+            self.entries = entries
+            self.ready.set()
+        except Exception:
+            # Searches keep reading the units
+            traceback.print_exc()
+            self.close()
+
+    def _reserve(self, size):
+        if self.size + size > self.max_bytes:
+            return False
+        self.size += size
+        return True
+
+    def _extract(self, i, path, unit):
+        """Copy one asset to the directory, returning its entry"""
+        entry = AssetStore.Entry(path, unit)
+        input_obj = unit.getInput()
+        stream = input_obj.getStream() if input_obj else None
+        if not stream:
+            return entry
+        filename = os.path.join(self.directory, str(i))
+        buffer = jarray.zeros(self.CHUNK_SIZE, 'b')
+        bitmap = None
+        tail = ''
+        reserved = 0
+        written = 0
+        complete = False
+        try:
+            output = FileOutputStream(filename)
+            try:
+                while True:
+                    if written >= self.max_file_bytes:
+                        entry.truncated = stream.read() != -1
+                        complete = True
+                        break
+                    bytes_read = stream.read(buffer, 0, min(self.CHUNK_SIZE, self.max_file_bytes - written))
+                    if bytes_read == -1:
+                        complete = True
+                        break
+                    if not self._reserve(bytes_read):
+                        break
+                    reserved += bytes_read
+                    output.write(buffer, 0, bytes_read)
+                    chunk = buffer[:bytes_read].tostring()
+                    if written == 0 and self._indexable(path, chunk):
+                        bitmap = array('B', [0]) * (self.BITMAP_BITS // 8)
+                    written += bytes_read
+                    if bitmap is not None:
+                        if written > self.INDEX_MAX_FILE_BYTES:
+                            bitmap = None
+                        else:
+                            segment = tail + chunk.lower()
+                            self._add_trigrams(bitmap, TRIGRAM.findall(segment))
+                            tail = segment[-2:]
+            finally:
+                output.close()
+        except Exception:
+            traceback.print_exc()
+            complete = False
+        finally:
+            stream.close()
+        if not complete:
+            # Over the store budget or unreadable: this file is read from its unit instead
+            if os.path.exists(filename):
+                os.remove(filename)
+            self.size -= reserved
+            return entry
+        entry.filename = filename
+        if bitmap is not None:
+            entry.bitmap = self._fold(bitmap, written)
+            self.index_bytes += len(entry.bitmap)
+        return entry
+
+    @staticmethod
+    def _fold(bitmap, file_bytes):
+        """Halve the bitmap while it has more than 4 bits per byte of the file"""
+        size = len(bitmap)
+        while size > 64 and size >= file_bytes:
+            size //= 2
+            bitmap = array('B', [low | high for low, high in itertools.izip(bitmap[:size], bitmap[size:])])
+        return bitmap
+
+    def _indexable(self, path, first):
+        """Only text files are indexed, and only up to INDEX_MAX_BYTES of bitmaps"""
+        if self.index_bytes + self.BITMAP_BITS // 8 > self.INDEX_MAX_BYTES:
+            return False
+        ext = os.path.splitext(path)[1].lower()
+        return ext in TEXT_EXTENSIONS or '\x00' not in first[:1024]
+
+    @staticmethod
+    def _has_bits(bitmap, hashes):
+        mask = len(bitmap) * 8 - 1
+        for value in hashes:
+            bit = value & mask
+            if not bitmap[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+
+    def _add_trigrams(self, bitmap, trigrams):
+        mask = len(bitmap) * 8 - 1
+        for trigram in set(trigrams):
+            bit = hash(trigram) & mask
+            bitmap[bit >> 3] |= 1 << (bit & 7)
+
+    def candidates(self, trigrams, selected):
+        """Entries that may match a regex requiring all the given trigrams, in traversal order"""
+        hashes = [hash(trigram) for trigram in trigrams]
+        return [entry for entry in self.entries
+                if selected(entry.path) and (entry.bitmap is None or self._has_bits(entry.bitmap, hashes))]
+
+    def stats(self):
+        return {
+            "ready": self.ready.is_set(),
+            "files": len(self.entries),
+            "extracted_bytes": self.size,
+            "index_bytes": self.index_bytes,
+        }
+
+    def close(self):
+        self.closed = True
+        with self.lock:
+            directory, self.directory = self.directory, None
+        if directory:
+            shutil.rmtree(directory, True)
+
+
+# Overlapping 3-byte windows, findall returns every trigram of a string
+TRIGRAM = re.compile(r'(?=(...))', re.DOTALL)
+
+
+def regex_trigrams(regex_pattern):
+    """
+    Trigrams (ASCII lowercased) every match of the regex contains: those of
+    the runs of literal ASCII characters the regex requires, found with
+    sre_parse. Alternations, optional parts and classes are not required, so
+    they only end a run. So do the letters that (?iu) also matches with
+    non-ASCII characters, which the byte index does not see: i and I match
+    U+0130 and U+0131, k and K match U+212A (Kelvin sign), s and S match U+017F.
+    """
     try:
-        root = ET.fromstring(manifest_text.encode('utf-8'))
-    except Exception as e:
-        print("[MCP] Error parsing manifest:", e)
-        raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
+        parsed = sre_parse.parse(regex_pattern)
+    except Exception:
+        return set()
+
+    unicode_ignorecase = sre_constants.SRE_FLAG_IGNORECASE | sre_constants.SRE_FLAG_UNICODE
+    if parsed.pattern.flags & unicode_ignorecase == unicode_ignorecase:
+        run_enders = frozenset(map(ord, 'ikIKsS'))
+    else:
+        run_enders = frozenset()
+    runs = []
+
+    def walk(items):
+        run = []
+        for op, av in items:
+            if op == sre_constants.LITERAL and av < 128 and av not in run_enders:
+                run.append(chr(av))
+                continue
+            runs.append("".join(run))
+            run = []
+            if op == sre_constants.SUBPATTERN:
+                walk(av[-1])
+            elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+                walk(av[2])
+        runs.append("".join(run))
+
+    walk(parsed)
+    trigrams = set()
+    for run in runs:
+        trigrams.update(TRIGRAM.findall(run.lower()))
+    return trigrams
 
-    ANDROID_NS = 'http://schemas.android.com/apk/res/android'
-    exported_receivers = []
 
-    package_name = root.attrib.get('package', '').strip()
+def get_asset_store(filepath):
+    """The AssetStore of the APK, extracted in the background from the first search"""
+    loaded = getLoadedArtifact(filepath)
+    return loaded.cached('asset_store', lambda: AssetStore(loaded, getOrLoadApk(filepath)))
 
-    app_node = root.find('application')
-    if app_node is None:
-        raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
 
-    for receiver in app_node.findall('receiver'):
-        name = receiver.attrib.get('{' + ANDROID_NS + '}name')
-        exported = receiver.attrib.get('{' + ANDROID_NS + '}exported')
-        has_intent_filter = len(receiver.findall('intent-filter')) > 0
+@jsonrpc
+def search_assets(filepath, regex_pattern, limit, cursor=None, page_size=0, include=None, exclude=None):
+    """
+    Search for a regex pattern in all files within the APK's 'assets' directory.
+    Text files: +/- 64 characters context.
+    Binary files: +/- 64 bytes context.
+    include and exclude are glob patterns (a list or a comma-separated string)
+    on the asset path selecting the files to search, e.g. "*.json,*.js" or
+    "*.so". Files are read in chunks up to JEB_MCP_ASSET_MAX_FILE_BYTES each
+    and JEB_MCP_ASSET_MAX_TOTAL_BYTES in total; results of files cut short are
+    flagged "truncated".
+    Pass a page_size or the next_cursor of a previous page to get the results
+    page by page.
+    """
+    return paginate(
+        ("search_assets", filepath, regex_pattern, limit, include, exclude), cursor, page_size,
+        lambda: iter_search_assets(filepath, regex_pattern, limit, include, exclude))
 
-        if not name:
+
+@jsonrpc_stream("search_assets")
+def iter_search_assets(filepath, regex_pattern, limit, include=None, exclude=None):
+    """Yield the search_assets result of each matching asset file as soon as it is scanned"""
+    if not filepath or not regex_pattern:
+        raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
+
+    try:
+        pattern = re.compile(regex_pattern)
+    except re.error as e:
+        raise JSONRPCError(-1, "Invalid regular expression: " + str(e))
+
+    found = 0
+    scanner = AssetScanner(pattern)
+    pool = get_asset_pool()
+    loaded = getLoadedArtifact(filepath)
+    store = get_asset_store(filepath)
+    selected = asset_selector(include, exclude)
+    if store.ready.is_set():
+        files = iter(store.candidates(regex_trigrams(regex_pattern), selected))
+    else:
+        # Not extracted yet: read the selected units directly
+        files = (AssetStore.Entry(path, unit)
+                 for path, unit in iter_asset_files(getOrLoadApk(filepath)) if selected(path))
+    # Files are scanned in parallel but their results are consumed in
+    # traversal order, so the output does not depend on thread timing.
+    # At most ASSET_WORKERS * 2 files are in flight ahead of the consumer.
+    pending = collections.deque()
+    try:
+        while True:
+            # A paginated search resumes in a later call, after which the
+            # artifact and its extracted files may be gone.
+            if loaded.unloaded:
+                raise JSONRPCError(-1, ErrorMessages.ASSET_SEARCH_UNLOADED)
+            while len(pending) < pool.size * 2 and not scanner.exhausted():
+                entry = next(files, None)
+                if entry is None:
+                    break
+                pending.append(pool.submit(scanner.scan_entry, entry))
+            if not pending:
+                break
+            try:
+                result = pending.popleft().result()
+            except Exception:
+                if loaded.unloaded:
+                    raise JSONRPCError(-1, ErrorMessages.ASSET_SEARCH_UNLOADED)
+                raise
+            if result:
+                found += 1
+                yield result
+                if limit > 0 and found >= limit:
+                    break
+        if scanner.exhausted():
+            print("[MCP] search_assets stopped after reading %d bytes" % scanner.total_bytes)
+    finally:
+        # Limit reached or client gone: drop the queued scans and stop the running ones
+        scanner.cancel()
+        for future in pending:
+            future.cancel()
+
+
+asset_pool = None
+asset_pool_lock = threading.Lock()
+
+
+def get_asset_pool():
+    global asset_pool
+    with asset_pool_lock:
+        if asset_pool is None:
+            asset_pool = WorkerPool("assets", ASSET_WORKERS)
+        return asset_pool
+
+
+class DecompileCache(object):
+    """
+    Decompiled method text, keyed by APK content hash, rename generation and
+    method signature. An in-memory LRU bounded to max_chars characters sits
+    in front of a store on disk (directory/<digest>/<generation>/<sha1 of the
+    signature>.java) that survives JEB restarts. Without a directory only
+    the memory tier is used.
+
+    The disk tier is shared by every APK ever opened, so it is held to
+    max_disk_bytes (0 for no limit): once a write takes it over, the least
+    recently used files are deleted, whatever APK they belong to, until it
+    is back under DISK_TRIM_RATIO of the budget.
+    """
+
+    DISK_TRIM_RATIO = 0.9
+
+    def __init__(self, directory, max_chars, max_disk_bytes=0):
+        self.directory = directory
+        self.max_chars = max_chars
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_bytes = None  # measured on the first write
+        self.trimming = False
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()  # key -> text
+        self.chars = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _key(self, loaded, signature):
+        return (loaded.digest, loaded.generation, signature)
+
+    def _filename(self, key):
+        digest, generation, signature = key
+        name = hashlib.sha1(signature.encode('utf-8')).hexdigest() + '.java'
+        return os.path.join(self.directory, digest, generation, name)
+
+    def _remember(self, key, text):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.chars -= len(old)
+            self.entries[key] = text
+            self.chars += len(text)
+            while self.chars > self.max_chars and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.chars -= len(evicted)
+
+    def get(self, loaded, signature):
+        """The cached text of the method, or None"""
+        key = self._key(loaded, signature)
+        with self.lock:
+            text = self.entries.pop(key, None)
+            if text is not None:
+                self.entries[key] = text
+                self.memory_hits += 1
+                return text
+        if self.directory:
+            try:
+                filename = self._filename(key)
+                with open(filename, 'rb') as f:
+                    text = f.read().decode('utf-8')
+                self._touch(filename)
+            except IOError:
+                text = None
+            if text is not None:
+                self._remember(key, text)
+                with self.lock:
+                    self.disk_hits += 1
+                return text
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def contains(self, loaded, signature):
+        """Whether the method is cached, without counting a hit or a miss"""
+        key = self._key(loaded, signature)
+        with self.lock:
+            if key in self.entries:
+                return True
+        return bool(self.directory) and os.path.isfile(self._filename(key))
+
+    def put(self, loaded, signature, text, remember=True):
+        """
+        Cache the text of the method. With remember=False it only goes to
+        disk (when there is a directory), leaving the memory LRU to the
+        methods actually being read.
+        """
+        if text is None:
+            return
+        key = self._key(loaded, signature)
+        if remember or not self.directory:
+            self._remember(key, text)
+        if not self.directory:
+            return
+        filename = self._filename(key)
+        try:
+            directory = os.path.dirname(filename)
+            if not os.path.isdir(directory):
+                try:
+                    os.makedirs(directory)
+                except OSError:
+                    pass  # created meanwhile by another thread
+            # Written aside then renamed, so readers never see a partial file
+            temp = '%s.%s.tmp' % (filename, threading.current_thread().name)
+            data = text.encode('utf-8')
+            with open(temp, 'wb') as f:
+                f.write(data)
+            replaced = 0
+            if os.path.exists(filename):
+                replaced = os.path.getsize(filename)
+                os.remove(filename)
+            os.rename(temp, filename)
+        except (IOError, OSError) as e:
+            print('[MCP] Error caching decompiled text of %s: %s' % (signature, e))
+            return
+        self._account(len(data) - replaced)
+
+    def _touch(self, filename):
+        # Reads refresh the mtime, which is what eviction orders files by
+        try:
+            os.utime(filename, None)
+        except OSError:
+            pass
+
+    def _cached_files(self):
+        """(mtime, size, path) of every file of the disk tier"""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # deleted meanwhile
+                files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _account(self, delta):
+        """Add delta bytes to the disk tier, trimming it when over budget"""
+        if not self.max_disk_bytes:
+            return
+        with self.lock:
+            if self.trimming:
+                if self.disk_bytes is not None:
+                    self.disk_bytes += delta
+                return
+            measure = self.disk_bytes is None
+            if not measure:
+                self.disk_bytes += delta
+                if self.disk_bytes <= self.max_disk_bytes:
+                    return
+            self.trimming = True
+        try:
+            files = self._cached_files()
+            total = sum(size for _, size, _ in files)
+            if total > self.max_disk_bytes:
+                total = self._trim(files, total)
+            with self.lock:
+                self.disk_bytes = total
+        finally:
+            with self.lock:
+                self.trimming = False
+
+    def _trim(self, files, total):
+        """Delete the least recently used files; returns the bytes left"""
+        target = int(self.max_disk_bytes * self.DISK_TRIM_RATIO)
+        files.sort()
+        for _, size, path in files:
+            if total <= target:
+                break
+            if path.endswith('.tmp'):
+                continue  # being written
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            # Drop the generation and APK directories once they are empty
+            parent = os.path.dirname(path)
+            while parent != self.directory and os.path.dirname(parent) != parent:
+                try:
+                    os.rmdir(parent)
+                except OSError:
+                    break
+                parent = os.path.dirname(parent)
+        return total
+
+    def prune(self, digest, generation):
+        """Delete the text cached on disk for the other generations of the APK"""
+        if not self.directory:
+            return
+        apk_directory = os.path.join(self.directory, digest)
+        if not os.path.isdir(apk_directory):
+            return
+        pruned = False
+        for name in os.listdir(apk_directory):
+            if name != generation:
+                shutil.rmtree(os.path.join(apk_directory, name), True)
+                pruned = True
+        if pruned:
+            with self.lock:
+                self.disk_bytes = None  # measured again on the next write
+
+    def stats(self):
+        with self.lock:
+            hits = self.memory_hits + self.disk_hits
+            requests = hits + self.misses
+            return {
+                "memory_entries": len(self.entries),
+                "memory_chars": self.chars,
+                "max_chars": self.max_chars,
+                "disk_bytes": self.disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(float(hits) / requests, 3) if requests else None,
+            }
+
+
+decompile_cache = DecompileCache(
+    os.getenv("JEB_MCP_DECOMPILE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".jeb-mcp", "decompiled")),
+    int(os.getenv("JEB_MCP_DECOMPILE_CACHE_CHARS", str(32 * 1024 * 1024))),
+    int(os.getenv("JEB_MCP_DECOMPILE_CACHE_DISK_BYTES", str(1024 * 1024 * 1024))),
+)
+
+
+class MethodDecompiler(object):
+    """
+    Decompiles methods of an artifact through the decompile cache. The
+    decompiler is only acquired on the first cache miss, and then shared by
+    all the methods decompiled through this object. A background decompiler
+    neither looks up the cache (its caller checks contains first, without
+    counting misses) nor fills its memory tier.
+    """
+
+    def __init__(self, loaded, codeUnit, background=False):
+        self.loaded = loaded
+        self.codeUnit = codeUnit
+        self.background = background
+        self._decomp = None
+
+    def decompiler(self):
+        if self._decomp is None:
+            decomp = DecompilerHelper.getDecompiler(self.codeUnit)
+            if not decomp:
+                print('Cannot acquire decompiler for unit: %s' % self.codeUnit)
+                raise JSONRPCError(-1, ErrorMessages.DECOMPILE_FAILED)
+            self._decomp = decomp
+        return self._decomp
+
+    def decompile(self, method):
+        """Decompiled text of a method, from the cache when possible"""
+        signature = method.getSignature()
+        if not self.background:
+            text = decompile_cache.get(self.loaded, signature)
+            if text is not None:
+                return text
+
+        decomp = self.decompiler()
+        if not decomp.decompileMethod(signature):
+            print('Failed decompiling method')
+            raise JSONRPCError(-1, ErrorMessages.DECOMPILE_FAILED)
+
+        text = decomp.getDecompiledMethodText(signature)
+        decompile_cache.put(self.loaded, signature, text, remember=not self.background)
+        return text
+
+    def decompile_class(self, clazz):
+        """Decompiled text of a whole class, from the cache when possible"""
+        signature = clazz.getSignature()
+        if not self.background:
+            text = decompile_cache.get(self.loaded, signature)
+            if text is not None:
+                return text
+
+        decomp = self.decompiler()
+        if not decomp.decompileClass(signature):
+            print('Failed decompiling class')
+            raise JSONRPCError(-1, ErrorMessages.DECOMPILE_FAILED)
+
+        text = decomp.getDecompiledClassText(signature)
+        decompile_cache.put(self.loaded, signature, text, remember=not self.background)
+        return text
+
+
+def java_members(text):
+    """
+    Locate the members declared directly in the body of the first class of
+    decompiled Java text, skipping comments and string literals: yield
+    (header, start_line, end_line) for every member ending with a block or a
+    semicolon at that depth, where header is its declaration up to the block
+    or semicolon, and lines are 0-based. Members of nested classes and
+    statements in method bodies are deeper and not reported; braces within
+    parentheses (annotation arguments, lambdas passed as arguments) are
+    balanced on their own and ignored.
+    """
+    depth = 0
+    parens = 0
+    line = 0
+    boundary = 0  # offset where the current member starts
+    opened = {}  # depth -> (header, start line) of the member block opened at that depth
+    i = 0
+    length = len(text)
+
+    def member_start():
+        # First non-blank character of the current member
+        return boundary + len(text[boundary:i]) - len(text[boundary:i].lstrip())
+    while i < length:
+        c = text[i]
+        if c == '\n':
+            line += 1
+        elif c == '/' and text.startswith('//', i):
+            end = text.find('\n', i)
+            i = length if end < 0 else end
+            continue
+        elif c == '/' and text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            end = length if end < 0 else end + 2
+            line += text.count('\n', i, end)
+            i = end
+            continue
+        elif c in '"\'':
+            j = i + 1
+            while j < length and text[j] != c and text[j] != '\n':
+                j += 2 if text[j] == '\\' else 1
+            i = j + 1
+            continue
+        elif c == '(':
+            parens += 1
+        elif c == ')':
+            parens -= 1
+        elif c == '{' and parens == 0:
+            if depth == 1:
+                opened[depth] = (text[boundary:i], line - text.count('\n', member_start(), i))
+            depth += 1
+            boundary = i + 1
+        elif c == '}' and parens == 0:
+            depth -= 1
+            if depth == 1 and 1 in opened:
+                header, start = opened.pop(1)
+                yield header, start, line
+            elif depth == 0:
+                return
+            boundary = i + 1
+        elif c == ';' and parens == 0:
+            if depth == 1:
+                yield text[boundary:i], line - text.count('\n', member_start(), i), line
+            boundary = i + 1
+        i += 1
+
+
+JAVA_COMMENT = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+JAVA_ANNOTATION = re.compile(r'@[\w.]+(\s*\([^()]*\))?')
+JAVA_METHOD_HEADER = re.compile(r'([\w$]+)\s*\((.*)\)\s*(throws\s[^{;]*)?$', re.DOTALL)
+
+DEX_PRIMITIVES = {'Z': 'boolean', 'B': 'byte', 'S': 'short', 'C': 'char', 'I': 'int', 'J': 'long',
+                  'F': 'float', 'D': 'double', 'V': 'void'}
+
+
+def java_simple_type(name):
+    """Simple name of a Java type, without generics, e.g. java.util.Map.Entry<K, V>... -> Entry[]"""
+    dims = name.count('[') + (1 if '...' in name else 0)
+    name = re.sub(r'<.*>', '', name).replace('...', '').replace('[]', '').strip()
+    return name.split('.')[-1].split('$')[-1] + '[]' * dims
+
+
+def dex_parameter_types(signature):
+    """Simple Java names of the parameters of a dex method signature"""
+    descriptor = signature[signature.index('(') + 1:signature.index(')')]
+    types = []
+    i = 0
+    while i < len(descriptor):
+        dims = 0
+        while descriptor[i] == '[':
+            dims += 1
+            i += 1
+        if descriptor[i] == 'L':
+            end = descriptor.index(';', i)
+            name = descriptor[i + 1:end].split('/')[-1]
+            i = end + 1
+        else:
+            name = DEX_PRIMITIVES[descriptor[i]]
+            i += 1
+        types.append(java_simple_type(name) + '[]' * dims)
+    return types
+
+
+def split_java_parameters(parameters):
+    """Simple types of a declared parameter list, splitting on the commas outside generics"""
+    parts = []
+    nesting = 0
+    current = ''
+    for c in parameters:
+        if c == ',' and nesting == 0:
+            parts.append(current)
+            current = ''
             continue
+        nesting += (c == '<') - (c == '>')
+        current += c
+    parts.append(current)
+    types = []
+    for part in parts:
+        words = part.replace('final ', ' ').split()
+        if words:
+            types.append(java_simple_type(' '.join(words[:-1]) or words[0]))
+    return types
+
+
+def map_method_lines(text, class_signature, method_signatures):
+    """
+    Locate methods in the decompiled text of their class from its members,
+    found by brace matching: a method matches the declaration with its name
+    (the class name for constructors, a static block for <clinit>) and
+    parameter types, or failing that with its name and parameter count, or
+    the only remaining declaration with its name. Lines cover the comments
+    and annotations of the declaration. Returns
+    [{"signature", "start_line", "end_line"}] with 1-based lines, null for
+    the methods the decompiler omitted.
+    """
+    class_name = java_simple_type(class_signature.rstrip(';').split('/')[-1])
+    declarations = []
+    for header, start, end in java_members(text):
+        code = JAVA_ANNOTATION.sub(' ', JAVA_COMMENT.sub(' ', header)).strip()
+        if code == 'static':
+            declarations.append(('<clinit>', [], start, end))
+            continue
+        match = JAVA_METHOD_HEADER.search(code)
+        if match is None or '=' in code[:match.start()]:
+            continue  # fields, nested classes and initializers
+        name = match.group(1)
+        declarations.append(('<init>' if name == class_name else name,
+                             split_java_parameters(match.group(2)), start, end))
+
+    methods = []
+    remaining = list(declarations)
+    for signature in method_signatures:
+        name = signature[signature.index('->') + 2:signature.index('(')]
+        types = dex_parameter_types(signature)
+        named = [d for d in remaining if d[0] == name]
+        found = ([d for d in named if d[1] == types] or [d for d in named if len(d[1]) == len(types)]
+                 or (named if len(named) == 1 else []))
+        entry = {"signature": signature, "start_line": None, "end_line": None}
+        if found:
+            remaining.remove(found[0])
+            entry["start_line"] = found[0][2] + 1
+            entry["end_line"] = found[0][3] + 1
+        methods.append(entry)
+    return methods
 
-        if exported == "true" or (exported is None and has_intent_filter):
-            normalized = set()
 
-            if name.startswith('.'):
-                normalized.add(package_name + name)
-            elif '.' not in name:
-                normalized.add(name)
-                normalized.add(package_name + '.' + name)
-            else:
-                normalized.add(name)
+@jsonrpc
+def get_method_decompiled_code(filepath, method_signature):
+    """Get the decompiled code of the given method in the APK file, the passed in method_signature needs to be a fully-qualified signature
+    Dex units use Java-style internal addresses to identify items:
+    - package: Lcom/abc/
+    - type: Lcom/abc/Foo;
+    - method: Lcom/abc/Foo;->bar(I[JLjava/Lang/String;)V
+    - field: Lcom/abc/Foo;->flag1:Z
+    note filepath needs to be an absolute path
+    """
+    if not filepath or not method_signature:
+        raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
 
-            exported_receivers.extend(normalized)
-            
-    apk_cached_data['exported_receivers'] = exported_receivers
-    return exported_receivers
+    apk = getOrLoadApk(filepath)
+    
+    codeUnit = apk.getDex()
+    method = codeUnit.getMethod(method_signature)
+    if method is None:
+        print('Method not found: %s' % method_signature)
+        raise_method_not_found(method_signature)
+
+    return MethodDecompiler(getLoadedArtifact(filepath), codeUnit).decompile(method)
 
 
 @jsonrpc
-def get_all_exported_providers(filepath):
+def get_class_decompiled_code(filepath, class_signature):
     """
-    Get all exported Provider components from the APK and normalize their class names.
+    Get the decompiled code of a whole class in one call, the passed in class_signature needs to be a fully-qualified signature
+    such as Lcom/abc/Foo;
+    Returns {"code": text, "methods": [{"signature", "start_line", "end_line"}]} mapping the lines of the code
+    to the methods of the class, located in the code itself (lines are 1-based, cover the comments and annotations
+    of each method, and are null for methods the decompiler inlined or omitted).
+    note filepath needs to be an absolute path
     """
-    if not filepath:
+    if not filepath or not class_signature:
         raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
-    
-    from xml.etree import ElementTree as ET
-
-    manifest_text = get_manifest(filepath)
-    manifest_text = preprocess_manifest_py2(manifest_text)
 
-    if not manifest_text:
-        raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
-    
-    if 'exported_providers' in apk_cached_data:
-        return apk_cached_data['exported_providers']
+    apk = getOrLoadApk(filepath)
 
-    try:
-        root = ET.fromstring(manifest_text.encode('utf-8'))
-    except Exception as e:
-        print("[MCP] Error parsing manifest:", e)
-        raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
+    codeUnit = apk.getDex()
+    clazz = codeUnit.getClass(class_signature)
+    if clazz is None:
+        print("Class not found: %s" % class_signature)
+        raise_class_not_found(class_signature)
 
-    ANDROID_NS = 'http://schemas.android.com/apk/res/android'
-    exported_providers = []
+    text = MethodDecompiler(getLoadedArtifact(filepath), codeUnit).decompile_class(clazz)
+    signatures = [method.getSignature(True) for method in clazz.getMethods() if method]
+    return {
+        "code": text,
+        "methods": map_method_lines(text, clazz.getSignature(True), signatures),
+    }
 
-    package_name = root.attrib.get('package', '').strip()
 
-    app_node = root.find('application')
-    if app_node is None:
-        raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
+@jsonrpc
+def get_methods_decompiled_code(filepath, method_signatures):
+    """
+    Decompile several methods in one call, the passed in method_signatures is a list of fully-qualified signatures
+    such as Lcom/abc/Foo;->bar(I[JLjava/Lang/String;)V
+    Returns {"code": text, "methods": [{"signature", "start_line", "end_line"}], "errors": [{"signature", "error"}]}:
+    the decompiled methods are concatenated in the requested order, separated by a blank line, and "methods" gives
+    the 1-based lines of each one. Methods that cannot be found or decompiled are reported in "errors".
+    note filepath needs to be an absolute path
+    """
+    if not filepath or not method_signatures:
+        raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
+    if isinstance(method_signatures, basestring):
+        method_signatures = [method_signatures]
 
-    for provider in app_node.findall('provider'):
-        name = provider.attrib.get('{' + ANDROID_NS + '}name')
-        exported = provider.attrib.get('{' + ANDROID_NS + '}exported')
-        has_intent_filter = len(provider.findall('intent-filter')) > 0
+    apk = getOrLoadApk(filepath)
 
-        if not name:
+    codeUnit = apk.getDex()
+    decompiler = MethodDecompiler(getLoadedArtifact(filepath), codeUnit)
+
+    parts = []
+    methods = []
+    errors = []
+    line = 1
+    for method_signature in method_signatures:
+        method = codeUnit.getMethod(method_signature)
+        if method is None:
+            errors.append({"signature": method_signature, "error": ErrorMessages.METHOD_NOT_FOUND_WITHOUT_CHECK})
+            continue
+        try:
+            text = decompiler.decompile(method).rstrip('\n')
+        except JSONRPCError as e:
+            errors.append({"signature": method_signature, "error": e.message})
             continue
+        line_count = text.count('\n') + 1
+        methods.append({"signature": method_signature, "start_line": line, "end_line": line + line_count - 1})
+        parts.append(text)
+        line += line_count + 1  # blank separator line
 
-        if exported == "true" or (exported is None and has_intent_filter):
-            normalized = set()
+    return {
+        "code": "\n\n".join(parts),
+        "methods": methods,
+        "errors": errors,
+    }
 
-            if name.startswith('.'):
-                normalized.add(package_name + name)
-            elif '.' not in name:
-                normalized.add(name)
-                normalized.add(package_name + '.' + name)
-            else:
-                normalized.add(name)
 
-            exported_providers.extend(normalized)
-            
-    apk_cached_data['exported_providers'] = exported_providers
-    return exported_providers
+DECOMPILE_WORKERS = int(os.getenv("JEB_MCP_DECOMPILE_WORKERS", "0")) or max(1, Runtime.getRuntime().availableProcessors() // 2)
+DECOMPILE_CPU_BUDGET = float(os.getenv("JEB_MCP_DECOMPILE_CPU_BUDGET", "0.5"))
 
 
-@jsonrpc
-def get_permissions(filepath):
+class DecompileJobs(object):
     """
-    Get all defined custom permissions from the APK manifest.
+    Opt-in background decompilation of every class of an APK, feeding the
+    decompile cache so that later decompile calls are lookups. The classes
+    are pulled by up to DECOMPILE_WORKERS tasks of a shared pool, and each
+    task sleeps between classes so that it is busy at most cpu_budget of
+    its time. Keeps the status of the last job of every path.
     """
-    if not filepath:
-        raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
-    
-    from xml.etree import ElementTree as ET
-
-    manifest_text = get_manifest(filepath)
-    manifest_text = preprocess_manifest_py2(manifest_text)
-
-    if not manifest_text:
-        raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
-    
-    if 'permissions' in apk_cached_data:
-        return apk_cached_data['permissions']
 
-    try:
-        root = ET.fromstring(manifest_text.encode('utf-8'))
-    except Exception as e:
-        print("[MCP] Error parsing manifest:", e)
-        raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
+    def __init__(self, workers):
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.jobs = {}  # filepath -> job dict
+        self.pool = None
+
+    def start(self, filepath, workers=0, cpu_budget=0):
+        """Start decompiling the APK unless a job for it is already running"""
+        if int(workers or 0) < 0:
+            raise JSONRPCError(-32602, "Invalid params: workers must not be negative")
+        workers = min(int(workers or self.workers), self.workers)
+        cpu_budget = float(cpu_budget or DECOMPILE_CPU_BUDGET)
+        if not 0 < cpu_budget <= 1:
+            raise JSONRPCError(-32602, "Invalid params: cpu_budget must be in (0, 1]")
+
+        loaded = getLoadedArtifact(filepath)
+        codeUnit = getOrLoadApk(filepath).getDex()
+        classes = [clazz for clazz in codeUnit.getClasses() if clazz]
+
+        with self.lock:
+            job = self.jobs.get(filepath)
+            if job is not None and job["state"] == "running":
+                return self._status(job)
+            job = {
+                "filepath": filepath,
+                "state": "running",
+                "workers": workers,
+                "cpu_budget": cpu_budget,
+                "classes_total": len(classes),
+                "classes_done": 0,
+                "methods_decompiled": 0,
+                "methods_cached": 0,
+                "methods_failed": 0,
+                "started_at": time.time(),
+                "finished_at": None,
+                "error": None,
+                # Internal state, left out of the reported status. Set before
+                # the job is published: cancel() and cancel_all() use it.
+                "_cancel": threading.Event(),
+                "_classes": iter(classes),
+                "_running": workers,
+            }
+            self.jobs[filepath] = job
+            if self.pool is None:
+                self.pool = WorkerPool("decompile", self.workers)
+            result = self._status(job)
+
+        decompiler = MethodDecompiler(loaded, codeUnit, background=True)
+        for _ in range(workers):
+            self.pool.submit(self._work, filepath, job, loaded, decompiler)
+        return result
 
-    ANDROID_NS = 'http://schemas.android.com/apk/res/android'
-    permissions = []
+    def _next_class(self, job):
+        with self.lock:
+            if job["_cancel"].is_set():
+                return None
+            return next(job["_classes"], None)
 
-    for perm in root.findall('permission'):
-        name = perm.attrib.get('{' + ANDROID_NS + '}name')
-        if name:
-            permissions.append(name)
-            
-    apk_cached_data['permissions'] = permissions
-    return permissions
+    def _work(self, filepath, job, loaded, decompiler):
+        lock = artifact_locks.get(filepath)
+        try:
+            while True:
+                clazz = self._next_class(job)
+                if clazz is None:
+                    break
+                started = time.time()
+                # Locked one class at a time, so that renames and evictions
+                # only wait for the class being decompiled.
+                lock.acquire_read()
+                try:
+                    if loaded.unloaded:
+                        raise JSONRPCError(-1, ErrorMessages.DECOMPILE_JOB_UNLOADED)
+                    counts = self._decompile_class(loaded, decompiler, clazz)
+                finally:
+                    lock.release_read()
+                with self.lock:
+                    job["classes_done"] += 1
+                    for name, count in counts.items():
+                        job[name] += count
+                busy = time.time() - started
+                if job["cpu_budget"] < 1:
+                    job["_cancel"].wait(busy * (1 - job["cpu_budget"]) / job["cpu_budget"])
+        except Exception as e:
+            traceback.print_exc()
+            with self.lock:
+                job["error"] = str(getattr(e, "message", e))
+            job["_cancel"].set()
+        finally:
+            with self.lock:
+                job["_running"] -= 1
+                if job["_running"] == 0:
+                    if job["error"] is not None:
+                        job["state"] = "failed"
+                    elif job["_cancel"].is_set():
+                        job["state"] = "cancelled"
+                    else:
+                        job["state"] = "done"
+                    job["finished_at"] = time.time()
+
+    def _decompile_class(self, loaded, decompiler, clazz):
+        counts = {"methods_decompiled": 0, "methods_cached": 0, "methods_failed": 0}
+        methods = [method for method in (clazz.getMethods() or []) if method]
+        pending = [method for method in methods if not decompile_cache.contains(loaded, method.getSignature())]
+        counts["methods_cached"] = len(methods) - len(pending)
+        if not pending:
+            return counts
+        try:
+            # Decompiling the class first decompiles all its methods at once
+            decompiler.decompile_class(clazz)
+        except JSONRPCError:
+            pass  # the methods may still decompile one by one
+        for method in pending:
+            try:
+                decompiler.decompile(method)
+                counts["methods_decompiled"] += 1
+            except JSONRPCError:
+                counts["methods_failed"] += 1  # abstract and native methods have no body
+        return counts
+
+    def _status(self, job):
+        status = dict((k, v) for k, v in job.items() if not k.startswith("_"))
+        total = status["classes_total"]
+        status["progress"] = round(float(status["classes_done"]) / total, 3) if total else 1.0
+        end = status["finished_at"] or time.time()
+        status["elapsed"] = round(end - status["started_at"], 3)
+        return status
+
+    def get(self, filepath):
+        with self.lock:
+            job = self.jobs.get(filepath)
+            if job is None:
+                return {"filepath": filepath, "state": None}
+            return self._status(job)
+
+    def cancel(self, filepath):
+        """Stop the job after the classes being decompiled"""
+        with self.lock:
+            job = self.jobs.get(filepath)
+            if job is None:
+                return {"filepath": filepath, "state": None}
+            if job["state"] == "running":
+                job["_cancel"].set()
+            return self._status(job)
+
+    def cancel_all(self):
+        with self.lock:
+            for job in self.jobs.values():
+                if job["state"] == "running":
+                    job["_cancel"].set()
+
+
+decompile_jobs = DecompileJobs(DECOMPILE_WORKERS)
 
 
 @jsonrpc
-def get_use_permissions(filepath):
+def start_decompile_job(filepath, workers=0, cpu_budget=0):
     """
-    Get all requested (uses-permission) permissions from the APK manifest.
+    Start decompiling every class of the APK in the background, filling the
+    decompile cache so that later decompile calls return immediately. workers
+    caps the threads used (at most JEB_MCP_DECOMPILE_WORKERS) and cpu_budget
+    is the fraction of time, in (0, 1], each of them may spend decompiling.
+    Returns the job status; poll get_decompile_job_status for its progress.
     """
     if not filepath:
         raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
-    
-    from xml.etree import ElementTree as ET
-
-    manifest_text = get_manifest(filepath)
-    manifest_text = preprocess_manifest_py2(manifest_text)
-
-    if not manifest_text:
-        raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
-    
-    if 'use_permissions' in apk_cached_data:
-        return apk_cached_data['use_permissions']
-
-    try:
-        root = ET.fromstring(manifest_text.encode('utf-8'))
-    except Exception as e:
-        print("[MCP] Error parsing manifest:", e)
-        raise JSONRPCError(-1, ErrorMessages.GET_MANIFEST_FAILED)
-
-    ANDROID_NS = 'http://schemas.android.com/apk/res/android'
-    use_permissions = []
-
-    for perm in root.findall('uses-permission'):
-        name = perm.attrib.get('{' + ANDROID_NS + '}name')
-        if name:
-            use_permissions.append(name)
-            
-    apk_cached_data['use_permissions'] = use_permissions
-    return use_permissions
+    return decompile_jobs.start(filepath, workers, cpu_budget)
 
 
 @jsonrpc
-def search_assets(filepath, regex_pattern, limit):
+def get_decompile_job_status(filepath):
     """
-    Search for a regex pattern in all files within the APK's 'assets' directory.
-    Text files: +/- 64 characters context.
-    Binary files: +/- 64 bytes context.
+    Report the last decompile job of the APK: its state (running, done,
+    cancelled or failed), classes done out of the total, methods decompiled,
+    already cached or failed, and elapsed seconds.
     """
-    if not filepath or not regex_pattern:
+    if not filepath:
         raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
+    return decompile_jobs.get(filepath)
 
-    apk = getOrLoadApk(filepath)
-
-    try:
-        pattern = re.compile(regex_pattern)
-    except re.error as e:
-        raise JSONRPCError(-1, "Invalid regular expression: " + str(e))
-
-    results = []
-
-    assets_root_unit = None
-    for child_unit in apk.getChildren():
-        if child_unit.getName() == 'Assets':
-            assets_root_unit = child_unit
-            break
-    
-    if not assets_root_unit:
-        return []
-    
-    stack = [(assets_root_unit, '')]
-    
-    text_extensions = set(['.txt', '.json', '.xml', '.html', '.js', '.css', '.properties', '.yaml', '.yml', '.csv', '.ini', '.md'])
-    
-    while stack:
-        if limit > 0 and len(results) >= limit:
-            break
-
-        current_unit, current_path = stack.pop(0)
-        
-        if current_unit == assets_root_unit:
-            path = current_path
-        else:
-            unit_name = current_unit.getName()
-            path = os.path.join(current_path, unit_name)
 
-        children = current_unit.getChildren()
-        if children:
-            for child in children:
-                stack.append((child, path))
-        elif hasattr(current_unit, "getInput"):
-            input_obj = current_unit.getInput()
-            if input_obj:
-                stream = input_obj.getStream()
-                if stream:
-                    try:
-                        baos = ByteArrayOutputStream()
-                        buffer = jarray.zeros(8192, 'b')
-                        
-                        while True:
-                            bytes_read = stream.read(buffer)
-                            if bytes_read == -1:
-                                break
-                            baos.write(buffer, 0, bytes_read)
-                        
-                        byte_content = baos.toByteArray().tostring()
-                        
-                        ext = os.path.splitext(path)[1].lower()
-                        is_text = (ext in text_extensions) or (len(byte_content) > 0 and '\x00' not in byte_content[:1024])
-                        
-                        file_matches = []
-                        
-                        if is_text:
-                            text_content = byte_content.decode('utf-8', 'replace')
-                            
-                            for match in pattern.finditer(text_content):
-                                start = match.start() # 此时为字符索引
-                                end = match.end()
-                                m_str = match.group()
-                                
-                                ctx_start = max(0, start - 64)
-                                ctx_end = min(len(text_content), end + 64)
-                                context_chars = text_content[ctx_start:ctx_end]
-                                
-                                match_info = {
-                                    "match": m_str,
-                                    "offset": start,
-                                    "line_number": text_content.count('\n', 0, start) + 1,
-                                    "context": context_chars.strip()
-                                }
-                                file_matches.append(match_info)
-                        
-                        else:
-                            for match in pattern.finditer(byte_content):
-                                start = match.start()
-                                end = match.end()
-                                m_bytes = match.group()
-                                
-                                try:
-                                    m_decoded = m_bytes.decode('utf-8')
-                                except UnicodeDecodeError:
-                                    m_decoded = m_bytes.encode('hex')
-                                
-                                ctx_start = max(0, start - 64)
-                                ctx_end = min(len(byte_content), end + 64)
-                                context_bytes = byte_content[ctx_start:ctx_end]
-                                
-                                ascii_view = "".join([c if 32 <= ord(c) < 127 else '.' for c in context_bytes])
-                                
-                                match_info = {
-                                    "match": m_decoded,
-                                    "offset": start,
-                                    "context_ascii": ascii_view,
-                                    "context_hex": context_bytes.encode('hex')
-                                }
-                                file_matches.append(match_info)
-                        
-                        if file_matches:
-                            results.append({
-                                "asset_path": path,
-                                "is_text": is_text,
-                                "matches": file_matches
-                            })
-                            
-                    finally:
-                        stream.close()
-    return results
+@jsonrpc
+def cancel_decompile_job(filepath):
+    """Cancel the running decompile job of the APK, what it decompiled so far stays cached"""
+    if not filepath:
+        raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
+    return decompile_jobs.cancel(filepath)
 
 
 @jsonrpc
-def get_method_decompiled_code(filepath, method_signature):
-    """Get the decompiled code of the given method in the APK file, the passed in method_signature needs to be a fully-qualified signature
+def get_method_smali_code(filepath, method_signature):
+    """Get the smali code of the given method in the APK file, the passed in method_signature needs to be a fully-qualified signature
     Dex units use Java-style internal addresses to identify items:
     - package: Lcom/abc/
     - type: Lcom/abc/Foo;
@@ -980,80 +3462,240 @@ def get_method_decompiled_code(filepath, method_signature):
     
     codeUnit = apk.getDex()
     method = codeUnit.getMethod(method_signature)
-    decomp = DecompilerHelper.getDecompiler(codeUnit)
-    if not decomp:
-        print('Cannot acquire decompiler for unit: %s' % decomp)
-        raise JSONRPCError(-1, ErrorMessages.DECOMPILE_FAILED)
-    
+
     if method is None:
         print('Method not found: %s' % method_signature)
         raise_method_not_found(method_signature)
+    
+    instructions = method.getInstructions()
+    # Joined once: appending to a string copies it, which is quadratic on huge methods
+    return "".join([instruction.format(None) + "\n" for instruction in instructions])
+
+
+# (flag, class name, field name, method name) of the dex access flags
+SMALI_ACCESS_FLAGS = [
+    (0x1, "public", "public", "public"),
+    (0x2, "private", "private", "private"),
+    (0x4, "protected", "protected", "protected"),
+    (0x8, "static", "static", "static"),
+    (0x10, "final", "final", "final"),
+    (0x20, None, None, "synchronized"),
+    (0x40, None, "volatile", "bridge"),
+    (0x80, None, "transient", "varargs"),
+    (0x100, None, None, "native"),
+    (0x200, "interface", None, None),
+    (0x400, "abstract", None, "abstract"),
+    (0x800, None, None, "strictfp"),
+    (0x1000, "synthetic", "synthetic", "synthetic"),
+    (0x2000, "annotation", None, None),
+    (0x4000, "enum", "enum", None),
+    (0x10000, None, None, "constructor"),
+    (0x20000, None, None, "declared-synchronized"),
+]
+
+SMALI_CLASS, SMALI_FIELD, SMALI_METHOD = 1, 2, 3
 
-    if not decomp.decompileMethod(method.getSignature()):
-        print('Failed decompiling method')
-        raise JSONRPCError(-1, ErrorMessages.DECOMPILE_FAILED)
 
-    text = decomp.getDecompiledMethodText(method.getSignature())
-    return text
+def smali_access_flags(flags, kind):
+    names = [entry[kind] for entry in SMALI_ACCESS_FLAGS if flags & entry[0] and entry[kind]]
+    return " ".join(names) + " " if names else ""
+
+
+def smali_label(offset):
+    return ":L%04x" % offset
+
+
+def smali_type(codeUnit, index):
+    if index < 0:
+        return None  # catch-all handler
+    return codeUnit.getType(index).getSignature(True)
+
+
+def render_method_smali(codeUnit, method, out):
+    """
+    Append the smali of a method to the out list of lines, with its registers,
+    .line debug info, try/catch ranges and labels on the branch targets.
+    Offsets are those of JEB's code model, labels are named after them.
+    """
+    data = method.getData()
+    flags = data.getAccessFlags() if data is not None else 0
+    out.append(".method %s%s" % (smali_access_flags(flags, SMALI_METHOD), method.getSignature(True).split("->", 1)[-1]))
+    code = data.getCodeItem() if data is not None else None
+    if code is None:
+        out.append(".end method")  # abstract and native methods
+        return
+
+    instructions = list(code.getInstructions())
+    starts = set()
+    end = 0
+    for instruction in instructions:
+        starts.add(instruction.getOffset())
+        end = max(end, instruction.getOffset() + instruction.getSize())
+    starts.add(end)
+
+    labels = set()
+    for instruction in instructions:
+        offset = instruction.getOffset()
+        try:
+            flow = instruction.getBreakingFlow(offset)
+        except Exception:
+            continue
+        if flow is None or not flow.isBrokenKnown():
+            continue
+        for target in flow.getTargets():
+            address = target.getAddress()
+            if address != offset + instruction.getSize():  # not the fall-through
+                labels.add(address)
+
+    catches = collections.defaultdict(list)  # offset -> .catch directives to emit there
+    for item in code.getExceptionItems() or []:
+        start, stop = item.getStartAddress(), item.getEndAddress()
+        labels.add(start)
+        labels.add(stop)
+        for handler in item.getHandlers():
+            labels.add(handler.getAddress())
+            exception_type = smali_type(codeUnit, handler.getTypeIndex())
+            catches[stop].append("%s {%s .. %s} %s" % (
+                ".catch " + exception_type if exception_type else ".catchall",
+                smali_label(start), smali_label(stop), smali_label(handler.getAddress())))
+
+    debug_lines = {}
+    debug = code.getDebugInfo()
+    if debug is not None:
+        for line in debug.getDebugLines() or []:
+            debug_lines[line.getAddress()] = line.getLineNumber()
+
+    out.append("    .registers %d" % code.getRegisterCount())
+    for instruction in instructions + [None]:
+        offset = instruction.getOffset() if instruction is not None else end
+        lines = []
+        if offset in debug_lines:
+            lines.append(".line %d" % debug_lines[offset])
+        if offset in labels and offset in starts:
+            lines.append(smali_label(offset))
+        lines.extend(catches.get(offset, ()))
+        if instruction is not None:
+            lines.append(instruction.format(None))
+        if lines:
+            out.append("")
+            out.extend(["    " + line for line in lines])
+    out.append(".end method")
+
+
+def render_class_smali(codeUnit, clazz):
+    """The smali of a whole class: header, fields and methods"""
+    out = [
+        ".class %s%s" % (smali_access_flags(clazz.getAccessFlags(), SMALI_CLASS), clazz.getSignature(True)),
+        ".super %s" % clazz.getSupertypeSignature(True),
+    ]
+    for interface in clazz.getInterfaceSignatures(True) or []:
+        out.append(".implements %s" % interface)
+
+    fields = [field for field in (clazz.getFields() or []) if field]
+    if fields:
+        out.append("")
+    for field in fields:
+        data = field.getData()
+        flags = data.getAccessFlags() if data is not None else 0
+        out.append(".field %s%s" % (smali_access_flags(flags, SMALI_FIELD), field.getSignature(True).split("->", 1)[-1]))
+
+    for method in clazz.getMethods() or []:
+        if method:
+            out.append("")
+            render_method_smali(codeUnit, method, out)
+    out.append("")
+    return "\n".join(out)
 
 
 @jsonrpc
-def get_method_smali_code(filepath, method_signature):
-    """Get the smali code of the given method in the APK file, the passed in method_signature needs to be a fully-qualified signature
-    Dex units use Java-style internal addresses to identify items:
-    - package: Lcom/abc/
-    - type: Lcom/abc/Foo;
-    - method: Lcom/abc/Foo;->bar(I[JLjava/Lang/String;)V
-    - field: Lcom/abc/Foo;->flag1:Z
+def get_class_smali_code(filepath, class_signature):
+    """
+    Get the smali code of a whole class in the APK file, the passed in class_signature needs to be a fully-qualified signature
+    such as Lcom/abc/Foo;
+    Includes the fields, the registers, labels and try/catch ranges of every method and .line debug info,
+    a cheap alternative to decompilation for code the decompiler fails on.
     note filepath needs to be an absolute path
     """
-    if not filepath or not method_signature:
+    if not filepath or not class_signature:
         raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
 
     apk = getOrLoadApk(filepath)
-    
+
     codeUnit = apk.getDex()
-    method = codeUnit.getMethod(method_signature)
+    clazz = codeUnit.getClass(class_signature)
+    if clazz is None:
+        print("Class not found: %s" % class_signature)
+        raise_class_not_found(class_signature)
 
-    if method is None:
-        print('Method not found: %s' % method_signature)
-        raise_method_not_found(method_signature)
-    
-    instructions = method.getInstructions()
-    smali_code = ""
-    for instruction in instructions:
-        smali_code = smali_code + instruction.format(None)  + "\n"
+    return render_class_smali(codeUnit, clazz)
+
+
+@jsonrpc
+def get_package_smali_code(filepath, package, limit=0, cursor=None, page_size=0):
+    """
+    Get the smali code of every class of a package and its subpackages, the passed in package needs to be
+    a fully-qualified package such as Lcom/abc/
+    Returns [{"class": signature, "smali": code}], at most limit classes unless limit is 0.
+    Pass a page_size or the next_cursor of a previous page to get the results page by page.
+    """
+    return paginate(
+        ("get_package_smali_code", filepath, package, limit), cursor, page_size,
+        lambda: iter_package_smali_code(filepath, package, limit))
+
+
+@jsonrpc_stream("get_package_smali_code")
+def iter_package_smali_code(filepath, package, limit=0):
+    """Yield the get_package_smali_code results one class at a time"""
+    if not filepath or not package:
+        raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
+    if not package.endswith("/"):
+        package += "/"
+
+    apk = getOrLoadApk(filepath)
+    codeUnit = apk.getDex()
 
-    return smali_code
+    found = 0
+    for clazz in codeUnit.getClasses():
+        if not clazz:
+            continue
+        signature = clazz.getSignature(True)
+        if not signature.startswith(package):
+            continue
+        yield {"class": signature, "smali": render_class_smali(codeUnit, clazz)}
+        found += 1
+        if limit and found >= limit:
+            break
 
 
 @jsonrpc
-def get_method_callers(filepath, method_signature):
+def get_method_callers(filepath, method_signature, cursor=None, page_size=0):
     """
     Get the callers of the given method in the APK file, the passed in method_signature needs to be a fully-qualified signature
     note filepath needs to be an absolute path
+    Pass a page_size or the next_cursor of a previous page to get the results page by page.
     """
     if not filepath or not method_signature:
         raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
 
     apk = getOrLoadApk(filepath)
     
-    ret = []
     codeUnit = apk.getDex()
     method = codeUnit.getMethod(method_signature)
     if method is None:
         print("Method not found: %s" % method_signature)
         raise_method_not_found(method_signature)
-        
-    actionXrefsData = ActionXrefsData()
-    actionContext = ActionContext(codeUnit, Actions.QUERY_XREFS, method.getItemId(), None)
-    if codeUnit.prepareExecution(actionContext,actionXrefsData):
-        for i in range(actionXrefsData.getAddresses().size()):
-            ret.append({
-                "address": actionXrefsData.getAddresses()[i],
-                "details": actionXrefsData.getDetails()[i]
-            })
-    return ret
+
+    def iter_callers():
+        actionXrefsData = ActionXrefsData()
+        actionContext = ActionContext(codeUnit, Actions.QUERY_XREFS, method.getItemId(), None)
+        if codeUnit.prepareExecution(actionContext,actionXrefsData):
+            for i in range(actionXrefsData.getAddresses().size()):
+                yield {
+                    "address": actionXrefsData.getAddresses()[i],
+                    "details": actionXrefsData.getDetails()[i]
+                }
+
+    return paginate(("get_method_callers", filepath, method_signature), cursor, page_size, iter_callers)
 
 
 @jsonrpc
@@ -1085,6 +3727,166 @@ def get_field_callers(filepath, field_signature):
     return ret
 
 
+class CallGraph(object):
+    """
+    Method call graph of a dex unit in compressed sparse rows: the callees of
+    method i are callees[callee_offsets[i]:callee_offsets[i + 1]], and its
+    callers are read the same way from the reverse arrays. Nodes are dex
+    method indices, so renames do not invalidate the graph; signatures are
+    only resolved when answering a query.
+    """
+
+    def __init__(self, count, sources, targets):
+        self.count = count
+        self.edge_count = len(sources)
+        self.callee_offsets, self.callees = self._csr(count, sources, targets)
+        self.caller_offsets, self.callers = self._csr(count, targets, sources)
+
+    @staticmethod
+    def _csr(count, sources, targets):
+        # Counting sort of the edges by source
+        offsets = array('i', [0]) * (count + 1)
+        for source in sources:
+            offsets[source + 1] += 1
+        for i in xrange(count):
+            offsets[i + 1] += offsets[i]
+        fill = offsets[:-1]
+        adjacent = array('i', [0]) * len(sources)
+        for source, target in itertools.izip(sources, targets):
+            adjacent[fill[source]] = target
+            fill[source] += 1
+        return offsets, adjacent
+
+    def walk(self, start, reverse, depth, fan_out=0, limit=0):
+        """
+        Breadth-first walk from start along callees, or callers when reverse,
+        up to depth edges away. At most fan_out neighbours of each method are
+        followed and at most limit methods are returned (0 for no limit).
+        Returns ([(node, depth, parent)], truncated).
+        """
+        offsets, adjacent = (self.caller_offsets, self.callers) if reverse else (self.callee_offsets, self.callees)
+        seen = set([start])
+        frontier = [start]
+        found = []
+        truncated = False
+        for level in xrange(1, depth + 1):
+            next_frontier = []
+            for node in frontier:
+                begin, end = offsets[node], offsets[node + 1]
+                if fan_out and end - begin > fan_out:
+                    end = begin + fan_out
+                    truncated = True
+                for i in xrange(begin, end):
+                    neighbour = adjacent[i]
+                    if neighbour in seen:
+                        continue
+                    if limit and len(found) >= limit:
+                        return found, True
+                    seen.add(neighbour)
+                    found.append((neighbour, level, node))
+                    next_frontier.append(neighbour)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return found, truncated
+
+    def stats(self):
+        return {"methods": self.count, "edges": self.edge_count}
+
+
+def build_call_graph(codeUnit):
+    """Collect the invoke edges of every method with code, once per caller and callee"""
+    methods = [method for method in codeUnit.getMethods() if method]
+    count = max([method.getIndex() for method in methods] or [-1]) + 1
+    sources = array('i')
+    targets = array('i')
+    for method in methods:
+        if not method.isInternal():
+            continue
+        data = method.getData()
+        code = data.getCodeItem() if data is not None else None
+        if code is None:
+            continue
+        caller = method.getIndex()
+        callees = set()
+        for instruction in code.getInstructions():
+            if instruction.getParameterIndexType() != IDalvikInstruction.INDEX_TO_METHOD:
+                continue
+            for parameter in instruction.getParameters():
+                if parameter.getType() == IDalvikInstruction.TYPE_IDX:
+                    callee = int(parameter.getValue())
+                    if callee not in callees and 0 <= callee < count:
+                        callees.add(callee)
+                        sources.append(caller)
+                        targets.append(callee)
+                    break
+    return CallGraph(count, sources, targets)
+
+
+def get_call_graph(filepath):
+    codeUnit = getOrLoadApk(filepath).getDex()
+    return getLoadedArtifact(filepath).cached('call_graph', lambda: build_call_graph(codeUnit))
+
+
+def walk_call_graph(filepath, method_signature, reverse, depth, fan_out, limit):
+    if not filepath or not method_signature:
+        raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
+    depth = int(depth or 1)
+    fan_out = int(fan_out or 0)
+    limit = int(limit or 0)
+    if depth < 1 or fan_out < 0 or limit < 0:
+        raise JSONRPCError(-32602, "Invalid params: depth must be positive, fan_out and limit not negative")
+
+    codeUnit = getOrLoadApk(filepath).getDex()
+    method = codeUnit.getMethod(method_signature)
+    if method is None:
+        print("Method not found: %s" % method_signature)
+        raise_method_not_found(method_signature)
+
+    graph = get_call_graph(filepath)
+    found, truncated = graph.walk(method.getIndex(), reverse, depth, fan_out, limit)
+
+    signatures = {method.getIndex(): method.getSignature(True)}
+    results = []
+    for node, level, parent in found:
+        item = codeUnit.getMethod(node)
+        signatures[node] = item.getSignature(True)
+        results.append({
+            "signature": signatures[node],
+            "depth": level,
+            # The method it was reached from: a caller of it for callees, a callee for callers
+            "via": signatures[parent],
+            "internal": bool(item.isInternal()),
+        })
+    return {"method": signatures[method.getIndex()], "results": results, "truncated": truncated}
+
+
+@jsonrpc
+def get_transitive_callers(filepath, method_signature, depth=1, fan_out=0, limit=0):
+    """
+    Get the methods calling the given method, directly or up to depth calls away, from a call graph
+    index built once per APK. The passed in method_signature needs to be a fully-qualified signature.
+    At most fan_out callers of each method are followed and at most limit methods returned (0 for no limit).
+    Returns {"method", "results": [{"signature", "depth", "via", "internal"}], "truncated"} in breadth-first
+    order, where via is the method the result calls to reach the given one.
+    note filepath needs to be an absolute path
+    """
+    return walk_call_graph(filepath, method_signature, True, depth, fan_out, limit)
+
+
+@jsonrpc
+def get_transitive_callees(filepath, method_signature, depth=1, fan_out=0, limit=0):
+    """
+    Get the methods called by the given method, directly or up to depth calls away, from a call graph
+    index built once per APK. The passed in method_signature needs to be a fully-qualified signature.
+    At most fan_out callees of each method are followed and at most limit methods returned (0 for no limit).
+    Returns {"method", "results": [{"signature", "depth", "via", "internal"}], "truncated"} in breadth-first
+    order, where via is the method calling the result; internal is false for framework and library methods.
+    note filepath needs to be an absolute path
+    """
+    return walk_call_graph(filepath, method_signature, False, depth, fan_out, limit)
+
+
 @jsonrpc
 def get_method_overrides(filepath, method_signature):
     """
@@ -1160,10 +3962,11 @@ def get_interfaces(filepath, class_signature):
 
 
 @jsonrpc
-def get_class_methods(filepath, class_signature):
+def get_class_methods(filepath, class_signature, cursor=None, page_size=0):
     """
     Get the methods of the given class in the APK file, the passed in class_signature needs to be a fully-qualified signature
     the passed in filepath needs to be a fully-qualified absolute path
+    Pass a page_size or the next_cursor of a previous page to get the results page by page.
     """
     if not filepath or not class_signature:
         raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
@@ -1176,20 +3979,21 @@ def get_class_methods(filepath, class_signature):
         print("Class not found: %s" % class_signature)
         raise_class_not_found(class_signature)
     
-    method_signatures = []
-    dex_methods = clazz.getMethods()
-    for method in dex_methods:
-        if method:
-            method_signatures.append(method.getSignature(True))
+    def iter_method_signatures():
+        dex_methods = clazz.getMethods()
+        for method in dex_methods:
+            if method:
+                yield method.getSignature(True)
 
-    return method_signatures
+    return paginate(("get_class_methods", filepath, class_signature), cursor, page_size, iter_method_signatures)
 
 
 @jsonrpc
-def get_class_fields(filepath, class_signature):
+def get_class_fields(filepath, class_signature, cursor=None, page_size=0):
     """
     Get the fields of the given class in the APK file, the passed in class_signature needs to be a fully-qualified signature
     the passed in filepath needs to be a fully-qualified absolute path
+    Pass a page_size or the next_cursor of a previous page to get the results page by page.
     """
     if not filepath or not class_signature:
         raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
@@ -1202,16 +4006,16 @@ def get_class_fields(filepath, class_signature):
         print("Class not found: %s" % class_signature)
         raise_class_not_found(class_signature)
     
-    field_signatures = []
-    dex_field = clazz.getFields()
-    for field in dex_field:
-        if field:
-            field_signatures.append(field.getSignature(True))
+    def iter_field_signatures():
+        dex_field = clazz.getFields()
+        for field in dex_field:
+            if field:
+                yield field.getSignature(True)
 
-    return field_signatures
+    return paginate(("get_class_fields", filepath, class_signature), cursor, page_size, iter_field_signatures)
 
 
-@jsonrpc
+@jsonrpc_mutating
 def rename_class_name(filepath, class_signature, new_class_name):
     if not filepath or not class_signature:
         return False
@@ -1227,10 +4031,11 @@ def rename_class_name(filepath, class_signature, new_class_name):
 
     print("rename class:", clazz.getName(), "to", new_class_name)
     clazz.setName(new_class_name)
+    markRenamed(getLoadedArtifact(filepath))
     return True
 
 
-@jsonrpc
+@jsonrpc_mutating
 def rename_method_name(
     filepath, class_signature, method_signature, new_method_name
 ):
@@ -1251,11 +4056,12 @@ def rename_method_name(
         if signature == method_signature:
             print("rename method:", method.getName(), "to", new_method_name)
             method.setName(new_method_name)
+            markRenamed(getLoadedArtifact(filepath))
             break
     return True
 
 
-@jsonrpc
+@jsonrpc_mutating
 def rename_class_field(
     filepath, class_signature, field_signature, new_field_name
 ):
@@ -1278,6 +4084,7 @@ def rename_class_field(
         if signature == field_signature:
             print("rename field:", field.getName(), "to", new_field_name)
             field.setName(new_field_name)
+            markRenamed(getLoadedArtifact(filepath))
             break
     return True
 
@@ -1374,10 +4181,20 @@ def check_java_identifier(filepath, identifier):
     return result
 
 @jsonrpc
-def get_strings(filepath, regex_pattern, limit):
+def get_strings(filepath, regex_pattern, limit, cursor=None, page_size=0):
     """
     Get hardcoded strings from the APK, filtered by a regex pattern.
+    Pass a page_size or the next_cursor of a previous page to get the results
+    page by page.
     """
+    return paginate(
+        ("get_strings", filepath, regex_pattern, limit), cursor, page_size,
+        lambda: iter_strings(filepath, regex_pattern, limit))
+
+
+@jsonrpc_stream("get_strings")
+def iter_strings(filepath, regex_pattern, limit):
+    """Yield the get_strings results one string at a time"""
     if not filepath:
         raise JSONRPCError(-1, ErrorMessages.MISSING_PARAM)
         
@@ -1391,32 +4208,83 @@ def get_strings(filepath, regex_pattern, limit):
         except Exception as e:
             raise JSONRPCError(-1, "[Error] Invalid regex pattern: " + str(e))
             
-    results = []
-    strings = codeUnit.getStrings()
-    if strings:
-        for s in strings:
-            try:
-                val = s.getValue()
-                if val is None:
-                    continue
-                if not pattern or pattern.search(val):
-                        xrefs = []
-                        actionXrefsData = ActionXrefsData()
-                        actionContext = ActionContext(codeUnit, Actions.QUERY_XREFS, s.getItemId(), None)
-                        if codeUnit.prepareExecution(actionContext, actionXrefsData):
-                            for i in range(actionXrefsData.getAddresses().size()):
-                                xrefs.append(actionXrefsData.getAddresses()[i])
-                        results.append({
-                            "value": val,
-                            "xrefs": xrefs
-                        })
-                        if limit > 0 and len(results) >= limit:
-                            break
-            except Exception as e:
-                print("Failed to parse string due to: " + str(e))
-                continue
-                    
-    return results
+    found = 0
+    for val, item_id in get_string_pool(filepath):
+        if pattern and not pattern.search(val):
+            continue
+        try:
+            xrefs = []
+            actionXrefsData = ActionXrefsData()
+            actionContext = ActionContext(codeUnit, Actions.QUERY_XREFS, item_id, None)
+            if codeUnit.prepareExecution(actionContext, actionXrefsData):
+                for i in range(actionXrefsData.getAddresses().size()):
+                    xrefs.append(actionXrefsData.getAddresses()[i])
+            item = {
+                "value": val,
+                "xrefs": xrefs
+            }
+        except Exception as e:
+            print("Failed to parse string due to: " + str(e))
+            continue
+        found += 1
+        yield item
+        if limit > 0 and found >= limit:
+            break
+
+
+class ThreadLocalOutput(object):
+    """
+    Stands in for sys.stdout or sys.stderr and writes to the stream the
+    current thread redirected it to, or else to the stream it replaced.
+    Requests run concurrently, so execute_python_code captures its output
+    through redirect() instead of swapping the process-wide streams.
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
+
+    def _target(self):
+        return getattr(self.local, 'stream', None) or self.default
+
+    def write(self, data):
+        self._target().write(data)
+
+    def writelines(self, lines):
+        self._target().writelines(lines)
+
+    def flush(self):
+        self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+    @contextlib.contextmanager
+    def redirect(self, stream):
+        previous = getattr(self.local, 'stream', None)
+        self.local.stream = stream
+        try:
+            yield
+        finally:
+            self.local.stream = previous
+
+
+thread_local_output_lock = threading.Lock()
+
+
+def thread_local_output():
+    """
+    Install the ThreadLocalOutput proxies on sys.stdout and sys.stderr, unless
+    they already are, and return them
+    """
+    with thread_local_output_lock:
+        # Checked by attribute: running the script again defines a new class
+        if not hasattr(sys.stdout, 'redirect'):
+            sys.stdout = ThreadLocalOutput(sys.stdout)
+        if not hasattr(sys.stderr, 'redirect'):
+            sys.stderr = ThreadLocalOutput(sys.stderr)
+        return sys.stdout, sys.stderr
+
 
 def _is_safe_code(code):
     """
@@ -1448,7 +4316,7 @@ def _is_safe_code(code):
                 
     return True, ""
 
-@jsonrpc
+@jsonrpc_mutating
 def execute_python_code(code):
     """
     Execute arbitrary Python code in the JEB Jython environment and return the output.
@@ -1460,12 +4328,9 @@ def execute_python_code(code):
     if not is_safe:
         return "Execution blocked for security reasons: " + reason
         
-    old_stdout = sys.stdout
-    old_stderr = sys.stderr
+    stdout, stderr = thread_local_output()
     redirected_output = StringIO.StringIO()
-    sys.stdout = redirected_output
-    sys.stderr = redirected_output
-    
+
     timeout_seconds = 10.0
     start_time = time.time()
 
@@ -1475,9 +4340,13 @@ def execute_python_code(code):
         return trace_calls
 
     try:
-        sys.settrace(trace_calls)
-        exec_globals = globals().copy()
-        exec code in exec_globals
+        with stdout.redirect(redirected_output), stderr.redirect(redirected_output):
+            try:
+                sys.settrace(trace_calls)
+                exec_globals = globals().copy()
+                exec code in exec_globals
+            finally:
+                sys.settrace(None)
         result = redirected_output.getvalue()
         if not result:
             result = "Code executed successfully with no output."
@@ -1485,9 +4354,6 @@ def execute_python_code(code):
     except Exception as e:
         return "Error executing code:\n" + traceback.format_exc()
     finally:
-        sys.settrace(None)
-        sys.stdout = old_stdout
-        sys.stderr = old_stderr
         redirected_output.close()
 
 
@@ -1528,6 +4394,8 @@ class ErrorMessages:
     CLASS_NOT_FOUND_WITHOUT_CHECK = "[Error] Class not found in current apk."
     FIELD_NOT_FOUND = "[Error] Field not found in current apk, use check_java_identifier tool check your input first."
     FIELD_NOT_FOUND_WITHOUT_CHECK = "[Error] Field not found in current apk."
+    ASSET_SEARCH_UNLOADED = "[Error] Apk was unloaded since the previous page, start the search again."
+    DECOMPILE_JOB_UNLOADED = "[Error] Apk was unloaded during the decompile job, start it again."
 
 
 CTX = None
@@ -1552,3 +4420,6 @@ class MCP(IScript):
 
     def term(self):
         self.server.stop()
+        decompile_jobs.cancel_all()
+        project_store.flush()
+        artifact_cache.close()
@@ -1,64 +1,314 @@
 import argparse
-import http.client
+import asyncio
+import gzip
+import itertools
 import json
 import os
+import re
 import sys
+import threading
+import time
+from typing import Annotated
 
 from fastmcp import FastMCP
 
 mcp = FastMCP("github.com/wrlu/jebmcp")
 
-jsonrpc_request_id = 1
-
 HOST = os.getenv("JEB_MCP_HOST", "127.0.0.1")
 PORT = int(os.getenv("JEB_MCP_PORT", "16161"))
+# Must stay below JEB_MCP_KEEPALIVE_TIMEOUT of the plugin so that pooled
+# connections are dropped before the plugin closes them.
+POOL_IDLE_TIMEOUT = float(os.getenv("JEB_MCP_POOL_IDLE_TIMEOUT", "5"))
+# Ask the plugin to gzip large responses. "auto" only does it when the plugin
+# runs on another host, on loopback compression costs more than it saves.
+GZIP_MODE = os.getenv("JEB_MCP_GZIP", "auto").lower()
+if GZIP_MODE == "auto":
+    ACCEPT_GZIP = HOST not in ("127.0.0.1", "localhost", "::1")
+else:
+    ACCEPT_GZIP = GZIP_MODE in ("1", "true", "yes", "on")
+REQUEST_HEADERS = {"Content-Type": "application/json"}
+if ACCEPT_GZIP:
+    REQUEST_HEADERS["Accept-Encoding"] = "gzip"
+# Methods that support it then stream their results as newline-delimited JSON
+NDJSON = "application/x-ndjson"
+STREAM_REQUEST_HEADERS = dict(REQUEST_HEADERS, Accept=NDJSON)
+# Calls in flight at once, which also bounds the open connections, and the
+# per-call timeout in seconds (0 waits forever, analysis of a large APK can
+# take many minutes).
+MAX_CONCURRENCY = int(os.getenv("JEB_MCP_MAX_CONCURRENCY", "4"))
+CALL_TIMEOUT = float(os.getenv("JEB_MCP_CALL_TIMEOUT", "0")) or None
+
+
+jsonrpc_request_ids = itertools.count(1)
+jsonrpc_request_ids_lock = threading.Lock()
+
+
+def raise_jsonrpc_error(error):
+    """Turn a JSON-RPC error object into an exception"""
+    code = error["code"]
+    message = error["message"]
+
+    if code == -1:
+        raise Exception(message)
+    else:
+        pretty = f"JSON-RPC error {code}: {message}"
+        if "data" in error:
+            pretty += "\n" + error["data"]
+        raise Exception(pretty)
 
 
-def make_jsonrpc_request(method: str, *params):
-    """Make a JSON-RPC request to the JEB plugin"""
-    global jsonrpc_request_id
-    conn = http.client.HTTPConnection(HOST, PORT)
-    request = {
+def next_request_id():
+    with jsonrpc_request_ids_lock:
+        return next(jsonrpc_request_ids)
+
+
+def build_jsonrpc_request(method, params):
+    return {
         "jsonrpc": "2.0",
         "method": method,
         "params": list(params),
-        "id": jsonrpc_request_id,
+        "id": next_request_id(),
     }
-    jsonrpc_request_id += 1
 
-    try:
-        conn.request("POST", "/mcp", json.dumps(request), {
-            "Content-Type": "application/json"
-        })
-        response = conn.getresponse()
-        data = json.loads(response.read().decode())
-
-        if "error" in data:
-            error = data["error"]
-            code = error["code"]
-            message = error["message"]
-
-            if code == -1:
-                raise Exception(message)
-            else:
-                pretty = f"JSON-RPC error {code}: {message}"
-                if "data" in error:
-                    pretty += "\n" + error["data"]
-                raise Exception(pretty)
-
-        result = data["result"]
+
+def parse_jsonrpc_response(data):
+    """Return the result of a JSON-RPC response, raising on errors"""
+    if "error" in data:
+        raise_jsonrpc_error(data["error"])
+
+    result = data["result"]
+    return result
+
+
+def parse_jsonrpc_batch_response(requests, data):
+    """Match batch responses to their requests by id, raising on the first error"""
+    if isinstance(data, dict):
+        # The whole batch was rejected
+        raise_jsonrpc_error(data["error"])
+
+    responses = {response.get("id"): response for response in data}
+    results = []
+    for request in requests:
+        response = responses.get(request["id"])
+        if response is None:
+            raise Exception(f"Missing response for {request['method']} in batch")
+        results.append(parse_jsonrpc_response(response))
+    return results
+
+
+def parse_jsonrpc_stream_message(message):
+    """
+    Return the results carried by one message of an NDJSON stream: an item
+    line, the final line closing the stream, or the plain JSON-RPC reply sent
+    by a plugin that did not stream.
+    """
+    if "item" in message:
+        return [message["item"]]
+    result = parse_jsonrpc_response(message)
+    if isinstance(result, list):
         return result
-    except Exception:
-        raise
-    finally:
-        conn.close()
+    return []
+
+
+class AsyncJSONRPCClient:
+    """
+    asyncio HTTP/1.1 client for the JEB plugin. It keeps its own pool of
+    keep-alive connections, limits the number of calls in flight and applies
+    a timeout to each call, so tools never block the FastMCP event loop.
+    """
+
+    def __init__(self, host, port, max_concurrency, idle_timeout, timeout):
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = []  # (reader, writer, time it was returned to the pool)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _acquire(self):
+        """Return (reader, writer, reused), reusing a healthy idle connection if any"""
+        while self._idle:
+            reader, writer, released_at = self._idle.pop()
+            if (time.monotonic() - released_at <= self.idle_timeout
+                    and not reader.at_eof() and not writer.is_closing()):
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        return reader, writer, False
+
+    async def _send(self, reader, writer, body, headers):
+        """Send one POST and return (HTTP version, lower-cased response headers)"""
+        head = f"POST /mcp HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+        for name, value in headers.items():
+            head += f"{name}: {value}\r\n"
+        head += f"Content-Length: {len(body)}\r\n\r\n"
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by the JEB plugin")
+        version, _, _ = status_line.decode("latin-1").partition(" ")
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        return version, response_headers
+
+    async def _read_body(self, reader, headers):
+        data = await reader.readexactly(int(headers.get("content-length", "0")))
+        if headers.get("content-encoding", "").lower() == "gzip":
+            data = gzip.decompress(data)
+        return data
+
+    async def _read_chunk(self, reader):
+        """Read one chunk of a chunked body, b"" marks the end of the body"""
+        size = int((await reader.readline()).split(b";")[0].strip(), 16)
+        if size == 0:
+            # Skip the (empty) trailer section
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            return b""
+        data = await reader.readexactly(size)
+        await reader.readexactly(2)
+        return data
+
+    def _keep_alive(self, version, headers):
+        return version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+    @staticmethod
+    def _can_retry(payload):
+        requests = payload if isinstance(payload, list) else [payload]
+        return not any(request.get("method") in NOT_RETRIED for request in requests)
+
+    async def _open(self, body, headers, timeout, retry=True):
+        """Send the request, returning (reader, writer, version, headers) with retry on a stale connection"""
+        for attempt in range(2):
+            reader, writer, reused = await self._acquire()
+            try:
+                version, response_headers = await asyncio.wait_for(
+                    self._send(reader, writer, body, headers), timeout
+                )
+                return reader, writer, version, response_headers
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                # The plugin most likely closed a reused connection before
+                # reading the request: retry once on a fresh connection.
+                if reused and attempt == 0 and retry:
+                    continue
+                raise
+            except asyncio.TimeoutError:
+                writer.close()
+                raise Exception(f"Timed out after {timeout} seconds waiting for the JEB plugin")
+            except BaseException:
+                writer.close()
+                raise
+
+    def _release(self, reader, writer, version, headers):
+        if self._keep_alive(version, headers):
+            self._idle.append((reader, writer, time.monotonic()))
+        else:
+            writer.close()
+
+    async def post(self, payload, timeout=None):
+        """POST a JSON body and return the decoded JSON response"""
+        body = json.dumps(payload).encode()
+        timeout = timeout if timeout is not None else self.timeout
+        async with self._semaphore:
+            reader, writer, version, headers = await self._open(
+                body, REQUEST_HEADERS, timeout, self._can_retry(payload)
+            )
+            try:
+                data = await asyncio.wait_for(self._read_body(reader, headers), timeout)
+            except asyncio.TimeoutError:
+                writer.close()
+                raise Exception(f"Timed out after {timeout} seconds waiting for the JEB plugin")
+            except BaseException:
+                writer.close()
+                raise
+            self._release(reader, writer, version, headers)
+            return json.loads(data.decode()) if data else []
+
+    async def post_stream(self, payload, timeout=None):
+        """
+        POST a JSON body asking for an NDJSON stream and yield each decoded
+        message as it arrives. A plain JSON reply is yielded as one message.
+        The timeout applies to the wait for each chunk.
+        """
+        body = json.dumps(payload).encode()
+        timeout = timeout if timeout is not None else self.timeout
+        async with self._semaphore:
+            reader, writer, version, headers = await self._open(
+                body, STREAM_REQUEST_HEADERS, timeout, self._can_retry(payload)
+            )
+            complete = False
+            try:
+                if not headers.get("content-type", "").startswith(NDJSON):
+                    data = await asyncio.wait_for(self._read_body(reader, headers), timeout)
+                    yield json.loads(data.decode())
+                else:
+                    pending = b""
+                    while True:
+                        chunk = await asyncio.wait_for(self._read_chunk(reader), timeout)
+                        if not chunk:
+                            break
+                        lines = (pending + chunk).split(b"\n")
+                        pending = lines.pop()
+                        for line in lines:
+                            if line:
+                                yield json.loads(line.decode())
+                complete = True
+            except asyncio.TimeoutError:
+                raise Exception(f"Timed out after {timeout} seconds waiting for the JEB plugin")
+            finally:
+                # A stream abandoned halfway cannot be reused
+                if complete:
+                    self._release(reader, writer, version, headers)
+                else:
+                    writer.close()
+
+
+async_client = AsyncJSONRPCClient(HOST, PORT, MAX_CONCURRENCY, POOL_IDLE_TIMEOUT, CALL_TIMEOUT)
+
+
+async def make_jsonrpc_request_async(method: str, *params):
+    """Make a JSON-RPC request to the JEB plugin without blocking the event loop"""
+    request = build_jsonrpc_request(method, params)
+    return parse_jsonrpc_response(await async_client.post(request))
+
+
+async def stream_jsonrpc_request_async(method: str, *params):
+    """
+    Async generator over the results of a streaming JSON-RPC method, yielding
+    each result as soon as the plugin has found it. MCP tools return their
+    whole result at once, so the tools collecting these items into a list
+    reach the client no earlier than a plain request would; streaming only
+    keeps the plugin from holding the whole result in memory.
+    """
+    request = build_jsonrpc_request(method, params)
+    async for message in async_client.post_stream(request):
+        for item in parse_jsonrpc_stream_message(message):
+            yield item
+
+
+async def make_jsonrpc_batch_request_async(calls):
+    """
+    Send several JSON-RPC calls to the JEB plugin in one round trip.
+    `calls` is a list of (method, *params) tuples; the results are returned
+    in the same order, and the first failed call raises.
+    """
+    requests = [build_jsonrpc_request(method, params) for method, *params in calls]
+    return parse_jsonrpc_batch_response(requests, await async_client.post(requests))
 
 
 @mcp.tool()
-def check_connection() -> str:
+async def check_connection() -> str:
     """Check if the JEB plugin is running"""
     try:
-        metadata = make_jsonrpc_request("ping")
+        metadata = await make_jsonrpc_request_async("ping")
         return "Successfully connected to JEB Pro"
     except Exception:
         if sys.platform == "darwin":
@@ -68,10 +318,49 @@ def check_connection() -> str:
         return f"Failed to connect to JEB Pro! Did you run Edit -> Scripts -> MCP ({shortcut}) to start the server?"
 
 
+@mcp.tool()
+async def get_class_info(
+    filepath: Annotated[str, "full apk file path."],
+    class_signature: Annotated[
+        str, "fully-qualified signature of the class, e.g. Lcom/abc/Foo;"
+    ],
+) -> dict:
+    """
+    Get the superclass, interfaces, methods and fields of the given class in the APK file in a single call,
+    the passed in class_signature needs to be a fully-qualified signature
+    the passed in filepath needs to be a fully-qualified absolute path
+    """
+    superclass, interfaces, methods, fields = await make_jsonrpc_batch_request_async([
+        ("get_superclass", filepath, class_signature),
+        ("get_interfaces", filepath, class_signature),
+        ("get_class_methods", filepath, class_signature),
+        ("get_class_fields", filepath, class_signature),
+    ])
+    return {
+        "superclass": superclass,
+        "interfaces": interfaces,
+        "methods": methods,
+        "fields": fields,
+    }
+
+
 SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
 JEB_PLUGIN_PY = os.path.join(SCRIPT_DIR, "MCP.py")
 GENERATED_PY = os.path.join(SCRIPT_DIR, "server_generated.py")
 
+
+def read_mutating_methods():
+    """
+    Names of the methods MCP.py registers with @jsonrpc_mutating. They have
+    side effects, so a call to one is never resent after a dropped
+    connection: the plugin may have run it before the connection broke.
+    """
+    with open(JEB_PLUGIN_PY, "r", encoding="utf-8") as f:
+        return frozenset(re.findall(r"^@jsonrpc_mutating\s+def\s+(\w+)", f.read(), re.M))
+
+
+NOT_RETRIED = read_mutating_methods()
+
 def generate():
     with open(GENERATED_PY, "r") as f:
         code = f.read()
@@ -6,37 +6,52 @@ T = TypeVar("T")
 
 
 @mcp.tool()
-def ping() -> str:
+async def ping() -> str:
     """Do a simple ping to check server is alive and running"""
-    return make_jsonrpc_request("ping")
+    return await make_jsonrpc_request_async("ping")
 
 
 @mcp.tool()
-def search_manifest(
+async def search_manifest(
     filepath: Annotated[str, "full apk file path."],
     regex_pattern: Annotated[str, "regular expression to search for in the manifest"]
 ) -> list[dict]:
     """Returns matches with a fixed +/- 64 characters context window."""
-    return make_jsonrpc_request("search_manifest", filepath, regex_pattern)
+    return await make_jsonrpc_request_async("search_manifest", filepath, regex_pattern)
 
 
 @mcp.tool()
-def search_assets(
+async def search_assets(
     filepath: Annotated[str, "full apk file path"],
     regex_pattern: Annotated[str, "regular expression to search for in asset files"],
-    limit: Annotated[int, "maximum number of files with matches to return, set to 0 for no limit"]
-) -> list[dict]:
+    limit: Annotated[int, "maximum number of files with matches to return, set to 0 for no limit"],
+    cursor: Annotated[str, "next_cursor returned by the previous page, empty for the first page"] = "",
+    page_size: Annotated[int, "number of results per page, set to 0 to get all results at once"] = 0,
+    include: Annotated[str, "comma-separated glob patterns of the asset paths to search, e.g. '*.json,*.js', empty for all files"] = "",
+    exclude: Annotated[str, "comma-separated glob patterns of the asset paths to skip, e.g. '*.so,*.png'"] = "",
+) -> list[dict] | dict:
     """
     Search for a regex pattern in all files within the APK's 'assets' directory.
     This works for both text and binary files.
     For binary matches, the result is hex-encoded.
     Returns a list of dictionaries, each containing the asset's path and a list of matches found.
-    """
-    return make_jsonrpc_request("search_assets", filepath, regex_pattern, limit)
+    Very large assets are only searched up to a size budget. Their results are flagged "truncated"; use include/exclude to skip large binaries.
+    When page_size or cursor is set, returns {"items": [...], "next_cursor": ...}; pass next_cursor back to get the next page, it is null after the last page.
+    """
+    if cursor or page_size > 0:
+        return await make_jsonrpc_request_async(
+            "search_assets", filepath, regex_pattern, limit, cursor, page_size, include, exclude
+        )
+    return [
+        item
+        async for item in stream_jsonrpc_request_async(
+            "search_assets", filepath, regex_pattern, limit, include, exclude
+        )
+    ]
 
 
 @mcp.tool()
-def get_all_exported_activities(
+async def get_all_exported_activities(
     filepath: Annotated[str, "full apk file path."],
 ) -> list[str]:
     """
@@ -48,11 +63,11 @@ def get_all_exported_activities(
     
     The passed in filepath needs to be a fully-qualified absolute path.
     """
-    return make_jsonrpc_request("get_all_exported_activities", filepath)
+    return await make_jsonrpc_request_async("get_all_exported_activities", filepath)
 
 
 @mcp.tool()
-def get_all_exported_services(
+async def get_all_exported_services(
     filepath: Annotated[str, "full apk file path."]) -> list[str]:
     """
     Get all exported service names from the APK manifest.
@@ -63,11 +78,11 @@ def get_all_exported_services(
     
     The passed in filepath needs to be a fully-qualified absolute path.
     """
-    return make_jsonrpc_request("get_all_exported_services", filepath)
+    return await make_jsonrpc_request_async("get_all_exported_services", filepath)
 
 
 @mcp.tool()
-def get_all_exported_receivers(
+async def get_all_exported_receivers(
     filepath: Annotated[str, "full apk file path."]) -> list[str]:
     """
     Get all exported receiver names from the APK manifest.
@@ -78,11 +93,11 @@ def get_all_exported_receivers(
     
     The passed in filepath needs to be a fully-qualified absolute path.
     """
-    return make_jsonrpc_request("get_all_exported_receivers", filepath)
+    return await make_jsonrpc_request_async("get_all_exported_receivers", filepath)
 
 
 @mcp.tool()
-def get_all_exported_providers(
+async def get_all_exported_providers(
     filepath: Annotated[str, "full apk file path."]) -> list[str]:
     """
     Get all exported provider names from the APK manifest.
@@ -93,33 +108,56 @@ def get_all_exported_providers(
     
     The passed in filepath needs to be a fully-qualified absolute path.
     """
-    return make_jsonrpc_request("get_all_exported_providers", filepath)
+    return await make_jsonrpc_request_async("get_all_exported_providers", filepath)
 
 
 @mcp.tool()
-def get_permissions(
+async def get_permissions(
     filepath: Annotated[str, "full apk file path."]) -> list[str]:
     """
     Get all custom permissions defined (<permission> tags) by the app in the APK manifest.
     
     The passed in filepath needs to be a fully-qualified absolute path.
     """
-    return make_jsonrpc_request("get_permissions", filepath)
+    return await make_jsonrpc_request_async("get_permissions", filepath)
 
 
 @mcp.tool()
-def get_use_permissions(
+async def get_use_permissions(
     filepath: Annotated[str, "full apk file path."]) -> list[str]:
     """
     Get all permissions requested (<uses-permission> tags) by the app in the APK manifest.
     
     The passed in filepath needs to be a fully-qualified absolute path.
     """
-    return make_jsonrpc_request("get_use_permissions", filepath)
+    return await make_jsonrpc_request_async("get_use_permissions", filepath)
 
 
 @mcp.tool()
-def get_method_decompiled_code(
+async def query_components(
+    filepath: Annotated[str, "full apk file path."],
+    component_type: Annotated[str | None, "activity, activity-alias, service, receiver or provider"] = None,
+    action: Annotated[str | None, "intent action, e.g. android.intent.action.VIEW"] = None,
+    category: Annotated[str | None, "intent category, e.g. android.intent.category.BROWSABLE"] = None,
+    scheme: Annotated[str | None, "intent data scheme, e.g. https"] = None,
+    host: Annotated[str | None, "intent data host"] = None,
+    authority: Annotated[str | None, "content provider authority"] = None,
+    exported: Annotated[bool | None, "true for exported components only, false for non-exported only"] = None,
+    protected: Annotated[bool | None, "true for components protected by a permission only (for providers a read or write permission counts), false for unprotected only"] = None,
+) -> list[dict]:
+    """
+    Find the components declared in the APK manifest that match all the given filters, e.g. the exported unprotected components handling a URL scheme.
+    action, category, scheme and host must be declared by the same intent filter. Unset filters match everything.
+
+    Each result has the component type, class name, exported state, intent filters, permission, process and, for providers, authorities.
+    """
+    return await make_jsonrpc_request_async(
+        "query_components", filepath, component_type, action, category, scheme, host, authority, exported, protected
+    )
+
+
+@mcp.tool()
+async def get_method_decompiled_code(
     filepath: Annotated[str, "full apk file path."],
     method_signature: Annotated[
         str,
@@ -138,13 +176,56 @@ def get_method_decompiled_code(
     @param method_signature: the fully-qualified method signature to decompile, e.g. Lcom/abc/Foo;->bar(I[JLjava/Lang/String;)V
     the passed in filepath needs to be a fully-qualified absolute path
     """
-    return make_jsonrpc_request(
+    return await make_jsonrpc_request_async(
         "get_method_decompiled_code", filepath, method_signature
     )
 
 
 @mcp.tool()
-def get_method_smali_code(
+async def get_class_decompiled_code(
+    filepath: Annotated[str, "full apk file path."],
+    class_signature: Annotated[
+        str,
+        "the class_signature needs to be a fully-qualified signature e.g. Lcom/abc/Foo;",
+    ],
+) -> dict:
+    """Get the decompiled code of a whole class in the APK file in one call, the passed in class_signature needs to be a fully-qualified signature
+    Returns {"code": text, "methods": [{"signature", "start_line", "end_line"}]}, mapping 1-based lines of the code to
+    the methods of the class (null lines for methods the decompiler inlined or omitted).
+
+    @param filepath: the path to the APK file
+    @param class_signature: the fully-qualified class signature to decompile, e.g. Lcom/abc/Foo;
+    the passed in filepath needs to be a fully-qualified absolute path
+    """
+    return await make_jsonrpc_request_async(
+        "get_class_decompiled_code", filepath, class_signature
+    )
+
+
+@mcp.tool()
+async def get_methods_decompiled_code(
+    filepath: Annotated[str, "full apk file path."],
+    method_signatures: Annotated[
+        list[str],
+        "fully-qualified method signatures e.g. [\"Lcom/abc/Foo;->bar(I[JLjava/Lang/String;)V\"]",
+    ],
+) -> dict:
+    """Decompile several methods of the APK file in one call, prefer this over repeated get_method_decompiled_code calls
+    Returns {"code": text, "methods": [{"signature", "start_line", "end_line"}], "errors": [{"signature", "error"}]}:
+    the methods are concatenated in the requested order separated by a blank line, "methods" gives the 1-based lines
+    of each one and methods that cannot be found or decompiled are listed in "errors".
+
+    @param filepath: the path to the APK file
+    @param method_signatures: the fully-qualified method signatures to decompile
+    the passed in filepath needs to be a fully-qualified absolute path
+    """
+    return await make_jsonrpc_request_async(
+        "get_methods_decompiled_code", filepath, method_signatures
+    )
+
+
+@mcp.tool()
+async def get_method_smali_code(
     filepath: Annotated[str, "full apk file path."], method_signature: Annotated[
         str,
         "the method_signature needs to be a fully-qualified signature e.g. Lcom/abc/Foo;->bar(I[JLjava/Lang/String;)V",
@@ -162,30 +243,125 @@ def get_method_smali_code(
     @param method_signature: the fully-qualified method signature to decompile, e.g. Lcom/abc/Foo;->bar(I[JLjava/Lang/String;)V
     the passed in filepath needs to be a fully-qualified absolute path
     """
-    return make_jsonrpc_request(
+    return await make_jsonrpc_request_async(
         "get_method_smali_code", filepath, method_signature
     )
 
 
 @mcp.tool()
-def get_method_callers(
+async def get_class_smali_code(
+    filepath: Annotated[str, "full apk file path."],
+    class_signature: Annotated[
+        str,
+        "the class_signature needs to be a fully-qualified signature e.g. Lcom/abc/Foo;",
+    ],
+) -> str:
+    """Get the smali code of a whole class in the APK file, the passed in class_signature needs to be a fully-qualified signature
+    Includes the fields and, for every method, its registers, labels, try/catch ranges and .line debug info.
+    Cheaper than decompilation, and works on methods the decompiler fails on.
+
+    @param filepath: the path to the APK file
+    @param class_signature: the fully-qualified class signature, e.g. Lcom/abc/Foo;
+    the passed in filepath needs to be a fully-qualified absolute path
+    """
+    return await make_jsonrpc_request_async(
+        "get_class_smali_code", filepath, class_signature
+    )
+
+
+@mcp.tool()
+async def get_package_smali_code(
+    filepath: Annotated[str, "full apk file path."],
+    package: Annotated[str, "fully-qualified package e.g. Lcom/abc/, its subpackages are included"],
+    limit: Annotated[int, "maximum number of classes to return, set to 0 for no limit"] = 0,
+    cursor: Annotated[str, "next_cursor returned by the previous page, empty for the first page"] = "",
+    page_size: Annotated[int, "number of classes per page, set to 0 to get all results at once"] = 0,
+) -> list[dict] | dict:
+    """
+    Get the smali code of every class of a package of the APK, in the same format as get_class_smali_code.
+    Returns a list of dictionaries, each containing the 'class' signature and its 'smali' code.
+    When page_size or cursor is set, returns {"items": [...], "next_cursor": ...}; pass next_cursor back to get the next page, it is null after the last page.
+    """
+    if cursor or page_size > 0:
+        return await make_jsonrpc_request_async(
+            "get_package_smali_code", filepath, package, limit, cursor, page_size
+        )
+    return [
+        item
+        async for item in stream_jsonrpc_request_async(
+            "get_package_smali_code", filepath, package, limit
+        )
+    ]
+
+
+@mcp.tool()
+async def get_method_callers(
     filepath: Annotated[str, "full apk file path."],
     method_signature: Annotated[
         str,
         "the method_signature needs to be a fully-qualified signature e.g. Lcom/abc/Foo;->bar(I[JLjava/Lang/String;)V",
     ],
-) -> list[dict]:
+    cursor: Annotated[str, "next_cursor returned by the previous page, empty for the first page"] = "",
+    page_size: Annotated[int, "number of results per page, set to 0 to get all results at once"] = 0,
+) -> list[dict] | dict:
     """
     Get the callers of the given method in the APK file, the passed in method_signature needs to be a fully-qualified signature
     the passed in filepath needs to be a fully-qualified absolute path
+    When page_size or cursor is set, returns {"items": [...], "next_cursor": ...}; pass next_cursor back to get the next page, it is null after the last page.
+    """
+    return await make_jsonrpc_request_async(
+        "get_method_callers", filepath, method_signature, cursor, page_size
+    )
+
+
+@mcp.tool()
+async def get_transitive_callers(
+    filepath: Annotated[str, "full apk file path."],
+    method_signature: Annotated[
+        str,
+        "the method_signature needs to be a fully-qualified signature e.g. Lcom/abc/Foo;->bar(I[JLjava/Lang/String;)V",
+    ],
+    depth: Annotated[int, "maximum number of calls away from the method, 1 for direct callers only"] = 1,
+    fan_out: Annotated[int, "maximum number of callers followed per method, set to 0 for no limit"] = 0,
+    limit: Annotated[int, "maximum number of methods to return, set to 0 for no limit"] = 0,
+) -> dict:
+    """
+    Get the methods calling the given method, directly or transitively up to depth calls away, answered from a call graph built once per APK.
+    Prefer this over chained get_method_callers calls when tracing reachability.
+    Returns {"method", "results": [{"signature", "depth", "via", "internal"}], "truncated"} in breadth-first order.
+    via is the method the result calls on its way to the given method. internal is false for framework and library methods. truncated is true when fan_out or limit cut the results.
+    the passed in filepath needs to be a fully-qualified absolute path
     """
-    return make_jsonrpc_request(
-        "get_method_callers", filepath, method_signature
+    return await make_jsonrpc_request_async(
+        "get_transitive_callers", filepath, method_signature, depth, fan_out, limit
     )
 
 
 @mcp.tool()
-def get_field_callers(
+async def get_transitive_callees(
+    filepath: Annotated[str, "full apk file path."],
+    method_signature: Annotated[
+        str,
+        "the method_signature needs to be a fully-qualified signature e.g. Lcom/abc/Foo;->bar(I[JLjava/Lang/String;)V",
+    ],
+    depth: Annotated[int, "maximum number of calls away from the method, 1 for direct callees only"] = 1,
+    fan_out: Annotated[int, "maximum number of callees followed per method, set to 0 for no limit"] = 0,
+    limit: Annotated[int, "maximum number of methods to return, set to 0 for no limit"] = 0,
+) -> dict:
+    """
+    Get the methods called by the given method, directly or transitively up to depth calls away, answered from a call graph built once per APK.
+    Prefer this over chained get_method_decompiled_code calls when tracing reachability.
+    Returns {"method", "results": [{"signature", "depth", "via", "internal"}], "truncated"} in breadth-first order.
+    via is the method that calls the result. internal is false for framework and library methods. truncated is true when fan_out or limit cut the results.
+    the passed in filepath needs to be a fully-qualified absolute path
+    """
+    return await make_jsonrpc_request_async(
+        "get_transitive_callees", filepath, method_signature, depth, fan_out, limit
+    )
+
+
+@mcp.tool()
+async def get_field_callers(
     filepath: Annotated[str, "full apk file path."],
     field_signature: Annotated[
         str,
@@ -195,13 +371,13 @@ def get_field_callers(
     Get the callers of the given field in the APK file, the passed in field_signature needs to be a fully-qualified signature
     the passed in filepath needs to be a fully-qualified absolute path
     """
-    return make_jsonrpc_request(
+    return await make_jsonrpc_request_async(
         "get_field_callers", filepath, field_signature
     )
 
 
 @mcp.tool()
-def get_method_overrides(
+async def get_method_overrides(
     filepath: Annotated[str, "full apk file path."],
     method_signature: Annotated[
         str,
@@ -212,13 +388,13 @@ def get_method_overrides(
     Get the overrides of the given method in the APK file, the passed in method_signature needs to be a fully-qualified signature
     the passed in filepath needs to be a fully-qualified absolute path
     """
-    return make_jsonrpc_request(
+    return await make_jsonrpc_request_async(
         "get_method_overrides", filepath, method_signature
     )
 
 
 @mcp.tool()
-def get_superclass(
+async def get_superclass(
     filepath: Annotated[str, "full apk file path."],
     class_signature: Annotated[
         str, "fully-qualified signature of the class, e.g. Lcom/abc/Foo;"
@@ -228,11 +404,11 @@ def get_superclass(
     Get the superclass of the given class in the APK file, the passed in class_signature needs to be a fully-qualified signature
     the passed in filepath needs to be a fully-qualified absolute path
     """
-    return make_jsonrpc_request("get_superclass", filepath, class_signature)
+    return await make_jsonrpc_request_async("get_superclass", filepath, class_signature)
 
 
 @mcp.tool()
-def get_interfaces(
+async def get_interfaces(
     filepath: Annotated[str, "full apk file path."],
     class_signature: Annotated[
         str, "fully-qualified signature of the class, e.g. Lcom/abc/Foo;"
@@ -242,39 +418,49 @@ def get_interfaces(
     Get the interfaces of the given class in the APK file, the passed in class_signature needs to be a fully-qualified signature
     the passed in filepath needs to be a fully-qualified absolute path
     """
-    return make_jsonrpc_request("get_interfaces", filepath, class_signature)
+    return await make_jsonrpc_request_async("get_interfaces", filepath, class_signature)
 
 
 @mcp.tool()
-def get_class_methods(
+async def get_class_methods(
     filepath: Annotated[str, "full apk file path."],
     class_signature: Annotated[
         str, "fully-qualified signature of the class, e.g. Lcom/abc/Foo;"
     ],
-) -> list[str]:
+    cursor: Annotated[str, "next_cursor returned by the previous page, empty for the first page"] = "",
+    page_size: Annotated[int, "number of results per page, set to 0 to get all results at once"] = 0,
+) -> list[str] | dict:
     """
     Get the methods of the given class in the APK file, the passed in class_signature needs to be a fully-qualified signature
     the passed in filepath needs to be a fully-qualified absolute path
+    When page_size or cursor is set, returns {"items": [...], "next_cursor": ...}; pass next_cursor back to get the next page, it is null after the last page.
     """
-    return make_jsonrpc_request("get_class_methods", filepath, class_signature)
+    return await make_jsonrpc_request_async(
+        "get_class_methods", filepath, class_signature, cursor, page_size
+    )
 
 
 @mcp.tool()
-def get_class_fields(
+async def get_class_fields(
     filepath: Annotated[str, "full apk file path."],
     class_signature: Annotated[
         str, "fully-qualified signature of the class, e.g. Lcom/abc/Foo;"
     ],
-) -> list[str]:
+    cursor: Annotated[str, "next_cursor returned by the previous page, empty for the first page"] = "",
+    page_size: Annotated[int, "number of results per page, set to 0 to get all results at once"] = 0,
+) -> list[str] | dict:
     """
     Get the fields of the given class in the APK file, the passed in class_signature needs to be a fully-qualified signature
     the passed in filepath needs to be a fully-qualified absolute path
+    When page_size or cursor is set, returns {"items": [...], "next_cursor": ...}; pass next_cursor back to get the next page, it is null after the last page.
     """
-    return make_jsonrpc_request("get_class_fields", filepath, class_signature)
+    return await make_jsonrpc_request_async(
+        "get_class_fields", filepath, class_signature, cursor, page_size
+    )
 
 
 @mcp.tool()
-def rename_class_name(
+async def rename_class_name(
     filepath: Annotated[str, "full apk file path"],
     class_signature: Annotated[
         str, "fully-qualified signature of the class, e.g. Lcom/abc/Foo;"
@@ -294,13 +480,13 @@ def rename_class_name(
     Returns:
         None
     """
-    return make_jsonrpc_request(
+    return await make_jsonrpc_request_async(
         "rename_class_name", filepath, class_signature, new_class_name
     )
 
 
 @mcp.tool()
-def rename_method_name(
+async def rename_method_name(
     filepath: Annotated[str, "full apk file path"],
     class_signature: Annotated[
         str, "fully-qualified signature of the class, e.g. Lcom/abc/Foo;"
@@ -325,7 +511,7 @@ def rename_method_name(
     Returns:
         None
     """
-    return make_jsonrpc_request(
+    return await make_jsonrpc_request_async(
         "rename_method_name",
         filepath,
         class_signature,
@@ -335,7 +521,7 @@ def rename_method_name(
 
 
 @mcp.tool()
-def rename_class_field(
+async def rename_class_field(
     filepath: Annotated[str, "full apk file path"],
     class_signature: Annotated[
         str, "fully-qualified signature of the class, e.g. Lcom/abc/Foo;"
@@ -359,7 +545,7 @@ def rename_class_field(
     Returns:
         None
     """
-    return make_jsonrpc_request(
+    return await make_jsonrpc_request_async(
         "rename_class_field",
         filepath,
         class_signature,
@@ -368,7 +554,7 @@ def rename_class_field(
     )
 
 @mcp.tool()
-def check_java_identifier(
+async def check_java_identifier(
     filepath: Annotated[str, "full apk file path"],
     identifier: Annotated[
         str,
@@ -380,22 +566,34 @@ def check_java_identifier(
     the passed in filepath needs to be a fully-qualified absolute path;
     the return value will be a list to tell you the possible type of the passed identifier.
     """
-    return make_jsonrpc_request("check_java_identifier", filepath, identifier)
+    return await make_jsonrpc_request_async("check_java_identifier", filepath, identifier)
 
 @mcp.tool()
-def get_strings(
+async def get_strings(
     filepath: Annotated[str, "full apk file path"],
     regex_pattern: Annotated[str, "regular expression to filter the strings, e.g., '^https?://'"],
-    limit: Annotated[int, "maximum number of strings to return, set to 0 for no limit"]
-) -> list[dict]:
+    limit: Annotated[int, "maximum number of strings to return, set to 0 for no limit"],
+    cursor: Annotated[str, "next_cursor returned by the previous page, empty for the first page"] = "",
+    page_size: Annotated[int, "number of results per page, set to 0 to get all results at once"] = 0,
+) -> list[dict] | dict:
     """
     Get hardcoded strings from the APK, filtered by a regular expression.
     Returns a list of dictionaries, each containing the string 'value' and its 'xrefs' (cross-references where the string is defined/used).
-    """
-    return make_jsonrpc_request("get_strings", filepath, regex_pattern, limit)
+    When page_size or cursor is set, returns {"items": [...], "next_cursor": ...}; pass next_cursor back to get the next page, it is null after the last page.
+    """
+    if cursor or page_size > 0:
+        return await make_jsonrpc_request_async(
+            "get_strings", filepath, regex_pattern, limit, cursor, page_size
+        )
+    return [
+        item
+        async for item in stream_jsonrpc_request_async(
+            "get_strings", filepath, regex_pattern, limit
+        )
+    ]
 
 @mcp.tool()
-def execute_python_code(
+async def execute_python_code(
     code: Annotated[str, "The Python code (Python 2.7 compatible) to execute in the JEB Jython environment."]
 ) -> str:
     """
@@ -403,4 +601,70 @@ def execute_python_code(
     This allows interacting directly with the JEB API and the global `CTX` context.
     Outputs to stdout/stderr are captured and returned.
     """
-    return make_jsonrpc_request("execute_python_code", code)
\ No newline at end of file
+    return await make_jsonrpc_request_async("execute_python_code", code)
+
+@mcp.tool()
+async def get_cache_stats() -> dict:
+    """
+    Report the state of the JEB plugin caches: which APKs are loaded, and the hit, miss and eviction counts.
+    It also reports the hit rate of the decompiled code cache.
+    """
+    return await make_jsonrpc_request_async("get_cache_stats")
+
+
+@mcp.tool()
+async def preload_apk(
+    filepath: Annotated[str, "full apk file path"],
+) -> dict:
+    """
+    Start loading the APK in JEB in the background and return immediately.
+    Analyzing a large APK can take minutes. Call this first, then poll get_load_status until its state is "ready" before querying the APK.
+    Once loaded, the manifest, component lists and string pool are warmed up so the first queries are fast.
+    """
+    return await make_jsonrpc_request_async("preload_apk", filepath)
+
+
+@mcp.tool()
+async def get_load_status(
+    filepath: Annotated[str, "full apk file path"],
+) -> dict:
+    """
+    Report the progress of the last preload_apk of the APK.
+    state is one of "queued", "loading", "warming", "ready" or "failed" (see error). It is null if the APK was never preloaded.
+    The report also includes the current stage, the elapsed seconds, and whether the APK is loaded.
+    """
+    return await make_jsonrpc_request_async("get_load_status", filepath)
+
+
+@mcp.tool()
+async def start_decompile_job(
+    filepath: Annotated[str, "full apk file path"],
+    workers: Annotated[int, "threads to use, 0 for the plugin default"] = 0,
+    cpu_budget: Annotated[float, "fraction of time in (0, 1] each thread may spend decompiling, 0 for the plugin default"] = 0,
+) -> dict:
+    """
+    Start decompiling every class of the APK in the background and return immediately.
+    Use it when most of the app will be explored: decompiled code is cached, so later get_method_decompiled_code
+    and get_class_decompiled_code calls return immediately. Poll get_decompile_job_status for its progress.
+    """
+    return await make_jsonrpc_request_async("start_decompile_job", filepath, workers, cpu_budget)
+
+
+@mcp.tool()
+async def get_decompile_job_status(
+    filepath: Annotated[str, "full apk file path"],
+) -> dict:
+    """
+    Report the progress of the last decompile job of the APK.
+    state is one of "running", "done", "cancelled" or "failed" (see error). It is null if no job was started.
+    The report also includes classes_done out of classes_total, the methods decompiled, already cached or failed, and the elapsed seconds.
+    """
+    return await make_jsonrpc_request_async("get_decompile_job_status", filepath)
+
+
+@mcp.tool()
+async def cancel_decompile_job(
+    filepath: Annotated[str, "full apk file path"],
+) -> dict:
+    """Cancel the running decompile job of the APK. The code decompiled so far stays cached."""
+    return await make_jsonrpc_request_async("cancel_decompile_job", filepath)
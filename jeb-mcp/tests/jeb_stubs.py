@@ -0,0 +1,93 @@
+"""
+Loads MCP.py outside of JEB for the tests. The JEB and Java modules it
+imports are replaced by minimal stand-ins when they are not available, so
+the parts of the plugin that do not need JEB (locks, pools, cursors,
+indexes) run on plain Python 2.7.
+"""
+import array
+import imp
+import os
+import sys
+import types
+
+PLUGIN_PY = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src", "jeb_mcp", "MCP.py")
+
+
+class Runtime(object):
+    @staticmethod
+    def getRuntime():
+        return Runtime()
+
+    def availableProcessors(self):
+        return 4
+
+    def maxMemory(self):
+        return 1 << 30
+
+    def totalMemory(self):
+        return 1 << 28
+
+    def freeMemory(self):
+        return 1 << 27
+
+
+class Pattern(object):
+    @staticmethod
+    def compile(regex):
+        return Pattern()
+
+
+def zeros(size, typecode):
+    return array.array(typecode, [0]) * size
+
+
+# Module -> names it must provide, the ones not given here are empty classes
+MODULES = {
+    "jarray": {"zeros": zeros},
+    "com.pnfsoftware.jeb.client.api": ["IScript"],
+    "com.pnfsoftware.jeb.core": ["Artifact"],
+    "com.pnfsoftware.jeb.core.actions": ["ActionContext", "ActionOverridesData", "Actions", "ActionXrefsData"],
+    "com.pnfsoftware.jeb.core.input": ["FileInput"],
+    "com.pnfsoftware.jeb.core.output.text": ["TextDocumentUtil"],
+    "com.pnfsoftware.jeb.core.units.code.android": ["IApkUnit"],
+    "com.pnfsoftware.jeb.core.units.code.android.dex": {
+        "IDalvikInstruction": type("IDalvikInstruction", (object,), {"INDEX_TO_METHOD": 3, "TYPE_IDX": 5}),
+    },
+    "com.pnfsoftware.jeb.core.util": ["DecompilerHelper"],
+    "java.io": ["File", "FileInputStream", "FileOutputStream"],
+    "java.lang": {"Runtime": Runtime, "System": type("System", (object,), {"gc": staticmethod(lambda: None)})},
+    "java.util.regex": {"Pattern": Pattern},
+}
+
+
+def _install(name, attributes):
+    try:
+        __import__(name)
+        return  # the real module
+    except ImportError:
+        pass
+    parent = None
+    parts = name.split(".")
+    for i in range(len(parts)):
+        package = ".".join(parts[:i + 1])
+        module = sys.modules.get(package)
+        if module is None:
+            module = types.ModuleType(package)
+            module.__path__ = []
+            sys.modules[package] = module
+            if parent is not None:
+                setattr(parent, parts[i], module)
+        parent = module
+    if not isinstance(attributes, dict):
+        attributes = dict((attribute, type(attribute, (object,), {})) for attribute in attributes)
+    for attribute, value in attributes.items():
+        setattr(parent, attribute, value)
+
+
+def load_plugin():
+    """The MCP.py module, loaded once"""
+    if "MCP" not in sys.modules:
+        for name, attributes in sorted(MODULES.items()):
+            _install(name, attributes)
+        imp.load_source("MCP", PLUGIN_PY)
+    return sys.modules["MCP"]
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import random
+import re
+import unittest
+from array import array
+
+from jeb_stubs import load_plugin
+
+MCP = load_plugin()
+
+WORDS = [u"password", u"Passwd", u"api_key", u"apikey", u"secret", u"SECRET_TOKEN", u"token", u"http://", u"https://",
+         u"example.com", u"color", u"colour", u"grey", u"gray", u"abc", u"abd", u"kiss", u"KISS", u"skip", u"Sky",
+         u"İstanbul", u"dısk", u"Kelvin", u"ſecret", u"café", u"日本", u"0x1f", u"42"]
+SEPARATORS = [u" ", u"\n", u"=", u":", u"\"", u"_", u""]
+
+PATTERNS = [
+    # literals
+    u"password", u"api_key", u"secret", u"https?://example\\.com", u"abc",
+    # alternation
+    u"secret|token", u"colou?r|gr[ae]y", u"api_?key|password", u"(?:abc|abd)", u"x|password",
+    # optional groups and repeats
+    u"pass(?:wor)?d", u"api(_key)?", u"(?:https?://)?example", u"(secret_)*token", u"(?:ab)+c", u"a{0}password",
+    u"(?:sec){1,2}ret", u"pass.*word", u"pass\\w+",
+    # character classes
+    u"[Pp]asswo?rd", u"[a-z]+_key", u"0x[0-9a-f]+", u"\\d{2}", u"[^a-z]ecret", u"se[c]ret",
+    # case-insensitive
+    u"(?i)password", u"(?i)SECRET_token", u"(?i)api_KEY|passwd", u"(?i)kiss", u"(?i)sky",
+    # case-insensitive with unicode: i, k and s also match non-ASCII letters
+    u"(?iu)istanbul", u"(?iu)disk", u"(?iu)kelvin", u"(?iu)secret", u"(?iu)skip", u"(?iu)kiss",
+    u"(?iu)SECRET_TOKEN", u"(?u)secret", u"(?i)(?u)kelvin",
+    # non-ASCII literals
+    u"café", u"日本",
+]
+
+
+def generate_text(rng):
+    return u"".join(rng.choice(WORDS) + rng.choice(SEPARATORS) for _ in range(rng.randint(0, 12)))
+
+
+def generate_pattern(rng):
+    """Random regex made of words, optional groups, alternations and classes"""
+    parts = []
+    for _ in range(rng.randint(1, 3)):
+        word = re.escape(rng.choice(WORDS))
+        kind = rng.randint(0, 4)
+        if kind == 1:
+            word = u"(?:%s)?" % word
+        elif kind == 2:
+            word = u"(?:%s|%s)" % (word, re.escape(rng.choice(WORDS)))
+        elif kind == 3:
+            word = u"[%s]%s" % (re.escape(rng.choice(u"abcikps")), word)
+        parts.append(word + rng.choice([u"", u".?", u"\\W*", u"[_ =:]"]))
+    return rng.choice([u"", u"(?i)", u"(?iu)", u"(?u)"]) + u"".join(parts)
+
+
+class TrigramIndexTest(unittest.TestCase):
+    """The trigram prefilter never drops a file the regex matches"""
+
+    def setUp(self):
+        self.store = MCP.AssetStore.__new__(MCP.AssetStore)
+        self.store.entries = []
+
+    def add(self, text):
+        """Index the text the way AssetStore._extract indexes an extracted file"""
+        data = text.encode("utf-8")
+        entry = MCP.AssetStore.Entry("assets/%d.txt" % len(self.store.entries), None)
+        bitmap = array('B', [0]) * (MCP.AssetStore.BITMAP_BITS // 8)
+        self.store._add_trigrams(bitmap, MCP.TRIGRAM.findall(data.lower()))
+        entry.bitmap = MCP.AssetStore._fold(bitmap, len(data))
+        entry.text = data.decode("utf-8", "replace")
+        self.store.entries.append(entry)
+
+    def check(self, pattern):
+        compiled = re.compile(pattern)
+        candidates = set(entry.path for entry in self.store.candidates(MCP.regex_trigrams(pattern), lambda path: True))
+        for entry in self.store.entries:
+            if compiled.search(entry.text):
+                self.assertIn(entry.path, candidates, "%r skipped %r" % (pattern, entry.text))
+        return len(self.store.entries) - len(candidates)
+
+    def test_generated_assets(self):
+        rng = random.Random(1234)
+        for _ in range(300):
+            self.add(generate_text(rng))
+        skipped = 0
+        for pattern in PATTERNS:
+            skipped += self.check(pattern)
+        for _ in range(300):
+            skipped += self.check(generate_pattern(rng))
+        # The prefilter does skip files, it is not just letting everything through
+        self.assertGreater(skipped, 0)
+
+    def test_case_insensitive_unicode_letters(self):
+        for text in [u"İstanbul", u"dısk", u"Kelvin", u"ſecret", u"KIſſ"]:
+            self.add(text)
+        for pattern in [u"(?iu)istanbul", u"(?iu)disk", u"(?iu)kelvin", u"(?iu)secret", u"(?iu)kiss"]:
+            self.check(pattern)
+
+
+class RegexTrigramsTest(unittest.TestCase):
+    def test_literal_runs(self):
+        self.assertEqual(set(["pas", "ass", "ssw", "swo", "wor", "ord"]), MCP.regex_trigrams("password"))
+        self.assertEqual(set(["abc"]), MCP.regex_trigrams("(?i)ABC"))
+
+    def test_alternation_and_optional_parts_are_not_required(self):
+        self.assertEqual(set(), MCP.regex_trigrams("secret|token"))
+        self.assertEqual(set(["api"]), MCP.regex_trigrams("api(?:_key)?"))
+        self.assertEqual(set(["tok", "oke", "ken"]), MCP.regex_trigrams("(?:secret_)*token"))
+        self.assertEqual(set(["abc"]), MCP.regex_trigrams("(?:abc)+"))
+
+    def test_classes_end_runs(self):
+        self.assertEqual(set(["ass", "ssw", "swo", "wor", "ord"]), MCP.regex_trigrams("[Pp]assword"))
+
+    def test_unicode_ignorecase_letters_end_runs(self):
+        self.assertEqual(set(["wor", "ord"]), MCP.regex_trigrams("(?iu)password"))
+        self.assertEqual(set(["ass", "ssw", "swo", "wor", "ord"]), MCP.regex_trigrams("(?u)assword"))
+
+    def test_invalid_regex(self):
+        self.assertEqual(set(), MCP.regex_trigrams("pass(word"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+import unittest
+
+from jeb_stubs import load_plugin
+
+MCP = load_plugin()
+
+# 0 -> 1 -> 3 -> 0 and 0 -> 2 -> 3 are cycles, 5 calls itself and 6 is isolated
+EDGES = [(0, 1), (0, 2), (1, 3), (2, 3), (2, 1), (3, 0), (3, 4), (4, 5), (5, 5)]
+
+
+def graph():
+    return MCP.CallGraph(7, [source for source, _ in EDGES], [target for _, target in EDGES])
+
+
+class CallGraphTest(unittest.TestCase):
+    def test_adjacency(self):
+        g = graph()
+        self.assertEqual(len(EDGES), g.stats()["edges"])
+        for node in range(7):
+            callees = list(g.callees[g.callee_offsets[node]:g.callee_offsets[node + 1]])
+            callers = list(g.callers[g.caller_offsets[node]:g.caller_offsets[node + 1]])
+            self.assertEqual(sorted(t for s, t in EDGES if s == node), sorted(callees))
+            self.assertEqual(sorted(s for s, t in EDGES if t == node), sorted(callers))
+
+    def test_callees_by_depth(self):
+        g = graph()
+        self.assertEqual(([(1, 1, 0), (2, 1, 0)], False), g.walk(0, False, 1))
+        self.assertEqual(([(1, 1, 0), (2, 1, 0), (3, 2, 1)], False), g.walk(0, False, 2))
+        self.assertEqual(([(1, 1, 0), (2, 1, 0), (3, 2, 1), (4, 3, 3)], False), g.walk(0, False, 3))
+
+    def test_cycles_end_the_walk(self):
+        g = graph()
+        # The start method and the methods already reached are not reported again
+        self.assertEqual(([(1, 1, 0), (2, 1, 0), (3, 2, 1), (4, 3, 3), (5, 4, 4)], False), g.walk(0, False, 100))
+        self.assertEqual(([], False), g.walk(5, False, 100))
+        self.assertEqual(([], False), g.walk(6, False, 100))
+
+    def test_callers(self):
+        g = graph()
+        self.assertEqual(([(1, 1, 3), (2, 1, 3)], False), g.walk(3, True, 1))
+        self.assertEqual(([(1, 1, 3), (2, 1, 3), (0, 2, 1)], False), g.walk(3, True, 100))
+        self.assertEqual(([(4, 1, 5), (3, 2, 4), (1, 3, 3), (2, 3, 3), (0, 4, 1)], False), g.walk(5, True, 100))
+
+    def test_limit(self):
+        g = graph()
+        self.assertEqual(([(1, 1, 0), (2, 1, 0)], True), g.walk(0, False, 100, limit=2))
+        # Reaching the limit with nothing left to report is not a truncation
+        self.assertEqual(([(5, 1, 4)], False), g.walk(4, False, 100, limit=1))
+
+    def test_fan_out(self):
+        g = graph()
+        # Only the first callee of 3 is followed, 0, which was already reached
+        self.assertEqual(([(1, 1, 0), (3, 2, 1)], True), g.walk(0, False, 100, fan_out=1))
+        self.assertEqual(([(1, 1, 0), (2, 1, 0), (3, 2, 1), (4, 3, 3), (5, 4, 4)], False),
+                         g.walk(0, False, 100, fan_out=2))
+
+
+class Method(object):
+    def __init__(self, index, code=None, internal=True):
+        self.index = index
+        self.code = code
+        self.internal = internal
+
+    def getIndex(self):
+        return self.index
+
+    def getSignature(self, effective):
+        return "Lcom/example/A;->m%d()V" % self.index
+
+    def isInternal(self):
+        return self.internal
+
+    def getData(self):
+        return self
+
+    def getCodeItem(self):
+        return self if self.code is not None else None
+
+    def getInstructions(self):
+        return self.code
+
+
+class Parameter(object):
+    def __init__(self, kind, value):
+        self.kind = kind
+        self.value = value
+
+    def getType(self):
+        return self.kind
+
+    def getValue(self):
+        return self.value
+
+
+class Instruction(object):
+    def __init__(self, index_type, parameters):
+        self.index_type = index_type
+        self.parameters = parameters
+
+    def getParameterIndexType(self):
+        return self.index_type
+
+    def getParameters(self):
+        return self.parameters
+
+
+def invoke(callee):
+    parameters = [Parameter(0, 1), Parameter(MCP.IDalvikInstruction.TYPE_IDX, callee)]
+    return Instruction(MCP.IDalvikInstruction.INDEX_TO_METHOD, parameters)
+
+
+class CodeUnit(object):
+    def __init__(self, methods):
+        self.methods = methods
+
+    def getMethods(self):
+        return self.methods
+
+    def getMethod(self, key):
+        for method in self.methods:
+            if key in (method.index, method.getSignature(True)):
+                return method
+        return None
+
+    def getDex(self):
+        return self
+
+
+class BuildCallGraphTest(unittest.TestCase):
+    def test_invoke_edges(self):
+        unit = CodeUnit([
+            Method(0, [invoke(1), invoke(2), invoke(1), Instruction(0, [Parameter(MCP.IDalvikInstruction.TYPE_IDX, 2)])]),
+            Method(1, [invoke(0), invoke(9)]),  # 9 is no method of the unit
+            Method(2, None),  # abstract or native
+            Method(3, [invoke(0)], internal=False),
+        ])
+        g = MCP.build_call_graph(unit)
+        self.assertEqual({"methods": 4, "edges": 3}, g.stats())
+        self.assertEqual(([(1, 1, 0), (2, 1, 0)], False), g.walk(0, False, 100))
+        self.assertEqual(([(1, 1, 0)], False), g.walk(0, True, 100))
+
+
+class WalkCallGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = MCP.getOrLoadApk, MCP.get_call_graph
+        unit = CodeUnit([Method(i, internal=i != 5) for i in range(7)])
+        MCP.getOrLoadApk = lambda filepath: unit
+        MCP.get_call_graph = lambda filepath: graph()
+
+    def tearDown(self):
+        MCP.getOrLoadApk, MCP.get_call_graph = self.saved
+
+    def test_callees(self):
+        result = MCP.walk_call_graph("/a.apk", "Lcom/example/A;->m3()V", False, 2, 0, 0)
+        self.assertEqual("Lcom/example/A;->m3()V", result["method"])
+        self.assertEqual([
+            {"signature": "Lcom/example/A;->m0()V", "depth": 1, "via": "Lcom/example/A;->m3()V", "internal": True},
+            {"signature": "Lcom/example/A;->m4()V", "depth": 1, "via": "Lcom/example/A;->m3()V", "internal": True},
+            {"signature": "Lcom/example/A;->m1()V", "depth": 2, "via": "Lcom/example/A;->m0()V", "internal": True},
+            {"signature": "Lcom/example/A;->m2()V", "depth": 2, "via": "Lcom/example/A;->m0()V", "internal": True},
+            {"signature": "Lcom/example/A;->m5()V", "depth": 2, "via": "Lcom/example/A;->m4()V", "internal": False},
+        ], result["results"])
+        self.assertFalse(result["truncated"])
+
+    def test_callers_with_limit(self):
+        result = MCP.walk_call_graph("/a.apk", "Lcom/example/A;->m3()V", True, 5, 0, 2)
+        self.assertEqual(["Lcom/example/A;->m1()V", "Lcom/example/A;->m2()V"],
+                         [item["signature"] for item in result["results"]])
+        self.assertTrue(result["truncated"])
+
+    def test_default_depth_is_one(self):
+        result = MCP.walk_call_graph("/a.apk", "Lcom/example/A;->m0()V", False, None, None, None)
+        self.assertEqual([1, 1], [item["depth"] for item in result["results"]])
+
+    def test_invalid_params(self):
+        for depth, fan_out, limit in [(-1, 0, 0), (1, -1, 0), (1, 0, -1)]:
+            with self.assertRaises(MCP.JSONRPCError) as raised:
+                MCP.walk_call_graph("/a.apk", "Lcom/example/A;->m0()V", False, depth, fan_out, limit)
+            self.assertEqual(-32602, raised.exception.code)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+import threading
+import time
+import unittest
+
+from jeb_stubs import load_plugin
+
+MCP = load_plugin()
+
+WAIT = 5  # seconds, only reached when a test fails
+
+
+def start(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+class Counter(object):
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.value = 0
+
+    def increment(self):
+        with self._cond:
+            self.value += 1
+            self._cond.notify_all()
+
+    def wait_for(self, value):
+        deadline = time.time() + WAIT
+        with self._cond:
+            while self.value < value and time.time() < deadline:
+                self._cond.wait(deadline - time.time())
+            return self.value >= value
+
+
+class ReadWriteLockTest(unittest.TestCase):
+    def setUp(self):
+        self.lock = MCP.ReadWriteLock()
+
+    def test_reads_run_in_parallel(self):
+        inside = Counter()
+        leave = threading.Event()
+
+        def read():
+            self.lock.acquire_read()
+            try:
+                inside.increment()
+                leave.wait(WAIT)
+            finally:
+                self.lock.release_read()
+
+        threads = [start(read) for _ in range(3)]
+        # Every reader gets in while the others still hold the lock
+        self.assertTrue(inside.wait_for(3))
+        leave.set()
+        for thread in threads:
+            thread.join(WAIT)
+
+    def test_writer_excludes_readers(self):
+        self.lock.acquire_write()
+        read = threading.Event()
+
+        def reader():
+            self.lock.acquire_read()
+            read.set()
+            self.lock.release_read()
+
+        start(reader)
+        self.assertFalse(read.wait(0.2))
+        self.lock.release_write()
+        self.assertTrue(read.wait(WAIT))
+
+    def test_writer_waits_for_readers(self):
+        self.lock.acquire_read()
+        written = threading.Event()
+
+        def writer():
+            self.lock.acquire_write()
+            written.set()
+            self.lock.release_write()
+
+        start(writer)
+        self.assertFalse(written.wait(0.2))
+        self.lock.release_read()
+        self.assertTrue(written.wait(WAIT))
+
+    def test_non_blocking_write_fails_while_read_is_held(self):
+        self.lock.acquire_read()
+        self.assertFalse(self.lock.acquire_write(blocking=False))
+        self.lock.release_read()
+        self.assertTrue(self.lock.acquire_write(blocking=False))
+        self.assertFalse(self.lock.acquire_write(blocking=False))
+        self.lock.release_write()
+
+    def test_waiting_writer_blocks_new_readers(self):
+        self.lock.acquire_read()
+        events = []
+        written = threading.Event()
+        read = threading.Event()
+
+        def writer():
+            self.lock.acquire_write()
+            events.append("write")
+            self.lock.release_write()
+            written.set()
+
+        def reader():
+            self.lock.acquire_read()
+            events.append("read")
+            self.lock.release_read()
+            read.set()
+
+        start(writer)
+        while not self.lock._writers_waiting:
+            time.sleep(0.01)
+        start(reader)
+        self.assertFalse(read.wait(0.2))
+        self.lock.release_read()
+        self.assertTrue(written.wait(WAIT))
+        self.assertTrue(read.wait(WAIT))
+        self.assertEqual(["write", "read"], events)
+
+
+class ArtifactLocksTest(unittest.TestCase):
+    def test_one_lock_per_path(self):
+        locks = MCP.ArtifactLocks()
+        self.assertIs(locks.get("/a.apk"), locks.get("/a.apk"))
+        self.assertIsNot(locks.get("/a.apk"), locks.get("/b.apk"))
+
+    def test_paths_do_not_block_each_other(self):
+        locks = MCP.ArtifactLocks()
+        locks.get("/a.apk").acquire_write()
+        self.assertTrue(locks.get("/b.apk").acquire_write(blocking=False))
+
+
+class WorkerPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = MCP.WorkerPool("test", 2)
+
+    def tearDown(self):
+        self.pool.shutdown()
+        for thread in self.pool.threads:
+            thread.join(WAIT)
+
+    def test_result(self):
+        future = self.pool.submit(lambda a, b=0: a + b, 1, b=2)
+        self.assertEqual(3, future.result(WAIT))
+        self.assertTrue(future.done())
+
+    def test_exception_propagates(self):
+        def fail():
+            raise KeyError("missing")
+
+        future = self.pool.submit(fail)
+        with self.assertRaises(KeyError):
+            future.result(WAIT)
+
+    def test_workers_run_in_parallel(self):
+        arrived = Counter()
+        go = threading.Event()
+
+        def meet():
+            arrived.increment()
+            return go.wait(WAIT)
+
+        futures = [self.pool.submit(meet) for _ in range(2)]
+        # Both calls are running at once before either may return
+        self.assertTrue(arrived.wait_for(2))
+        go.set()
+        for future in futures:
+            self.assertTrue(future.result(WAIT))
+
+    def test_timeout(self):
+        release = threading.Event()
+        future = self.pool.submit(release.wait, WAIT)
+        with self.assertRaises(RuntimeError):
+            future.result(0.05)
+        release.set()
+        self.assertTrue(future.result(WAIT))
+
+    def test_cancelled_call_does_not_run(self):
+        release = threading.Event()
+        blockers = [self.pool.submit(release.wait, WAIT) for _ in range(2)]
+        ran = []
+        future = self.pool.submit(ran.append, 1)
+        future.cancel()
+        release.set()
+        for blocker in blockers:
+            blocker.result(WAIT)
+        self.assertIsNone(future.result(WAIT))
+        self.assertEqual([], ran)
+
+
+if __name__ == "__main__":
+    unittest.main()
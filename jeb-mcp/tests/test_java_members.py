@@ -0,0 +1,160 @@
+import unittest
+
+from jeb_stubs import load_plugin
+
+MCP = load_plugin()
+
+# Decompiled text of Lcom/example/Sample;, line numbers are 1-based
+SAMPLE = r'''package com.example;
+
+import java.util.List;
+
+public class Sample extends Base implements Runnable {
+    private static final String BRACES = "{ \"}\" // not a comment";
+    private static final char OPEN = '{';
+    private static final char QUOTE = '\'';
+    private final Runnable field = () -> {
+        System.out.println("}");
+    };
+    private final Object anonymous = new Object() {
+        @Override
+        public String toString() {
+            return "anonymous }";
+        }
+    };
+    private int count;
+
+    static {
+        System.loadLibrary("native");
+    }
+
+    /**
+     * Builds a sample. Braces in comments: { }
+     */
+    public Sample(int count) {
+        super();
+        this.count = count;
+    }
+
+    public Sample() {
+        this(0);
+    }
+
+    // run() starts a thread: {
+    @Override
+    public void run() {
+        new Thread(new Runnable() {
+            public void run() {
+                count++;
+            }
+        }).start();
+        list(new String[0]).forEach(item -> {
+            System.out.println(item + '}');
+        });
+    }
+
+    @SuppressWarnings({"unchecked", "rawtypes"})
+    private static List<String> list(String[] items) throws IllegalStateException {
+        /* } */ return java.util.Arrays.asList(items);
+    }
+
+    public native int nativeCount(long handle, java.util.Map<String, Integer> map);
+
+    static class Inner {
+        void inner() {
+        }
+
+        int count(String s) {
+            return s.length();
+        }
+    }
+
+    public int count(String value, int radix) {
+        return Integer.parseInt(value, "\\".length() + radix);
+    }
+}
+'''
+
+CALLBACK = r'''package com.example;
+
+public interface Callback {
+    void onResult(String result);
+
+    default void onError(Throwable error) {
+        onResult(null);
+    }
+
+    // Called from native code { not a block
+    abstract boolean isCancelled();
+}
+'''
+
+
+class JavaMembersTest(unittest.TestCase):
+    def members(self, text):
+        """(last word of the header, start line, end line) of the members, 1-based"""
+        return [(header.split()[-1] if header.split() else "", start + 1, end + 1)
+                for header, start, end in MCP.java_members(text)]
+
+    def test_braces_in_strings_chars_and_comments_are_ignored(self):
+        members = self.members(SAMPLE)
+        self.assertEqual(("comment\"", 6, 6), members[0])
+        self.assertEqual(("'{'", 7, 7), members[1])
+        self.assertEqual(("'\\''", 8, 8), members[2])
+        self.assertIn(("count", 18, 18), members)
+
+    def test_lambda_and_anonymous_class_fields_are_one_member(self):
+        members = self.members(SAMPLE)
+        self.assertIn(("->", 9, 11), members)
+        self.assertIn(("Object()", 12, 17), members)
+        # Nothing inside their bodies is reported
+        self.assertEqual([], [m for m in members if 9 < m[1] < 11 or 12 < m[1] < 17])
+
+    def test_nested_class_is_one_member(self):
+        members = self.members(SAMPLE)
+        self.assertIn(("Inner", 56, 63), members)
+        self.assertEqual([], [m for m in members if 56 < m[1] < 63])
+
+
+class MapMethodLinesTest(unittest.TestCase):
+    def lines(self, text, class_signature, names):
+        signatures = [class_signature + "->" + name for name in names]
+        return [(entry["start_line"], entry["end_line"])
+                for entry in MCP.map_method_lines(text, class_signature, signatures)]
+
+    def test_methods(self):
+        self.assertEqual([
+            (20, 22),  # static block
+            (24, 30),  # from the Javadoc
+            (32, 34),
+            (36, 47),  # from the line comment, over the anonymous class and the lambda
+            (49, 52),  # from the annotation, over the comment with a brace
+            (54, 54),  # native
+            (65, 67),  # not Inner.count(String)
+        ], self.lines(SAMPLE, "Lcom/example/Sample;", [
+            "<clinit>()V",
+            "<init>(I)V",
+            "<init>()V",
+            "run()V",
+            "list([Ljava/lang/String;)Ljava/util/List;",
+            "nativeCount(JLjava/util/Map;)I",
+            "count(Ljava/lang/String;I)I",
+        ]))
+
+    def test_members_of_nested_and_anonymous_classes_are_not_found(self):
+        self.assertEqual([(None, None), (None, None), (None, None)], self.lines(SAMPLE, "Lcom/example/Sample;", [
+            "inner()V",
+            "toString()Ljava/lang/String;",
+            "access$000(Lcom/example/Sample;)I",
+        ]))
+
+    def test_interface_methods(self):
+        self.assertEqual([(4, 4), (6, 8), (10, 11)], self.lines(CALLBACK, "Lcom/example/Callback;", [
+            "onResult(Ljava/lang/String;)V",
+            "onError(Ljava/lang/Throwable;)V",
+            "isCancelled()Z",
+        ]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+import base64
+import unittest
+
+from jeb_stubs import load_plugin
+
+MCP = load_plugin()
+
+
+class Source(object):
+    """Iterable over range(size) that counts the scans started and closed"""
+
+    def __init__(self, size):
+        self.size = size
+        self.started = 0
+        self.closed = 0
+
+    def __call__(self):
+        self.started += 1
+        return self
+
+    def __iter__(self):
+        return iter(range(self.size))
+
+    def close(self):
+        self.closed += 1
+
+
+class ScanCursorsTest(unittest.TestCase):
+    def setUp(self):
+        self.cursors = MCP.ScanCursors()
+        self.key = ("get_class_methods", "/a.apk", "Lcom/example/A;")
+
+    def page(self, source, cursor, page_size=3, key=None):
+        return self.cursors.page(key or self.key, cursor, page_size, source)
+
+    def test_resume(self):
+        source = Source(7)
+        pages = []
+        cursor = None
+        while True:
+            result = self.page(source, cursor)
+            pages.append(result["items"])
+            cursor = result["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual([[0, 1, 2], [3, 4, 5], [6]], pages)
+        # Every page continued the same scan, which was closed at the end
+        self.assertEqual(1, source.started)
+        self.assertEqual(1, source.closed)
+
+    def test_exact_multiple_has_no_empty_last_page(self):
+        source = Source(6)
+        first = self.page(source, None)
+        second = self.page(source, first["next_cursor"])
+        self.assertEqual({"items": [3, 4, 5], "next_cursor": None}, second)
+
+    def test_expired_scan_restarts_at_the_same_position(self):
+        source = Source(7)
+        cursor = self.page(source, None)["next_cursor"]
+        # Opening another scan after the TTL drops the first one
+        ttl = self.cursors.TTL
+        self.cursors.TTL = -1
+        try:
+            self.page(Source(7), None, key=("other", "/b.apk"))
+        finally:
+            self.cursors.TTL = ttl
+        self.assertEqual(1, source.closed)
+        self.assertEqual([3, 4, 5], self.page(source, cursor)["items"])
+        self.assertEqual(2, source.started)
+
+    def test_oldest_scans_are_evicted(self):
+        sources = [Source(10) for _ in range(self.cursors.MAX_OPEN_SCANS + 1)]
+        cursors = [self.page(source, None)["next_cursor"] for source in sources]
+        self.assertEqual([1, 0], [sources[0].closed, sources[1].closed])
+        # The others resume, the evicted scan is restarted
+        self.assertEqual([3, 4, 5], self.page(sources[1], cursors[1])["items"])
+        self.assertEqual([3, 4, 5], self.page(sources[0], cursors[0])["items"])
+        self.assertEqual([2, 1], [sources[0].started, sources[1].started])
+
+    def test_cursor_of_another_scan_restarts(self):
+        source = Source(7)
+        cursor = self.page(source, None)["next_cursor"]
+        other = Source(7)
+        result = self.page(other, cursor, key=("get_class_fields", "/a.apk", "Lcom/example/A;"))
+        self.assertEqual([3, 4, 5], result["items"])
+        self.assertEqual(1, source.closed)
+        self.assertEqual(1, other.started)
+
+    def test_unknown_cursor_restarts_at_its_position(self):
+        source = Source(7)
+        cursor = base64.urlsafe_b64encode("999:3")
+        self.assertEqual([3, 4, 5], self.page(source, cursor)["items"])
+        self.assertEqual(1, source.started)
+
+    def test_garbled_cursor(self):
+        for cursor in ["%%%", "not a cursor", base64.urlsafe_b64encode("1"), base64.urlsafe_b64encode("a:b")]:
+            with self.assertRaises(MCP.JSONRPCError) as raised:
+                self.page(Source(7), cursor)
+            self.assertEqual(-32602, raised.exception.code)
+
+    def test_discard(self):
+        source = Source(7)
+        other = Source(7)
+        cursor = self.page(source, None)["next_cursor"]
+        other_cursor = self.page(other, None, key=("get_class_methods", "/b.apk", "Lcom/example/A;"))["next_cursor"]
+        self.cursors.discard("/a.apk")
+        self.assertEqual([1, 0], [source.closed, other.closed])
+        # The discarded scan restarts, the scan over another APK resumes
+        self.assertEqual([3, 4, 5], self.page(source, cursor)["items"])
+        self.assertEqual(2, source.started)
+        self.page(other, other_cursor, key=("get_class_methods", "/b.apk", "Lcom/example/A;"))
+        self.assertEqual(1, other.started)
+
+
+class ProjectStore(object):
+    def __init__(self):
+        self.unloaded = []
+
+    def unload(self, loaded):
+        self.unloaded.append(loaded)
+
+
+class Stat(object):
+    def __init__(self, mtime, size):
+        self.st_mtime = mtime
+        self.st_size = size
+
+
+class ReloadTest(unittest.TestCase):
+    """Scans over an APK are discarded when its artifact is unloaded"""
+
+    def setUp(self):
+        self.saved = MCP.scan_cursors, MCP.project_store
+        MCP.scan_cursors = MCP.ScanCursors()
+        MCP.project_store = ProjectStore()
+
+    def tearDown(self):
+        MCP.scan_cursors, MCP.project_store = self.saved
+
+    def test_changed_file_discards_its_scans(self):
+        cache = MCP.ArtifactCache(1, 1.0)
+        cache.paths["/a.apk"] = (1, 100, "old")
+        old = MCP.LoadedArtifact("/a.apk", "old", "old", None)
+        cache.put(old)
+        source = Source(7)
+        key = ("get_class_methods", "/a.apk", "Lcom/example/A;")
+        cursor = MCP.paginate(key, None, 3, source)["next_cursor"]
+
+        # The file changed on disk and its new content is being loaded
+        cache.paths["/a.apk"] = (2, 100, "new")
+        self.assertIsNone(cache.get("/a.apk", Stat(2, 100)))
+        cache.make_room()
+        self.assertEqual([old], MCP.project_store.unloaded)
+        self.assertEqual(1, source.closed)
+
+        # Paging on restarts the scan, now over the new content
+        self.assertEqual([3, 4, 5], MCP.paginate(key, cursor, 3, source)["items"])
+        self.assertEqual(2, source.started)
+
+
+class PaginateTest(unittest.TestCase):
+    def test_whole_result_without_cursor_or_page_size(self):
+        self.assertEqual([0, 1, 2, 3], MCP.paginate(("m", "/a.apk"), None, 0, Source(4)))
+
+    def test_page_size_alone_pages(self):
+        result = MCP.paginate(("m", "/a.apk"), None, 2, Source(4))
+        self.assertEqual([0, 1], result["items"])
+        self.assertIsNotNone(result["next_cursor"])
+        MCP.scan_cursors.discard("/a.apk")
+
+
+if __name__ == "__main__":
+    unittest.main()